@@ -1,5 +1,12 @@
 from django.contrib import admin
-from .models import ConversationThread, Message
+from django.contrib.admin.views.main import ORDER_VAR, SEARCH_VAR
+from django.db.models import Case, Value, When
+
+from .models import ArchivedThread, ConversationThread, Message
+from .search import search_message_ids
+
+# Full-text matches considered per admin search
+ADMIN_SEARCH_LIMIT = 500
 
 
 class MessageInline(admin.TabularInline):
@@ -14,7 +21,7 @@ class ConversationThreadAdmin(admin.ModelAdmin):
     list_display = ('session_id', 'customer', 'email', 'started_at', 'last_activity', 'is_active')
     list_filter = ('is_active', 'started_at', 'last_activity')
     search_fields = ('session_id', 'customer__email', 'email')
-    readonly_fields = ('session_id', 'started_at', 'last_activity')
+    readonly_fields = ('session_id', 'started_at', 'last_activity', 'summary', 'summarized_through')
     inlines = [MessageInline]
     
     fieldsets = (
@@ -24,6 +31,9 @@ class ConversationThreadAdmin(admin.ModelAdmin):
         ('Timestamps', {
             'fields': ('started_at', 'last_activity')
         }),
+        ('Context', {
+            'fields': ('summary', 'summarized_through')
+        }),
     )
 
 
@@ -31,9 +41,55 @@ class ConversationThreadAdmin(admin.ModelAdmin):
 class MessageAdmin(admin.ModelAdmin):
     list_display = ('thread', 'role', 'content_preview', 'timestamp')
     list_filter = ('role', 'timestamp')
-    search_fields = ('thread__session_id', 'content')
+    # Content is searched through the full-text index (see get_search_results)
+    search_fields = ('thread__session_id',)
     readonly_fields = ('timestamp',)
     
+    def get_queryset(self, request):
+        queryset = self.model._default_manager.get_queryset()
+        ids = self._search_ids(request)
+        if ids:
+            queryset = queryset.annotate(search_position=Case(
+                *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+                default=Value(len(ids)),
+            ))
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+    
+    def get_ordering(self, request):
+        # Best full-text match first, unless a column was clicked
+        if self._search_ids(request) and ORDER_VAR not in request.GET:
+            return ['search_position', '-timestamp']
+        return super().get_ordering(request)
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Session id matches plus full-text content matches"""
+        matches, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        ids = self._search_ids(request)
+        if ids:
+            # `queryset` already has the list filters applied
+            matches = matches | queryset.filter(pk__in=ids)
+        return matches, may_have_duplicates
+    
+    def _search_ids(self, request):
+        """Full-text matches for the changelist search, computed once per request"""
+        search_term = request.GET.get(SEARCH_VAR, '').strip()
+        if not search_term:
+            return []
+        if not hasattr(request, '_message_search_ids'):
+            request._message_search_ids = search_message_ids(search_term, limit=ADMIN_SEARCH_LIMIT)
+        return request._message_search_ids
+    
     def content_preview(self, obj):
         return obj.content[:100] + '...' if len(obj.content) > 100 else obj.content
     content_preview.short_description = 'Content Preview'
+
+
+@admin.register(ArchivedThread)
+class ArchivedThreadAdmin(admin.ModelAdmin):
+    list_display = ('session_id', 'message_count', 'last_activity', 'archived_at', 'archive_path')
+    list_filter = ('archived_at',)
+    search_fields = ('session_id',)
+    readonly_fields = ('session_id', 'archive_path', 'message_count', 'last_activity', 'archived_at')
@@ -0,0 +1,179 @@
+"""
+Cold storage for old conversations.
+
+Threads idle for CONVERSATION_ARCHIVE_DAYS are written out as gzip NDJSON,
+one line per thread holding the thread and all its messages, and then
+deleted from the hot tables; an ArchivedThread row remembers which file
+each one went to. Files are partitioned by the month of the threads' last
+activity and never rewritten: every batch goes to a new file, so a run
+that dies between writing and deleting just archives those threads again
+next time, under a newer pointer.
+
+Reading an archived session (history, or a new chat message) rehydrates it:
+the thread and its messages are restored with their original timestamps
+and the pointer is dropped. The archive file itself is left as it is.
+"""
+import gzip
+import io
+import json
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from store.models import Customer
+
+from .models import ArchivedThread, ConversationThread, Message
+
+THREAD_FIELDS = [
+    'session_id', 'email', 'customer_id', 'started_at', 'last_activity', 'is_active', 'summary', 'summarized_through',
+]
+MESSAGE_FIELDS = ['role', 'content', 'timestamp', 'user_ip', 'user_agent']
+DATETIME_FIELDS = {'started_at', 'last_activity', 'summarized_through', 'timestamp'}
+
+
+def get_archive_storage():
+    """The storage configured in settings.CONVERSATION_ARCHIVE_STORAGE"""
+    config = settings.CONVERSATION_ARCHIVE_STORAGE
+    return import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+
+
+def _encode(values):
+    return {
+        name: value.isoformat() if name in DATETIME_FIELDS and value else value
+        for name, value in values.items()
+    }
+
+
+def _decode(values):
+    return {
+        name: parse_datetime(value) if name in DATETIME_FIELDS and value else value
+        for name, value in values.items()
+    }
+
+
+def _write_archive(storage, month, lines):
+    """Write one new gzip NDJSON file in the month's partition; returns its name"""
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as archive:
+        for line in lines:
+            archive.write(json.dumps(line).encode() + b'\n')
+    buffer.seek(0)
+    name = f"{month}/{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.ndjson.gz"
+    return storage.save(name, buffer)
+
+
+def archive_threads(threads, batch_size=None):
+    """
+    Move `threads` (a ConversationThread queryset) to cold storage in
+    batches of `batch_size`; returns the number of threads archived
+    """
+    batch_size = batch_size or settings.CONVERSATION_ARCHIVE_BATCH_SIZE
+    storage = get_archive_storage()
+    archived = 0
+    while True:
+        batch = list(threads.order_by('pk').values('pk', *THREAD_FIELDS)[:batch_size])
+        if not batch:
+            return archived
+
+        by_thread = {thread['pk']: [] for thread in batch}
+        messages = (
+            Message.objects
+            .filter(thread_id__in=by_thread)
+            .order_by('thread_id', 'timestamp', 'pk')
+            .values('thread_id', *MESSAGE_FIELDS)
+        )
+        for message in messages.iterator(chunk_size=2000):
+            by_thread[message.pop('thread_id')].append(_encode(message))
+
+        # One file per month of last activity
+        partitions = {}
+        for thread in batch:
+            partitions.setdefault(f"{thread['last_activity']:%Y-%m}", []).append(thread)
+        pointers = []
+        for month, month_threads in partitions.items():
+            path = _write_archive(storage, month, (
+                dict(_encode({name: thread[name] for name in THREAD_FIELDS}), messages=by_thread[thread['pk']])
+                for thread in month_threads
+            ))
+            pointers += [
+                ArchivedThread(
+                    session_id=thread['session_id'],
+                    archive_path=path,
+                    message_count=len(by_thread[thread['pk']]),
+                    last_activity=thread['last_activity'],
+                )
+                for thread in month_threads
+            ]
+
+        with transaction.atomic():
+            # Threads that saw a new message since they were read stay hot;
+            # their copy in the file is simply never pointed at
+            still_idle = set(threads.filter(pk__in=by_thread).select_for_update().values_list('pk', flat=True))
+            session_ids = {thread['session_id'] for thread in batch if thread['pk'] in still_idle}
+            ArchivedThread.objects.bulk_create(
+                [pointer for pointer in pointers if pointer.session_id in session_ids],
+                update_conflicts=True,
+                unique_fields=['session_id'],
+                update_fields=['archive_path', 'message_count', 'last_activity'],
+            )
+            Message.objects.filter(thread_id__in=still_idle).delete()
+            ConversationThread.objects.filter(pk__in=still_idle).delete()
+        archived += len(still_idle)
+
+
+def read_archived_thread(pointer):
+    """The archived record for `pointer`, or None if it is missing from its file"""
+    needle = f'"session_id": {json.dumps(pointer.session_id)}'
+    with get_archive_storage().open(pointer.archive_path, 'rb') as stored:
+        with gzip.GzipFile(fileobj=stored) as archive:
+            for line in archive:
+                line = line.decode()
+                if needle not in line:
+                    continue
+                record = json.loads(line)
+                if record['session_id'] == pointer.session_id:
+                    return record
+    return None
+
+
+def rehydrate(session_id):
+    """Restore an archived conversation to the hot tables; returns the thread or None"""
+    with transaction.atomic():
+        # Locked so concurrent reads of the same session rehydrate it once
+        pointer = ArchivedThread.objects.select_for_update().filter(session_id=session_id).first()
+        if pointer is None:
+            return None
+        record = read_archived_thread(pointer)
+        if record is None:
+            print(f"Archived conversation {session_id} not found in {pointer.archive_path}")
+            return None
+
+        values = _decode({name: record[name] for name in THREAD_FIELDS})
+        if values['customer_id'] and not Customer.objects.filter(pk=values['customer_id']).exists():
+            values['customer_id'] = None
+        messages = [_decode(message) for message in record['messages']]
+
+        thread = ConversationThread.objects.create(**values)
+        created = Message.objects.bulk_create([
+            Message(thread=thread, **{name: message[name] for name in MESSAGE_FIELDS}) for message in messages
+        ])
+        # auto_now/auto_now_add stamped everything with the current time
+        ConversationThread.objects.filter(pk=thread.pk).update(
+            started_at=values['started_at'], last_activity=values['last_activity']
+        )
+        restored = list(zip(created, messages))
+        for start in range(0, len(restored), 500):
+            chunk = restored[start:start + 500]
+            Message.objects.filter(pk__in=[m.pk for m, _ in chunk]).update(timestamp=Case(
+                *[When(pk=m.pk, then=Value(original['timestamp'])) for m, original in chunk],
+                output_field=DateTimeField(),
+            ))
+        pointer.delete()
+
+    thread.refresh_from_db()
+    return thread
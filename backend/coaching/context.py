@@ -0,0 +1,115 @@
+"""
+Conversation context for coaching chats.
+
+Each message to Gemini carries the thread's rolling summary followed by
+its most recent turns. The turns are loaded with the thread (see
+coaching.turns), covering only messages newer than the summary, capped at
+COACH_HISTORY_MAX_MESSAGES rows.
+
+When those turns exceed COACH_HISTORY_TOKEN_BUDGET (estimated tokens), the
+newest ones that fit in half the budget are kept and the older ones are
+folded into the summary by the summarizer model. Summarizing is therefore
+only needed every half budget's worth of conversation, and the prompt stays
+bounded by the summary plus the budget however long the thread gets.
+
+When the cap cut the history short, the unsummarized rows older than it
+are folded first, oldest first and up to COACH_HISTORY_MAX_MESSAGES of them
+per turn. summarized_through only ever moves over rows that went into the
+summary, so no message is skipped; while such a backlog remains, the
+overflow of the loaded turns waits for a later turn.
+"""
+from django.conf import settings
+from django.utils import timezone
+
+from earthcare.outbound import get_vendor, run_in_vendor_thread
+
+from .gemini import GEMINI_TRANSIENT_ERRORS, get_model
+from .models import ConversationThread
+from .turns import older_unsummarized
+
+GEMINI_ROLES = {'user': 'user', 'ai': 'model'}
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token); avoids a countTokens call per turn"""
+    return len(text) // 4 + 1
+
+
+def split_history(messages, budget):
+    """
+    Split newest-first `messages` into (kept, overflow), both oldest-first.
+    Everything is kept while it fits the budget; past that, only the newest
+    turns fitting half the budget are kept and the rest overflow.
+    """
+    if sum(estimate_tokens(content) for _, content, _ in messages) <= budget:
+        return list(reversed(messages)), []
+
+    kept, used = [], 0
+    for i, message in enumerate(messages):
+        used += estimate_tokens(message[1])
+        # Always keep the newest message, which is the one being answered
+        if i and used > budget // 2:
+            return list(reversed(kept)), list(reversed(messages[i:]))
+        kept.append(message)
+    return list(reversed(kept)), []
+
+
+def summarize(summary, messages):
+    """Fold `messages` into `summary` with the summarizer model"""
+    transcript = '\n'.join(
+        f"{'Customer' if role == 'user' else 'Coach'}: {content}" for role, content, _ in messages
+    )
+    prompt = f"Summary so far:\n{summary or '(none)'}\n\nNext messages:\n{transcript}"
+    gemini = get_vendor('gemini')
+    response = gemini.call(
+        get_model('summarizer').model.generate_content,
+        prompt,
+        idempotent=True,
+        transient=GEMINI_TRANSIENT_ERRORS,
+        request_options={'timeout': gemini.read_timeout},
+    )
+    return response.text.strip()
+
+
+def to_contents(summary, messages):
+    """Gemini `contents` for the summary and oldest-first turns"""
+    contents = []
+    if summary:
+        contents.append({
+            'role': 'user',
+            'parts': [{'text': f'(Summary of our conversation so far: {summary})'}],
+        })
+    for role, content, _ in messages:
+        contents.append({'role': GEMINI_ROLES[role], 'parts': [{'text': content}]})
+    return contents
+
+
+async def build_contents(thread, history, user_message):
+    """
+    Assemble the context for `user_message` after the newest-first `history`
+    rows (see coaching.turns), updating the rolling summary first if the
+    recent turns have outgrown the budget
+    """
+    messages = [('user', user_message, timezone.now())] + history
+    kept, overflow = split_history(messages, settings.COACH_HISTORY_TOKEN_BUDGET)
+
+    limit = settings.COACH_HISTORY_MAX_MESSAGES
+    if len(history) >= limit:
+        backlog = [row async for row in older_unsummarized(thread, history[-1][2], limit)]
+        # With more rows left behind it, folding the overflow would move summarized_through past them
+        overflow = backlog if len(backlog) == limit else backlog + overflow
+
+    if overflow:
+        try:
+            summary = await run_in_vendor_thread(summarize, thread.summary, overflow)
+        except Exception as e:
+            # Send the kept turns without the overflow; the next message retries
+            print(f"Error summarizing conversation {thread.session_id}: {e}")
+        else:
+            thread.summary = summary
+            thread.summarized_through = overflow[-1][2]
+            await ConversationThread.objects.filter(pk=thread.pk).aupdate(
+                summary=thread.summary, summarized_through=thread.summarized_through
+            )
+
+    return to_contents(thread.summary, kept)
@@ -0,0 +1,168 @@
+"""
+Process-wide Gemini model registry.
+
+Models are configured in settings.GEMINI_MODELS and looked up with
+get_model(name); each one is built once per process instead of on every
+request. When a model has a `cache_ttl`, its system instruction is stored
+server-side as a cached context (CachedContent) and requests refer to it
+by name, so the prompt tokens are not re-sent or re-processed each time.
+The cache name is shared through the Django cache so every worker reuses
+the same context, and a fresh one is created shortly before it expires.
+Models or prompts the caching API rejects (e.g. below its minimum token
+count) fall back to sending the system instruction inline.
+"""
+import hashlib
+import threading
+import time
+from datetime import timedelta
+
+import google.generativeai as genai
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from google.api_core import exceptions as google_exceptions
+from google.generativeai import caching
+
+from earthcare.outbound import CircuitOpenError, get_vendor
+
+GEMINI_TRANSIENT_ERRORS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.TooManyRequests,
+)
+
+# Replace a cached context this many seconds before it expires
+CONTEXT_RENEW_MARGIN = 60
+
+
+def configure_gemini():
+    """Point the Gemini SDK's REST transport at OUTBOUND_HTTP['gemini']['base_url']"""
+    genai.configure(
+        api_key=settings.GEMINI_API_KEY,
+        transport='rest',
+        client_options={'api_endpoint': get_vendor('gemini').base_url},
+    )
+    # Built models hold on to the previous client
+    reset_models()
+
+
+class GeminiModel:
+    """A configured model, built once and rebuilt only to renew its cached context"""
+
+    def __init__(self, name, model, system_instruction='', generation_config=None, cache_ttl=0):
+        self.name = name
+        self.model_name = model if model.startswith('models/') else f'models/{model}'
+        self.system_instruction = import_string(system_instruction) if system_instruction else ''
+        self.generation_config = dict(generation_config or {})
+        self.cache_ttl = cache_ttl
+        self.cached_content = None
+        self._model = None
+        self._renew_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The GenerativeModel for this configuration"""
+        if self._stale():
+            with self._lock:
+                if self._stale():
+                    self._model = self._build()
+        return self._model
+
+    def request_body(self, contents):
+        """JSON body for a raw REST generateContent/streamGenerateContent call"""
+        self.model  # Builds the model and cached context if needed
+        body = {'contents': contents}
+        if self.cached_content:
+            body['cachedContent'] = self.cached_content
+        elif self.system_instruction:
+            body['systemInstruction'] = {'parts': [{'text': self.system_instruction}]}
+        if self.generation_config:
+            body['generationConfig'] = self.generation_config
+        return body
+
+    def _stale(self):
+        return self._model is None or (self._renew_at is not None and time.monotonic() >= self._renew_at)
+
+    def _build(self):
+        self.cached_content = None
+        self._renew_at = None
+        if self.cache_ttl and self.system_instruction:
+            try:
+                context = self._cached_context()
+            except GEMINI_TRANSIENT_ERRORS + (CircuitOpenError,) as e:
+                # Go inline for now and try caching again a little later
+                print(f"Gemini context caching failed for {self.name}: {e}")
+                self._renew_at = time.monotonic() + CONTEXT_RENEW_MARGIN
+            except Exception as e:
+                print(f"Gemini context caching unavailable for {self.name}, sending the system instruction inline: {e}")
+                self.cache_ttl = 0
+            else:
+                remaining = (context.expire_time - timezone.now()).total_seconds()
+                self.cached_content = context.name
+                self._renew_at = time.monotonic() + max(remaining - CONTEXT_RENEW_MARGIN, 1)
+                return genai.GenerativeModel.from_cached_content(
+                    context, generation_config=self.generation_config or None
+                )
+
+        return genai.GenerativeModel(
+            self.model_name,
+            system_instruction=self.system_instruction or None,
+            generation_config=self.generation_config or None,
+        )
+
+    def _cached_context(self):
+        """Reuse the context another worker already cached, or create one"""
+        gemini = get_vendor('gemini')
+        fingerprint = hashlib.sha1(f'{self.model_name}\n{self.system_instruction}'.encode()).hexdigest()[:16]
+        key = f'gemini:context:{self.name}:{fingerprint}'
+
+        name = cache.get(key)
+        if name:
+            try:
+                context = gemini.call(
+                    caching.CachedContent.get, name, idempotent=True, transient=GEMINI_TRANSIENT_ERRORS
+                )
+                if (context.expire_time - timezone.now()).total_seconds() > CONTEXT_RENEW_MARGIN:
+                    return context
+            except google_exceptions.NotFound:
+                pass
+
+        context = gemini.call(
+            caching.CachedContent.create,
+            model=self.model_name,
+            display_name=f'{self.name}-{fingerprint}',
+            system_instruction=self.system_instruction,
+            ttl=timedelta(seconds=self.cache_ttl),
+            transient=GEMINI_TRANSIENT_ERRORS,
+        )
+        cache.set(key, context.name, max(self.cache_ttl - CONTEXT_RENEW_MARGIN, 1))
+        return context
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(name):
+    """Return the process-wide GeminiModel for `name`, built from settings.GEMINI_MODELS"""
+    model = _models.get(name)
+    if model is None:
+        with _models_lock:
+            model = _models.get(name)
+            if model is None:
+                model = GeminiModel(name, **settings.GEMINI_MODELS[name])
+                _models[name] = model
+    return model
+
+
+def reset_models():
+    """Drop all built models (used by tests and after reconfiguring the SDK)"""
+    with _models_lock:
+        _models.clear()
+
+
+# Configure Gemini
+configure_gemini()
@@ -0,0 +1,94 @@
+"""
+Keyset pagination over a conversation's messages.
+
+Pages are positioned by a (timestamp, id) cursor instead of an offset, so
+each page is a range read on the (thread, timestamp) index no matter how
+deep into a long thread it is, and messages arriving meanwhile never shift
+a page. Cursors are opaque to clients: pass the `before` cursor of a page
+to get older messages and its `after` cursor to get newer ones.
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Message
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+EXPORT_BATCH_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(message):
+    """Opaque cursor for a message's (timestamp, id) position"""
+    return base64.urlsafe_b64encode(f'{message.timestamp.isoformat()}|{message.pk}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, id) for a cursor, raising InvalidCursor if it is malformed"""
+    try:
+        timestamp, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        timestamp = parse_datetime(timestamp)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor(f'Invalid cursor: {cursor}')
+    if timestamp is None:
+        raise InvalidCursor(f'Invalid cursor: {cursor}')
+    return timestamp, pk
+
+
+def _before(position):
+    timestamp, pk = position
+    return Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk)
+
+
+def _after(position):
+    timestamp, pk = position
+    return Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, pk__gt=pk)
+
+
+def messages_page(thread, before=None, after=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    One page of the thread's messages, oldest first, with the cursors
+    around it: returns (messages, before_cursor, after_cursor), where a
+    cursor is None when there is nothing further in that direction.
+    Without `before`/`after` the page holds the newest messages.
+    """
+    messages = Message.objects.filter(thread=thread)
+    if after:
+        rows = list(messages.filter(_after(decode_cursor(after))).order_by('timestamp', 'pk')[:page_size + 1])
+        has_newer, has_older = len(rows) > page_size, True
+        rows = rows[:page_size]
+    else:
+        if before:
+            messages = messages.filter(_before(decode_cursor(before)))
+        rows = list(messages.order_by('-timestamp', '-pk')[:page_size + 1])
+        has_older, has_newer = len(rows) > page_size, bool(before)
+        rows = rows[:page_size][::-1]
+
+    if not rows:
+        # Past either end: the cursor given still marks the way back
+        return [], after, before
+    return (
+        rows,
+        encode_cursor(rows[0]) if has_older else None,
+        encode_cursor(rows[-1]) if has_newer else None,
+    )
+
+
+def message_batches(thread, batch_size=EXPORT_BATCH_SIZE):
+    """Yield every message of the thread, oldest first, in keyset batches of `batch_size`"""
+    messages = Message.objects.filter(thread=thread).order_by('timestamp', 'pk')
+    position = None
+    while True:
+        batch = list((messages.filter(_after(position)) if position else messages)[:batch_size])
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        position = (batch[-1].timestamp, batch[-1].pk)
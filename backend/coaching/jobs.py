@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .archive import archive_threads
+from .models import ConversationThread
+
+
+def deactivate_idle_conversations():
+    """Mark conversations with no activity for CONVERSATION_IDLE_DAYS as inactive"""
+    cutoff = timezone.now() - timedelta(days=settings.CONVERSATION_IDLE_DAYS)
+    deactivated = ConversationThread.objects.filter(
+        is_active=True, last_activity__lt=cutoff
+    ).update(is_active=False)
+    return f'Deactivated {deactivated} idle conversation(s)'
+
+
+def move_conversations_to_archive():
+    """Move conversations with no activity for CONVERSATION_ARCHIVE_DAYS to cold storage"""
+    cutoff = timezone.now() - timedelta(days=settings.CONVERSATION_ARCHIVE_DAYS)
+    moved = archive_threads(ConversationThread.objects.filter(last_activity__lt=cutoff))
+    return f'Moved {moved} conversation(s) to the archive'
@@ -0,0 +1,117 @@
+"""
+Benchmark time-to-first-token for the streaming chat endpoint.
+
+Gemini is replaced by a local stub server (coaching.stub_gemini) that waits
+--first-token-ms before the first chunk and --chunk-ms between chunks, or
+by any compatible server given with --gemini-url. The same prompts are sent
+to the blocking /chat/ endpoint and to /chat/stream/, and for each the time
+until the first byte of the reply reaches the client is reported.
+"""
+import statistics
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from coaching.gemini import configure_gemini
+from coaching.models import ConversationThread
+from coaching.response_cache import reset_response_cache
+from coaching.stub_gemini import StubGemini
+from coaching.views import ChatStreamView, ChatView
+from earthcare.outbound import reset_vendors
+from earthcare.ratelimit import reset_rate_limits
+
+BENCH_SESSION = 'chat-bench'
+BENCH_REPLY = (
+    'Kefir is living food: its cultures feed the microbes that make most of '
+    'your serotonin, so a glass a day is a gentle reset for mood and focus.'
+)
+
+
+class Command(BaseCommand):
+    help = 'Measure time-to-first-token of streaming vs blocking chat against a stub Gemini'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=10)
+        parser.add_argument('--first-token-ms', type=float, default=300.0)
+        parser.add_argument('--chunk-ms', type=float, default=50.0)
+        parser.add_argument('--gemini-url', default='', help='Use this server instead of the built-in stub')
+
+    def handle(self, *args, **options):
+        stub = StubGemini(
+            reply=BENCH_REPLY,
+            first_token_delay=options['first_token_ms'] / 1000,
+            chunk_delay=options['chunk_ms'] / 1000,
+        )
+        url = options['gemini_url']
+        if not url:
+            stub.__enter__()
+            url = stub.url
+
+        outbound = dict(settings.OUTBOUND_HTTP)
+        outbound['gemini'] = dict(outbound['gemini'], base_url=url)
+        try:
+            # Every request comes from one IP with the same prompt; neither the rate
+            # limits nor the reply cache (which would answer from memory) is measured
+            with override_settings(OUTBOUND_HTTP=outbound, GEMINI_API_KEY=settings.GEMINI_API_KEY or 'bench',
+                                   RATE_LIMITS={},
+                                   COACH_RESPONSE_CACHE=dict(settings.COACH_RESPONSE_CACHE, max_entries=0)):
+                reset_vendors()
+                reset_rate_limits()
+                reset_response_cache()
+                configure_gemini()
+                blocking = self._run(ChatView.as_view(), '/api/coaching/chat/', options['requests'])
+                streaming = self._run(ChatStreamView.as_view(), '/api/coaching/chat/stream/', options['requests'])
+        finally:
+            reset_vendors()
+            reset_response_cache()
+            configure_gemini()
+            if not options['gemini_url']:
+                stub.__exit__()
+            ConversationThread.objects.filter(session_id__startswith=BENCH_SESSION).delete()
+
+        self._report('Blocking /chat/ first byte', [first for first, _ in blocking])
+        self._report('Streaming /chat/stream/ first token', [first for first, _ in streaming])
+        self._report('Streaming /chat/stream/ complete', [total for _, total in streaming])
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["requests"]} requests per endpoint, stub first token '
+            f'{options["first_token_ms"]:.0f}ms, {options["chunk_ms"]:.0f}ms per chunk'
+        ))
+
+    def _run(self, view, path, count):
+        """Returns (time to first byte, time to last byte) per request"""
+        factory = APIRequestFactory()
+        samples = []
+        for i in range(count):
+            request = factory.post(
+                path, {'session_id': f'{BENCH_SESSION}-{i}', 'message': 'Why kefir?'}, format='json'
+            )
+            # Gemini already runs in the stub; keep the console quiet on fallbacks
+            with mock.patch('builtins.print'):
+                started = time.perf_counter()
+                # The views are async; a WSGI request still gets a sync stream
+                response = async_to_sync(view)(request)
+                if response.streaming:
+                    chunks = iter(response.streaming_content)
+                    next(chunks)
+                    first = time.perf_counter() - started
+                    for _ in chunks:
+                        pass
+                else:
+                    response.render()
+                    first = time.perf_counter() - started
+                samples.append((first, time.perf_counter() - started))
+        return samples
+
+    def _report(self, label, samples):
+        samples_ms = sorted(sample * 1000 for sample in samples)
+        p95 = samples_ms[max(0, int(len(samples_ms) * 0.95) - 1)]
+        self.stdout.write(
+            f'{label}: mean {statistics.mean(samples_ms):.2f}ms, '
+            f'p50 {statistics.median(samples_ms):.2f}ms, '
+            f'p95 {p95:.2f}ms, max {samples_ms[-1]:.2f}ms'
+        )
@@ -0,0 +1,151 @@
+"""
+Load benchmark: concurrent chat capacity of the WSGI vs ASGI server modes.
+
+For each mode a real gunicorn server is started from gunicorn.conf.py
+(SERVER_MODE=wsgi or asgi) with Gemini pointed at a local stub server
+(coaching.stub_gemini) that answers after --gemini-latency-ms. A pool of
+--concurrency clients then posts --requests chat messages and the
+throughput and latency percentiles are reported per mode. With sync
+workers at most --workers chats are in flight at once; under ASGI the
+waits overlap, bounded by OUTBOUND_THREADS per worker.
+
+The servers run with the chat rate limits and the reply cache off, so
+every request reaches the stub. Failed requests are listed by status,
+and a mode where most requests fail aborts the run.
+"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from coaching.models import ConversationThread
+from coaching.stub_gemini import StubGemini
+
+BENCH_SESSION = 'serving-bench'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent chat capacity of WSGI and ASGI server modes against a stub Gemini'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default='wsgi,asgi')
+        parser.add_argument('--workers', type=int, default=3)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--gemini-latency-ms', type=float, default=500.0)
+
+    def handle(self, *args, **options):
+        latency = options['gemini_latency_ms'] / 1000
+        try:
+            with StubGemini(first_token_delay=latency) as stub:
+                for mode in options['modes'].split(','):
+                    self._bench(mode.strip(), stub.url, options)
+        finally:
+            ConversationThread.objects.filter(session_id__startswith=BENCH_SESSION).delete()
+
+    def _bench(self, mode, gemini_url, options):
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        env = dict(
+            os.environ,
+            SERVER_MODE=mode,
+            PORT=str(port),
+            WEB_CONCURRENCY=str(options['workers']),
+            GEMINI_API_URL=gemini_url,
+            GEMINI_API_KEY='bench',
+            # All load comes from one IP; an empty rate turns a bucket off
+            CHAT_RATE_LIMIT_IP='',
+            CHAT_RATE_LIMIT_SESSION='',
+            CHAT_RATE_LIMIT_EMAIL='',
+            # Every request asks the same question; keep the reply cache from answering it
+            COACH_CACHE_MAX_ENTRIES='0',
+        )
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}'],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            self._wait_until_up(base_url, server)
+            samples, failures, elapsed = self._load(base_url, mode, options)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+        samples_ms = sorted(sample * 1000 for sample in samples)
+        p95 = samples_ms[max(0, int(len(samples_ms) * 0.95) - 1)] if samples_ms else 0
+        errors = sum(failures.values())
+        self.stdout.write(
+            f'{mode.upper()}: {len(samples) / elapsed:.1f} req/s, '
+            f'mean {statistics.mean(samples_ms) if samples_ms else 0:.0f}ms, '
+            f'p50 {statistics.median(samples_ms) if samples_ms else 0:.0f}ms, p95 {p95:.0f}ms, '
+            f'{errors} errors ({options["requests"]} requests, {options["concurrency"]} concurrent, '
+            f'{options["workers"]} workers)'
+        )
+        if errors:
+            breakdown = ', '.join(f'{count} x {status}' for status, count in failures.most_common())
+            self.stdout.write(self.style.ERROR(f'{mode.upper()} failed requests: {breakdown}'))
+            if failures[500] and connection.vendor == 'sqlite':
+                self.stdout.write(self.style.ERROR(
+                    'SQLite allows one writer at a time, so concurrent chats from several workers '
+                    'fail with "database is locked"; run against PostgreSQL for meaningful numbers'
+                ))
+        # Throughput of mostly failed requests says nothing about serving capacity
+        if errors * 2 > options['requests']:
+            raise CommandError(f'{mode.upper()}: {errors} of {options["requests"]} requests failed')
+
+    def _wait_until_up(self, base_url, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn exited with status {server.returncode}')
+            try:
+                requests.get(f'{base_url}/api/store/stripe/config/', timeout=5)
+                return
+            except requests.exceptions.RequestException:
+                time.sleep(0.2)
+        raise CommandError(f'gunicorn did not start within {timeout}s')
+
+    def _load(self, base_url, mode, options):
+        """Returns (latencies of successful requests, Counter of failure statuses, wall time)"""
+        local = threading.local()
+
+        def chat(i):
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            started = time.perf_counter()
+            try:
+                response = session.post(
+                    f'{base_url}/api/coaching/chat/',
+                    json={'session_id': f'{BENCH_SESSION}-{mode}-{i}', 'message': 'Why kefir?'},
+                    timeout=120,
+                )
+            except requests.exceptions.RequestException as e:
+                return None, type(e).__name__
+            if response.status_code != 200:
+                return None, response.status_code
+            return time.perf_counter() - started, None
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(chat, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        samples = [latency for latency, failure in results if failure is None]
+        failures = Counter(failure for _, failure in results if failure is not None)
+        return samples, failures, elapsed
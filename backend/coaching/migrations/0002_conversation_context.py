@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coaching', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationthread',
+            name='summarized_through',
+            field=models.DateTimeField(blank=True, help_text='Timestamp of the newest message folded into the summary', null=True),
+        ),
+        migrations.AddField(
+            model_name='conversationthread',
+            name='summary',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['thread', 'timestamp'], name='message_thread_ts_idx'),
+        ),
+    ]
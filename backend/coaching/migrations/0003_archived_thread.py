@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coaching', '0002_conversation_context'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedThread',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=100, unique=True)),
+                ('archive_path', models.CharField(help_text='Archive file holding the conversation', max_length=255)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('last_activity', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archived Thread',
+                'verbose_name_plural': 'Archived Threads',
+                'ordering': ['-archived_at'],
+            },
+        ),
+    ]
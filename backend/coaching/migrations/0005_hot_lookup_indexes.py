@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:50
+
+from django.db import migrations, models
+
+from earthcare.migration_operations import AddIndexOnline
+
+
+class Migration(migrations.Migration):
+    # Indexes are built CONCURRENTLY on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('coaching', '0004_message_search'),
+    ]
+
+    operations = [
+        AddIndexOnline(
+            model_name='conversationthread',
+            index=models.Index(fields=['email'], name='thread_email_idx'),
+        ),
+        AddIndexOnline(
+            model_name='conversationthread',
+            index=models.Index(fields=['last_activity'], name='thread_last_activity_idx'),
+        ),
+    ]
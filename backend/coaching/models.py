@@ -17,8 +17,18 @@ class ConversationThread(models.Model):
     last_activity = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     
+    # Rolling summary of the turns that no longer fit the chat context window
+    summary = models.TextField(blank=True)
+    summarized_through = models.DateTimeField(
+        null=True, blank=True, help_text="Timestamp of the newest message folded into the summary"
+    )
+    
     class Meta:
         ordering = ['-last_activity']
+        indexes = [
+            models.Index(fields=['email'], name='thread_email_idx'),
+            models.Index(fields=['last_activity'], name='thread_last_activity_idx'),
+        ]
         verbose_name = 'Conversation Thread'
         verbose_name_plural = 'Conversation Threads'
 
@@ -48,6 +58,26 @@ class Message(models.Model):
         ordering = ['timestamp']
         verbose_name = 'Message'
         verbose_name_plural = 'Messages'
+        indexes = [
+            models.Index(fields=['thread', 'timestamp'], name='message_thread_ts_idx'),
+        ]
 
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
+
+
+class ArchivedThread(models.Model):
+    """Pointer to a conversation moved to cold storage (see coaching/archive.py)"""
+    session_id = models.CharField(max_length=100, unique=True)
+    archive_path = models.CharField(max_length=255, help_text="Archive file holding the conversation")
+    message_count = models.PositiveIntegerField(default=0)
+    last_activity = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-archived_at']
+        verbose_name = 'Archived Thread'
+        verbose_name_plural = 'Archived Threads'
+
+    def __str__(self):
+        return f"Archived conversation - {self.session_id}"
@@ -0,0 +1,231 @@
+"""
+In-process cache of coach replies to repeated opening questions.
+
+Only the first message of a conversation is cached: later replies depend
+on the thread's history. Prompts are looked up in two tiers:
+
+1. Exact: the prompt normalized (case, punctuation, whitespace) is the key,
+   so "What is kefir?" and "what is kefir" share one answer.
+2. Semantic (optional): with an embedding function configured, a miss is
+   embedded and compared by cosine similarity against every cached
+   prompt; the closest one at or above `similarity_threshold` is a hit.
+   The cached unit vectors are snapshotted under the lock and scored with
+   one NumPy matrix-vector product outside it, so a miss never holds up
+   the lookups of other requests.
+
+Entries expire after `ttl` seconds and the least recently used one is
+evicted past `max_entries`. Each worker keeps its own cache and counters.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Recent prompt embeddings, so a miss is not embedded again when it is stored
+RECENT_VECTORS = 64
+
+
+def normalize_prompt(text):
+    """Lowercase, strip punctuation and collapse whitespace"""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+def cacheable_prompt(contents):
+    """The prompt text if `contents` is a conversation's opening message, else None"""
+    if len(contents) == 1 and contents[0]['role'] == 'user':
+        return contents[0]['parts'][0]['text']
+    return None
+
+
+def gemini_embedding(text):
+    """Embed `text` with Gemini's text-embedding model"""
+    import google.generativeai as genai
+
+    from earthcare.outbound import get_vendor
+
+    from .gemini import GEMINI_TRANSIENT_ERRORS
+
+    gemini = get_vendor('gemini')
+    result = gemini.call(
+        genai.embed_content,
+        model=settings.COACH_RESPONSE_CACHE.get('embedding_model', 'models/text-embedding-004'),
+        content=text,
+        task_type='semantic_similarity',
+        idempotent=True,
+        transient=GEMINI_TRANSIENT_ERRORS,
+        request_options={'timeout': gemini.read_timeout},
+    )
+    return result['embedding']
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+def _nearest(vector, candidates, threshold):
+    """The key of the (key, unit vector) candidate closest to `vector`, if at or above `threshold`"""
+    if not candidates:
+        return None
+    keys, vectors = zip(*candidates)
+    scores = np.stack(vectors) @ vector
+    best = int(np.argmax(scores))
+    return keys[best] if scores[best] >= threshold else None
+
+
+class CacheEntry:
+    __slots__ = ('prompt', 'response', 'vector', 'expires_at', 'hits')
+
+    def __init__(self, prompt, response, vector, expires_at):
+        self.prompt = prompt
+        self.response = response
+        self.vector = vector
+        self.expires_at = expires_at
+        self.hits = 0
+
+
+class ResponseCache:
+    """LRU + TTL cache of replies keyed on normalized prompts, with an optional similarity tier"""
+
+    def __init__(self, max_entries=500, ttl=86400, embedding=None, similarity_threshold=0.92,
+                 clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embedding = embedding
+        self.similarity_threshold = similarity_threshold
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ('exact_hits', 'semantic_hits', 'misses', 'evictions', 'expirations', 'embedding_errors'), 0
+        )
+
+    def get(self, prompt):
+        """The cached reply for `prompt` (or a similar enough one), or None"""
+        key = normalize_prompt(prompt)
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is not None:
+                return self._hit(key, entry, 'exact_hits')
+            if not self.embedding or not self._entries:
+                self._stats['misses'] += 1
+                return None
+
+        # Embed and score outside the lock: the first is a network call and
+        # the second a scan of every cached vector
+        vector = self._embed(key, prompt)
+        match = None
+        if vector is not None:
+            with self._lock:
+                candidates = self._live_vectors()
+            match = _nearest(vector, candidates, self.similarity_threshold)
+        with self._lock:
+            entry = self._live_entry(match) if match is not None else None
+            if entry is not None:
+                return self._hit(match, entry, 'semantic_hits')
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, prompt, response):
+        """Cache `response` as the reply to `prompt`"""
+        if self.max_entries <= 0:
+            return
+        key = normalize_prompt(prompt)
+        vector = self._embed(key, prompt) if self.embedding else None
+        with self._lock:
+            self._entries[key] = CacheEntry(prompt, response, vector, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def stats(self, top=10):
+        """Hit/miss counters and the most hit entries for this worker"""
+        with self._lock:
+            stats = dict(self._stats)
+            hits = stats['exact_hits'] + stats['semantic_hits']
+            stats['hits'] = hits
+            stats['hit_rate'] = hits / (hits + stats['misses']) if hits + stats['misses'] else 0.0
+            stats['entries'] = len(self._entries)
+            stats['top'] = [
+                {'prompt': entry.prompt, 'hits': entry.hits}
+                for entry in sorted(self._entries.values(), key=lambda e: e.hits, reverse=True)[:top]
+                if entry.hits
+            ]
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def _hit(self, key, entry, tier):
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self._stats[tier] += 1
+        return entry.response
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= self.clock():
+            del self._entries[key]
+            self._stats['expirations'] += 1
+            return None
+        return entry
+
+    def _live_vectors(self):
+        candidates = []
+        for key in list(self._entries):
+            entry = self._live_entry(key)
+            if entry is not None and entry.vector is not None:
+                candidates.append((key, entry.vector))
+        return candidates
+
+    def _embed(self, key, prompt):
+        with self._lock:
+            if key in self._vectors:
+                return self._vectors[key]
+        try:
+            vector = _unit(self.embedding(prompt))
+        except Exception as e:
+            print(f"Error embedding coach prompt: {e}")
+            with self._lock:
+                self._stats['embedding_errors'] += 1
+            return None
+        with self._lock:
+            self._vectors[key] = vector
+            while len(self._vectors) > RECENT_VECTORS:
+                self._vectors.popitem(last=False)
+        return vector
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """The process-wide ResponseCache, configured from settings.COACH_RESPONSE_CACHE"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                options = dict(settings.COACH_RESPONSE_CACHE)
+                options.pop('embedding_model', None)
+                embedding = options.pop('embedding', '')
+                _cache = ResponseCache(embedding=import_string(embedding) if embedding else None, **options)
+    return _cache
+
+
+def reset_response_cache():
+    """Drop the process-wide cache so it is rebuilt from settings (used by tests)"""
+    global _cache
+    with _cache_lock:
+        _cache = None
@@ -0,0 +1,113 @@
+"""
+Full-text search over coaching message content.
+
+On PostgreSQL messages are matched with to_tsvector/websearch_to_tsquery
+against a GIN expression index (message_content_search_idx), ranked with
+ts_rank and highlighted with ts_headline. On SQLite an FTS5 table
+(coaching_message_fts) mirrors the content through triggers and is
+queried with bm25() and snippet(). Both indexes are created by migration
+0004 for the database in use; other databases fall back to icontains.
+
+Highlights wrap matches in <mark> and are HTML-escaped otherwise, so they
+can be rendered as-is.
+"""
+import re
+
+from django.db import connection
+from django.utils.html import escape
+
+from .models import Message
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'coaching_message_fts'
+# Control characters cannot occur in the highlight markup we escape
+MARK_START, MARK_END = '\x02', '\x03'
+SNIPPET_WORDS = 24
+
+
+def _highlight_html(snippet):
+    return escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def _fts5_query(query):
+    """Quote each word so user input is never parsed as FTS5 syntax"""
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', query))
+
+
+def _search_postgresql(query, limit):
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    # Same expression as the GIN index, so the planner can use it
+    vector = SearchVector('content', config=SEARCH_CONFIG)
+    rows = (
+        Message.objects
+        .annotate(search=vector)
+        .filter(search=search_query)
+        .annotate(
+            rank=SearchRank(vector, search_query),
+            highlight=SearchHeadline(
+                'content', search_query, config=SEARCH_CONFIG,
+                start_sel=MARK_START, stop_sel=MARK_END, max_words=SNIPPET_WORDS,
+            ),
+        )
+        .order_by('-rank', '-timestamp')
+        .values_list('pk', 'rank', 'highlight')[:limit]
+    )
+    return list(rows)
+
+
+def _search_sqlite(query, limit):
+    match = _fts5_query(query)
+    if not match:
+        return []
+    with connection.cursor() as cursor:
+        # bm25() is lower for better matches
+        cursor.execute(
+            f"SELECT rowid, -bm25({FTS_TABLE}), snippet({FTS_TABLE}, 0, %s, %s, '…', %s) "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}) LIMIT %s",
+            [MARK_START, MARK_END, SNIPPET_WORDS, match, limit],
+        )
+        return cursor.fetchall()
+
+
+def _search_fallback(query, limit):
+    rows = Message.objects.filter(content__icontains=query).order_by('-timestamp').values_list('pk', 'content')[:limit]
+    pattern = re.compile(re.escape(query), re.IGNORECASE)
+    return [(pk, 0.0, pattern.sub(lambda m: f'{MARK_START}{m.group(0)}{MARK_END}', content)) for pk, content in rows]
+
+
+def search_message_ids(query, limit=1000):
+    """Ids of messages matching `query`, best match first"""
+    return [pk for pk, _, _ in _search(query, limit)]
+
+
+def _search(query, limit):
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(query, limit)
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(query, limit)
+    return _search_fallback(query, limit)
+
+
+def search_messages(query, limit=50):
+    """
+    Messages matching `query`, best match first, each as a dict with the
+    message fields, its session_id, `rank` and an HTML `highlight`
+    """
+    hits = _search(query, limit)
+    messages = Message.objects.select_related('thread').in_bulk([pk for pk, _, _ in hits])
+    results = []
+    for pk, rank, highlight in hits:
+        message = messages.get(pk)
+        if message is None:
+            continue
+        results.append({
+            'id': message.pk,
+            'session_id': message.thread.session_id,
+            'role': message.role,
+            'timestamp': message.timestamp,
+            'rank': round(float(rank), 4),
+            'highlight': _highlight_html(highlight),
+        })
+    return results
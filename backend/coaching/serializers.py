@@ -10,11 +10,11 @@ class MessageSerializer(serializers.ModelSerializer):
 
 
 class ConversationThreadSerializer(serializers.ModelSerializer):
-    messages = MessageSerializer(many=True, read_only=True)
+    """Thread details; messages are paginated separately (see coaching.history)"""
     
     class Meta:
         model = ConversationThread
-        fields = ['id', 'session_id', 'email', 'started_at', 'last_activity', 'is_active', 'messages']
+        fields = ['id', 'session_id', 'email', 'started_at', 'last_activity', 'is_active']
         read_only_fields = ['started_at', 'last_activity']
 
 
@@ -0,0 +1,125 @@
+"""
+Local stand-in for the Gemini REST API.
+
+Serves models/*:generateContent and models/*:streamGenerateContent
+(server-sent events, as with ?alt=sse) with a canned reply split into word
+chunks, sleeping `first_token_delay` before the first chunk and
+`chunk_delay` between the rest, plus enough of cachedContents (create and
+get) for context caching. Point the chat views at it by setting
+OUTBOUND_HTTP['gemini']['base_url'] to `stub.url` and calling
+coaching.views.configure_gemini(); used by the tests and bench_chat_stream.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _chunk(text, finished=False):
+    candidate = {'content': {'parts': [{'text': text}], 'role': 'model'}, 'index': 0}
+    if finished:
+        candidate['finishReason'] = 'STOP'
+    return json.dumps({'candidates': [candidate]})
+
+
+class StubGemini:
+    def __init__(self, reply='Kefir is great for your gut.', first_token_delay=0.0, chunk_delay=0.0):
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.status_code = 200
+        self.cache_status = 200
+        self.contexts = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def send_json(self, status_code, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_error_json(self, status_code):
+                self.send_json(status_code, {'error': {'code': status_code, 'message': 'stub error'}})
+
+            def do_GET(self):
+                stub.requests.append({'path': self.path, 'body': {}})
+                name = self.path.split('?')[0].split('/v1beta/')[-1]
+                if name in stub.contexts:
+                    self.send_json(200, stub.contexts[name])
+                else:
+                    self.send_error_json(404)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                stub.requests.append({'path': self.path, 'body': json.loads(body or '{}')})
+                if self.path.startswith('/v1beta/cachedContents'):
+                    if stub.cache_status != 200:
+                        self.send_error_json(stub.cache_status)
+                    else:
+                        self.send_json(200, stub.create_context(json.loads(body)))
+                    return
+                if stub.status_code != 200:
+                    self.send_error_json(stub.status_code)
+                    return
+
+                words = stub.chunks()
+                if ':streamGenerateContent' in self.path:
+                    # Chunked SSE, one `data:` event per word, like ?alt=sse
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    time.sleep(stub.first_token_delay)
+                    for i, word in enumerate(words):
+                        if i:
+                            time.sleep(stub.chunk_delay)
+                        event = f'data: {_chunk(word, i == len(words) - 1)}\r\n\r\n'.encode()
+                        self.wfile.write(b'%x\r\n%s\r\n' % (len(event), event))
+                        self.wfile.flush()
+                    self.wfile.write(b'0\r\n\r\n')
+                else:
+                    time.sleep(stub.first_token_delay + stub.chunk_delay * (len(words) - 1))
+                    self.send_json(200, json.loads(_chunk(''.join(words), finished=True)))
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def create_context(self, body):
+        """Store a cached context the way cachedContents.create does"""
+        now = datetime.now(timezone.utc)
+        ttl = float(body.get('ttl', '3600s').rstrip('s'))
+        context = {
+            'name': f'cachedContents/stub-{len(self.contexts) + 1}',
+            'model': body['model'],
+            'displayName': body.get('displayName', ''),
+            'createTime': now.isoformat().replace('+00:00', 'Z'),
+            'updateTime': now.isoformat().replace('+00:00', 'Z'),
+            'expireTime': (now + timedelta(seconds=ttl)).isoformat().replace('+00:00', 'Z'),
+        }
+        self.contexts[context['name']] = context
+        return context
+
+    def chunks(self):
+        """The reply split into word chunks, keeping the spacing"""
+        words = self.reply.split(' ')
+        return [word + ' ' for word in words[:-1]] + words[-1:]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,3 +1,579 @@
-from django.test import TestCase
+import gzip
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from earthcare.outbound import reset_vendors
+from earthcare.ratelimit import reset_rate_limits
+
+from store.models import Customer
+
+from .gemini import configure_gemini, get_model
+from . import response_cache
+from .archive import get_archive_storage
+from .history import message_batches
+from .jobs import move_conversations_to_archive
+from .models import ArchivedThread, ConversationThread, Message
+from .response_cache import ResponseCache, get_response_cache, reset_response_cache
+from .turns import history_query
+from .prompts import SYSTEM_INSTRUCTION
+from .stub_gemini import StubGemini
+
+
+def parse_events(body):
+    """Split an SSE body into (event, data) pairs"""
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+class StubGeminiMixin:
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        reset_response_cache()
+        self.addCleanup(reset_response_cache)
+        reset_rate_limits()
+        self.stub = StubGemini(reply='Kefir feeds your gut brain axis.').__enter__()
+        self.addCleanup(self.stub.__exit__)
+        outbound = dict(settings.OUTBOUND_HTTP)
+        outbound['gemini'] = dict(outbound['gemini'], base_url=self.stub.url, backoff_base=0)
+        override = override_settings(OUTBOUND_HTTP=outbound, GEMINI_API_KEY='test-key')
+        override.enable()
+        self.addCleanup(override.disable)
+        reset_vendors()
+        configure_gemini()
+        # Cleanups run last-in first-out: restore the vendor, then the SDK config
+        self.addCleanup(configure_gemini)
+        self.addCleanup(reset_vendors)
+
+
+class ChatTests(StubGeminiMixin, TestCase):
+    def chat(self, path, **extra):
+        return self.client.post(
+            path, {'session_id': 'sess-1', 'message': 'Why kefir?'}, content_type='application/json', **extra
+        )
+
+    def test_blocking_chat_still_returns_whole_reply(self):
+        response = self.chat('/api/coaching/chat/')
+        self.assertEqual(response.json()['message'], 'Kefir feeds your gut brain axis.')
+        self.assertIn(':generateContent', self.stub.requests[-1]['path'])
+
+    def test_stream_relays_tokens_then_saves_message(self):
+        response = self.chat('/api/coaching/chat/stream/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+
+        events = parse_events(b''.join(response.streaming_content).decode())
+        tokens = [data['text'] for event, data in events if event == 'token']
+        self.assertEqual(tokens, self.stub.chunks())
+        self.assertEqual(events[-1], ('done', {'message': ''.join(tokens), 'session_id': 'sess-1'}))
+        self.assertIn(':streamGenerateContent', self.stub.requests[-1]['path'])
+        self.assertEqual(
+            list(Message.objects.values_list('role', 'content')),
+            [('user', 'Why kefir?'), ('ai', 'Kefir feeds your gut brain axis.')],
+        )
+
+    def test_stream_falls_back_when_gemini_fails(self):
+        self.stub.status_code = 400
+        response = self.chat('/api/coaching/chat/stream/')
+        events = parse_events(b''.join(response.streaming_content).decode())
+        self.assertEqual([event for event, _ in events], ['token', 'done'])
+        self.assertIn('busy', Message.objects.get(role='ai').content)
+
+    def test_invalid_stream_request_is_an_error_event(self):
+        response = self.client.post(
+            '/api/coaching/chat/stream/', {}, content_type='application/json', HTTP_ACCEPT='text/event-stream'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(parse_events(response.content.decode())[0][0], 'error')
+
+    @override_settings(RATE_LIMITS={'chat': {'ip': '100/min', 'session': '2/min'}})
+    def test_chat_is_rate_limited_per_session(self):
+        self.assertEqual(self.chat('/api/coaching/chat/').status_code, 200)
+        self.assertEqual(self.chat('/api/coaching/chat/stream/').status_code, 200)
+        response = self.chat('/api/coaching/chat/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        calls = len(self.stub.requests)
+        # Another session from the same IP still gets through
+        response = self.client.post(
+            '/api/coaching/chat/', {'session_id': 'other', 'message': 'Hi'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(self.stub.requests), calls)
+
+    @override_settings(RATE_LIMITS={'chat': {'ip': '', 'session': '1/min'}})
+    def test_empty_rate_turns_bucket_off(self):
+        for session_id in ('a', 'b', 'c'):
+            response = self.client.post(
+                '/api/coaching/chat/', {'session_id': session_id, 'message': 'Hi'}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.chat('/api/coaching/chat/').status_code, 200)
+        self.assertEqual(self.chat('/api/coaching/chat/').status_code, 429)
+
+    async def test_stream_is_async_under_asgi(self):
+        response = await self.async_client.post(
+            '/api/coaching/chat/stream/', {'session_id': 'sess-2', 'message': 'Hi'}, content_type='application/json'
+        )
+        # A sync iterator would be buffered whole by Django's ASGI handler
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(parse_events(body)[-1][0], 'done')
+        self.assertEqual(await Message.objects.filter(thread__session_id='sess-2', role='ai').acount(), 1)
+
+
+class ModelRegistryTests(StubGeminiMixin, TestCase):
+    def chat(self, path):
+        response = self.client.post(path, {'session_id': 's', 'message': 'Hi'}, content_type='application/json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    def generate_requests(self):
+        return [r['body'] for r in self.stub.requests if 'generateContent' in r['path'].lower()]
+
+    def context_requests(self):
+        return [r for r in self.stub.requests if r['path'].startswith('/v1beta/cachedContents')]
+
+    def test_model_is_built_once_and_uses_cached_context(self):
+        self.assertIs(get_model('coach').model, get_model('coach').model)
+        self.chat('/api/coaching/chat/')
+        self.chat('/api/coaching/chat/stream/')
+
+        # The prompt is uploaded once and shared with other workers through the cache
+        creates = [r for r in self.context_requests() if 'ttl' in r['body']]
+        self.assertEqual(len(creates), 1)
+        self.assertEqual(creates[0]['body']['systemInstruction']['parts'][0]['text'], SYSTEM_INSTRUCTION)
+        for body in self.generate_requests():
+            self.assertTrue(body['cachedContent'].startswith('cachedContents/'))
+            self.assertNotIn('systemInstruction', body)
+
+    def test_falls_back_to_inline_instruction(self):
+        self.stub.cache_status = 400
+        self.chat('/api/coaching/chat/')
+        self.chat('/api/coaching/chat/stream/')
+
+        self.assertEqual(len(self.context_requests()), 1)
+        for body in self.generate_requests():
+            self.assertNotIn('cachedContent', body)
+            self.assertIn('earth care coach', json.dumps(body).lower())
+
+    @override_settings(GEMINI_MODELS={'coach': {'model': 'gemini-1.5-flash-002', 'generation_config': {'temperature': 0.2}}})
+    def test_model_comes_from_settings(self):
+        configure_gemini()
+        self.chat('/api/coaching/chat/stream/')
+        request = self.stub.requests[-1]
+        self.assertIn('/models/gemini-1.5-flash-002:streamGenerateContent', request['path'])
+        self.assertEqual(request['body']['generationConfig'], {'temperature': 0.2})
+
+
+class ContextWindowTests(StubGeminiMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.thread = ConversationThread.objects.create(session_id='ctx')
+
+    def add_turns(self, *turns):
+        started = timezone.now() - timedelta(hours=1)
+        for i, (role, content) in enumerate(turns):
+            message = Message.objects.create(thread=self.thread, role=role, content=content)
+            Message.objects.filter(pk=message.pk).update(timestamp=started + timedelta(minutes=i))
+
+    def chat(self, message):
+        response = self.client.post(
+            '/api/coaching/chat/stream/', {'session_id': 'ctx', 'message': message}, content_type='application/json'
+        )
+        b''.join(response.streaming_content)
+        return self.stub.requests[-1]['body']['contents']
+
+    def test_earlier_turns_are_sent_as_history(self):
+        self.add_turns(('user', 'I am vegan.'), ('ai', 'Noted, plant based it is.'))
+        contents = self.chat('What should I eat for breakfast?')
+        self.assertEqual(
+            [(c['role'], c['parts'][0]['text']) for c in contents],
+            [('user', 'I am vegan.'), ('model', 'Noted, plant based it is.'), ('user', 'What should I eat for breakfast?')],
+        )
+
+    @override_settings(COACH_HISTORY_TOKEN_BUDGET=100)
+    def test_overflow_is_folded_into_summary(self):
+        self.add_turns(*[('user' if i % 2 == 0 else 'ai', f'turn {i} ' + 'x' * 120) for i in range(6)])
+        contents = self.chat('And now?')
+
+        summary_request = next(r['body'] for r in self.stub.requests if ':generateContent' in r['path'])
+        self.assertIn('turn 0', json.dumps(summary_request))
+        self.thread.refresh_from_db()
+        self.assertEqual(self.thread.summary, 'Kefir feeds your gut brain axis.')
+        self.assertIsNotNone(self.thread.summarized_through)
+
+        # Summary first, then only the newest turns that fit half the budget
+        self.assertIn(self.thread.summary, contents[0]['parts'][0]['text'])
+        self.assertEqual(contents[-1]['parts'][0]['text'], 'And now?')
+        self.assertNotIn('turn 0', json.dumps(contents))
+        self.assertLessEqual(sum(len(c['parts'][0]['text']) for c in contents[1:]) // 4, 50)
+
+        # Summarized turns are not fetched again: just the kept turns and the reply
+        self.assertEqual(len(history_query('ctx')), len(contents[1:]) + 1)
+
+    def summary_request(self):
+        return json.dumps(next(r['body'] for r in self.stub.requests if ':generateContent' in r['path']))
+
+    @override_settings(COACH_HISTORY_MAX_MESSAGES=4)
+    def test_turns_beyond_the_history_cap_are_summarized(self):
+        self.add_turns(*[('user' if i % 2 == 0 else 'ai', f'turn {i}') for i in range(6)])
+        contents = self.chat('And now?')
+
+        summary_request = self.summary_request()
+        self.assertIn('turn 0', summary_request)
+        self.assertIn('turn 1', summary_request)
+        self.assertNotIn('turn 2', summary_request)
+        self.thread.refresh_from_db()
+        self.assertEqual(self.thread.summarized_through, Message.objects.get(content='turn 1').timestamp)
+        self.assertEqual(
+            [c['parts'][0]['text'] for c in contents[1:]], ['turn 2', 'turn 3', 'turn 4', 'turn 5', 'And now?']
+        )
+
+    @override_settings(COACH_HISTORY_MAX_MESSAGES=2)
+    def test_long_backlog_is_summarized_a_chunk_at_a_time(self):
+        self.add_turns(*[('user' if i % 2 == 0 else 'ai', f'turn {i}') for i in range(6)])
+        self.chat('And now?')
+
+        self.assertNotIn('turn 2', self.summary_request())
+        self.thread.refresh_from_db()
+        # Only what went into the summary counts as summarized
+        self.assertEqual(self.thread.summarized_through, Message.objects.get(content='turn 1').timestamp)
+
+    @override_settings(COACH_HISTORY_TOKEN_BUDGET=100)
+    def test_summary_failure_still_sends_recent_turns(self):
+        self.add_turns(*[('user', 'y' * 200) for _ in range(3)])
+        self.stub.status_code = 400
+        self.chat('Hi')
+        self.thread.refresh_from_db()
+        self.assertEqual(self.thread.summary, '')
+        self.assertIsNone(self.thread.summarized_through)
+
+    def test_history_is_one_indexed_query(self):
+        self.add_turns(('user', 'a'), ('ai', 'b'))
+        with self.assertNumQueries(1):
+            self.assertEqual(list(history_query('ctx'))[0].thread, self.thread)
+        if connection.vendor in ('sqlite', 'postgresql'):
+            self.assertIn('message_thread_ts_idx', history_query('ctx').explain())
+
+
+class TurnPersistenceTests(StubGeminiMixin, TestCase):
+    def chat(self, message, **data):
+        return self.client.post(
+            '/api/coaching/chat/', {'session_id': 'turns', 'message': message, **data}, content_type='application/json'
+        )
+
+    def test_turn_is_saved_together_and_touches_thread(self):
+        self.chat('Hi')
+        thread = ConversationThread.objects.get(session_id='turns')
+        touched = thread.last_activity
+        self.assertEqual(list(thread.messages.values_list('role', flat=True)), ['user', 'ai'])
+
+        # Existing thread: history with the thread, one insert, one update
+        with self.assertNumQueries(3):
+            self.chat('And kefir?')
+        thread.refresh_from_db()
+        self.assertGreater(thread.last_activity, touched)
+        self.assertEqual(
+            list(thread.messages.values_list('role', 'content'))[2:],
+            [('user', 'And kefir?'), ('ai', 'Kefir feeds your gut brain axis.')],
+        )
+
+    def test_customer_link_is_cached(self):
+        customer = Customer.objects.create(email='ana@example.com', first_name='Ana', last_name='B')
+        self.chat('Hi', email='ana@example.com')
+        self.assertEqual(ConversationThread.objects.get(session_id='turns').customer, customer)
+
+        ConversationThread.objects.filter(session_id='turns').update(customer=None)
+        with self.assertNumQueries(3):
+            self.chat('Again', email='ana@example.com')
+        self.assertEqual(ConversationThread.objects.get(session_id='turns').customer, customer)
+
+
+VOCAB = ['kefir', 'whey', 'gut', 'brain', 'protein', 'probiotic']
+
+
+def fake_embedding(text):
+    """Bag of words over VOCAB, with 'probiotic' as a synonym of 'kefir'"""
+    words = text.lower().replace('probiotics', 'kefir').replace('probiotic', 'kefir').split()
+    return [sum(word.strip('?!.,') == term for word in words) for term in VOCAB] + [0.1]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ResponseCacheTests(TestCase):
+    def test_exact_tier_normalizes_prompts(self):
+        responses = ResponseCache()
+        responses.put('What is kefir?', 'Fermented milk.')
+        self.assertEqual(responses.get('  what IS kefir '), 'Fermented milk.')
+        self.assertIsNone(responses.get('What is whey?'))
+        stats = responses.stats()
+        self.assertEqual((stats['exact_hits'], stats['misses'], stats['hit_rate']), (1, 1, 0.5))
+        self.assertEqual(stats['top'], [{'prompt': 'What is kefir?', 'hits': 1}])
+
+    def test_semantic_tier_uses_threshold(self):
+        responses = ResponseCache(embedding=fake_embedding, similarity_threshold=0.9)
+        responses.put('Why kefir for the gut?', 'Live cultures.')
+        self.assertEqual(responses.get('why probiotic for gut'), 'Live cultures.')
+        self.assertIsNone(responses.get('why whey protein'))
+        self.assertEqual(responses.stats()['semantic_hits'], 1)
+
+    def test_similarity_is_scored_outside_the_lock(self):
+        responses = ResponseCache(embedding=fake_embedding, similarity_threshold=0.9)
+        responses.put('Why kefir for the gut?', 'Live cultures.')
+        real_nearest = response_cache._nearest
+
+        def nearest(*args):
+            self.assertFalse(responses._lock.locked())
+            return real_nearest(*args)
+
+        with mock.patch('coaching.response_cache._nearest', side_effect=nearest) as scored:
+            self.assertEqual(responses.get('why probiotic for gut'), 'Live cultures.')
+        scored.assert_called_once()
+
+    def test_ttl_and_lru_eviction(self):
+        clock = FakeClock()
+        responses = ResponseCache(max_entries=2, ttl=60, clock=clock)
+        responses.put('a', 'A')
+        responses.put('b', 'B')
+        responses.get('a')
+        responses.put('c', 'C')
+        # 'b' was least recently used
+        self.assertIsNone(responses.get('b'))
+        self.assertEqual(responses.get('a'), 'A')
+
+        clock.now = 61
+        self.assertIsNone(responses.get('c'))
+        stats = responses.stats()
+        self.assertEqual((stats['evictions'], stats['expirations'], stats['entries']), (1, 1, 1))
+
+    def test_embedding_errors_fall_back_to_exact_tier(self):
+        def broken(text):
+            raise RuntimeError('embedding down')
+
+        responses = ResponseCache(embedding=broken)
+        responses.put('What is kefir?', 'Fermented milk.')
+        self.assertEqual(responses.get('what is kefir'), 'Fermented milk.')
+        self.assertIsNone(responses.get('kefir benefits'))
+        self.assertEqual(responses.stats()['embedding_errors'], 2)
+
+
+class ChatResponseCacheTests(StubGeminiMixin, TestCase):
+    def chat(self, path, session_id, message):
+        response = self.client.post(
+            path, {'session_id': session_id, 'message': message}, content_type='application/json'
+        )
+        if response.streaming:
+            return parse_events(b''.join(response.streaming_content).decode())[-1][1]['message']
+        return response.json()['message']
+
+    def generate_count(self):
+        return len([r for r in self.stub.requests if 'generateContent' in r['path']])
+
+    def test_repeated_opening_question_skips_gemini(self):
+        first = self.chat('/api/coaching/chat/', 'a', 'What is kefir?')
+        calls = self.generate_count()
+        self.assertEqual(self.chat('/api/coaching/chat/stream/', 'b', 'what is kefir'), first)
+        self.assertEqual(self.chat('/api/coaching/chat/', 'c', 'What is KEFIR?!'), first)
+        self.assertEqual(self.generate_count(), calls)
+        self.assertEqual(get_response_cache().stats()['exact_hits'], 2)
+
+    def test_follow_ups_and_failures_are_not_cached(self):
+        self.chat('/api/coaching/chat/', 'a', 'What is kefir?')
+        self.chat('/api/coaching/chat/', 'a', 'What is kefir?')
+        self.assertEqual(get_response_cache().stats()['entries'], 1)
+
+        self.stub.status_code = 400
+        self.chat('/api/coaching/chat/stream/', 'b', 'Why whey?')
+        self.stub.status_code = 200
+        self.chat('/api/coaching/chat/stream/', 'c', 'Why whey?')
+        self.assertEqual(get_response_cache().stats()['exact_hits'], 0)
+
+
+class ConversationHistoryTests(TestCase):
+    def setUp(self):
+        self.thread = ConversationThread.objects.create(session_id='long')
+        # Pairs of messages share a timestamp so the id tie-break matters
+        started = timezone.now() - timedelta(hours=1)
+        for i in range(7):
+            message = Message.objects.create(thread=self.thread, role='user', content=f'm{i}')
+            Message.objects.filter(pk=message.pk).update(timestamp=started + timedelta(seconds=i // 2))
+
+    def page(self, **params):
+        response = self.client.get('/api/coaching/conversation/long/', params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [m['content'] for m in data['messages']], data['before'], data['after']
+
+    def test_pages_backwards_and_forwards_by_cursor(self):
+        contents, before, after = self.page(page_size=3)
+        self.assertEqual((contents, after), (['m4', 'm5', 'm6'], None))
+        contents, before, after = self.page(page_size=3, before=before)
+        self.assertEqual(contents, ['m1', 'm2', 'm3'])
+        contents, oldest, _ = self.page(page_size=3, before=before)
+        self.assertEqual((contents, oldest), (['m0'], None))
+
+        contents, _, after = self.page(page_size=3, after=after)
+        self.assertEqual((contents, after), (['m4', 'm5', 'm6'], None))
+
+    def test_page_is_one_keyset_read(self):
+        # The thread lookup, then the page itself
+        with self.assertNumQueries(2):
+            self.page(page_size=3)
+
+    def test_invalid_params(self):
+        for params in ({'before': 'nope'}, {'page_size': 0}, {'page_size': 500}, {'before': 'a', 'after': 'b'}):
+            response = self.client.get('/api/coaching/conversation/long/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_unknown_session_is_empty(self):
+        response = self.client.get('/api/coaching/conversation/missing/')
+        self.assertEqual(response.json()['messages'], [])
+
+    def test_batches_walk_the_whole_thread(self):
+        batches = list(message_batches(self.thread, batch_size=3))
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+        self.assertEqual([m.content for batch in batches for m in batch], [f'm{i}' for i in range(7)])
+
+    def test_export_streams_ndjson_for_staff(self):
+        url = '/api/coaching/conversation/long/export/'
+        self.assertIn(self.client.get(url).status_code, (401, 403))
+
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['content'] for line in lines], [f'm{i}' for i in range(7)])
+
+    async def test_export_is_async_under_asgi(self):
+        staff = await User.objects.acreate(username='staff', is_staff=True)
+        await sync_to_async(self.async_client.force_login)(staff)
+        response = await self.async_client.get('/api/coaching/conversation/long/export/')
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(body.splitlines()), 7)
+
+
+class ArchiveTests(StubGeminiMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        override = override_settings(CONVERSATION_ARCHIVE_STORAGE={
+            'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': root},
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.old = timezone.now() - timedelta(days=400)
+        for session_id, last_activity in (('old-1', self.old), ('old-2', self.old), ('recent', timezone.now())):
+            thread = ConversationThread.objects.create(session_id=session_id, summary=f'{session_id} summary')
+            for i in range(3):
+                message = Message.objects.create(thread=thread, role='user', content=f'{session_id} m{i}')
+                Message.objects.filter(pk=message.pk).update(timestamp=last_activity + timedelta(seconds=i))
+            ConversationThread.objects.filter(pk=thread.pk).update(started_at=last_activity, last_activity=last_activity)
+
+    def test_idle_threads_move_to_monthly_gzip_files(self):
+        with override_settings(CONVERSATION_ARCHIVE_BATCH_SIZE=1):
+            self.assertIn('Moved 2', move_conversations_to_archive())
+
+        self.assertEqual(list(ConversationThread.objects.values_list('session_id', flat=True)), ['recent'])
+        self.assertEqual(Message.objects.count(), 3)
+        pointers = ArchivedThread.objects.order_by('session_id')
+        self.assertEqual([p.message_count for p in pointers], [3, 3])
+        # One batch per file, partitioned by month
+        self.assertNotEqual(pointers[0].archive_path, pointers[1].archive_path)
+        self.assertTrue(pointers[0].archive_path.startswith(f'{self.old:%Y-%m}/'))
+
+        with get_archive_storage().open(pointers[0].archive_path, 'rb') as stored:
+            record = json.loads(gzip.decompress(stored.read()))
+        self.assertEqual(record['session_id'], 'old-1')
+        self.assertEqual([m['content'] for m in record['messages']], ['old-1 m0', 'old-1 m1', 'old-1 m2'])
+
+    def test_history_rehydrates_archived_thread(self):
+        move_conversations_to_archive()
+        response = self.client.get('/api/coaching/conversation/old-1/')
+        self.assertEqual([m['content'] for m in response.json()['messages']], ['old-1 m0', 'old-1 m1', 'old-1 m2'])
+
+        thread = ConversationThread.objects.get(session_id='old-1')
+        self.assertEqual((thread.summary, thread.last_activity), ('old-1 summary', self.old))
+        self.assertEqual(thread.messages.first().timestamp, self.old)
+        self.assertFalse(ArchivedThread.objects.filter(session_id='old-1').exists())
+
+    def test_export_rehydrates_archived_thread(self):
+        move_conversations_to_archive()
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        response = self.client.get('/api/coaching/conversation/old-1/export/')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['content'] for line in lines], ['old-1 m0', 'old-1 m1', 'old-1 m2'])
+
+    def test_chat_continues_archived_thread(self):
+        move_conversations_to_archive()
+        self.client.post('/api/coaching/chat/', {'session_id': 'old-2', 'message': 'Back again'}, content_type='application/json')
+        contents = self.stub.requests[-1]['body']['contents']
+        self.assertEqual(contents[0]['parts'][0]['text'], '(Summary of our conversation so far: old-2 summary)')
+        self.assertEqual([c['parts'][0]['text'] for c in contents[1:]], ['old-2 m0', 'old-2 m1', 'old-2 m2', 'Back again'])
+        self.assertEqual(ConversationThread.objects.get(session_id='old-2').messages.count(), 5)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        thread = ConversationThread.objects.create(session_id='search')
+        self.best = Message.objects.create(thread=thread, role='user', content='Kefir kefir kefir for my gut')
+        self.other = Message.objects.create(thread=thread, role='ai', content='Try kefir <b>daily</b> with oats')
+        Message.objects.create(thread=thread, role='user', content='What about whey protein?')
+        self.staff = User.objects.create_superuser('staff', 'staff@example.com', 'pw')
+
+    def search(self, q, **params):
+        self.client.force_login(self.staff)
+        return self.client.get('/api/coaching/search/', {'q': q, **params}).json()['results']
+
+    def test_results_are_ranked_and_highlighted(self):
+        results = self.search('kefir')
+        self.assertEqual([r['id'] for r in results], [self.best.pk, self.other.pk])
+        self.assertEqual(results[0]['session_id'], 'search')
+        self.assertIn('<mark>Kefir</mark>', results[0]['highlight'])
+        # Message text is escaped; only the highlight markup is HTML
+        self.assertIn('&lt;b&gt;daily&lt;/b&gt;', results[1]['highlight'])
+
+    def test_index_follows_updates_and_deletes(self):
+        Message.objects.filter(pk=self.best.pk).update(content='Sauerkraut instead')
+        self.other.delete()
+        self.assertEqual(self.search('kefir'), [])
+        self.assertEqual([r['id'] for r in self.search('sauerkraut')], [self.best.pk])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(len(self.search('kefir" OR (whey')), 0)
+        self.assertEqual(self.search('"('), [])
+
+    def test_search_is_staff_only(self):
+        response = self.client.get('/api/coaching/search/', {'q': 'kefir'})
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_admin_search_uses_full_text_rank(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/admin/coaching/message/', {'q': 'kefir'})
+        self.assertEqual([m.pk for m in response.context['cl'].result_list], [self.best.pk, self.other.pk])
+        response = self.client.get('/admin/coaching/message/', {'q': 'kefir', 'role__exact': 'ai'})
+        self.assertEqual([m.pk for m in response.context['cl'].result_list], [self.other.pk])
@@ -0,0 +1,100 @@
+"""
+Database round trips for one chat turn.
+
+Before generation, the thread and its recent history come back from one
+query on the (thread, timestamp) index joined to the thread; only a new
+conversation falls back to get_or_create. Nothing is written yet: the user
+message is kept in memory and passed to the context builder.
+
+After generation, both messages are written with one bulk_create, and
+last_activity (plus the customer link, if still missing) is set with one
+targeted UPDATE. Email to customer lookups are cached, so a turn with an
+existing thread costs three queries: one read, one insert, one update.
+Saving each message as it happened cost six with an email still to link
+and four otherwise. The insert and the update touch different tables, so
+three is the floor while last_activity is recorded. Archived conversations
+are rehydrated from cold storage first (see coaching.archive).
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils import timezone
+
+from store.models import Customer
+
+from .archive import rehydrate
+from .models import ConversationThread, Message
+
+# Seconds to remember an email's customer; misses expire sooner so a new
+# customer's conversations are linked soon after checkout
+CUSTOMER_CACHE_TTL = 600
+NO_CUSTOMER_CACHE_TTL = 60
+
+
+def history_query(session_id):
+    """Newest-first messages not yet folded into the summary, each carrying its thread"""
+    return (
+        Message.objects
+        .filter(thread__session_id=session_id)
+        .filter(Q(thread__summarized_through__isnull=True) | Q(timestamp__gt=F('thread__summarized_through')))
+        .select_related('thread')
+        .order_by('-timestamp')[:settings.COACH_HISTORY_MAX_MESSAGES]
+    )
+
+
+def older_unsummarized(thread, before, limit):
+    """Oldest-first (role, content, timestamp) rows newer than the summary and older than `before`"""
+    rows = Message.objects.filter(thread=thread, timestamp__lt=before)
+    if thread.summarized_through:
+        rows = rows.filter(timestamp__gt=thread.summarized_through)
+    return rows.order_by('timestamp').values_list('role', 'content', 'timestamp')[:limit]
+
+
+async def load_thread(session_id, email=''):
+    """
+    Return (thread, history) for the session, creating the thread if needed;
+    history is newest-first (role, content, timestamp) rows
+    """
+    messages = [message async for message in history_query(session_id)]
+    if messages:
+        return messages[0].thread, [(m.role, m.content, m.timestamp) for m in messages]
+
+    # A conversation moved to cold storage picks up where it left off
+    thread = await sync_to_async(rehydrate)(session_id)
+    if thread is not None:
+        return thread, [m async for m in history_query(session_id).values_list('role', 'content', 'timestamp')]
+
+    thread, created = await ConversationThread.objects.aget_or_create(
+        session_id=session_id,
+        defaults={'email': email}
+    )
+    return thread, []
+
+
+def customer_id_for_email(email):
+    """The id of the customer with this email, or None; cached"""
+    key = f'coaching:customer:{email}'
+    customer_id = cache.get(key)
+    if customer_id is None:
+        customer_id = Customer.objects.filter(email=email).values_list('id', flat=True).first() or 0
+        cache.set(key, customer_id, CUSTOMER_CACHE_TTL if customer_id else NO_CUSTOMER_CACHE_TTL)
+    return customer_id or None
+
+
+def save_turn(thread, user_message, ai_response, email=''):
+    """Write the user message and AI reply with one INSERT, then touch the thread with one UPDATE"""
+    user_message.thread = thread
+    Message.objects.bulk_create([
+        user_message,
+        Message(thread=thread, role='ai', content=ai_response),
+    ])
+
+    updates = {'last_activity': timezone.now()}
+    # Link to customer if email matches
+    if email and not thread.customer_id:
+        customer_id = customer_id_for_email(email)
+        if customer_id:
+            updates['customer_id'] = thread.customer_id = customer_id
+    ConversationThread.objects.filter(pk=thread.pk).update(**updates)
+    thread.last_activity = updates['last_activity']
@@ -1,7 +1,10 @@
 from django.urls import path
-from .views import ChatView, get_conversation_history
+from .views import ChatView, ChatStreamView, ConversationExportView, get_conversation_history, search_conversations
 
 urlpatterns = [
     path('chat/', ChatView.as_view(), name='chat'),
+    path('chat/stream/', ChatStreamView.as_view(), name='chat-stream'),
     path('conversation/<str:session_id>/', get_conversation_history, name='conversation-history'),
+    path('search/', search_conversations, name='conversation-search'),
+    path('conversation/<str:session_id>/export/', ConversationExportView.as_view(), name='conversation-export'),
 ]
@@ -1,137 +1,339 @@
+import json
+
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 from django.conf import settings
-import google.generativeai as genai
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 
+from .archive import rehydrate
+from .context import build_contents
+from .gemini import GEMINI_TRANSIENT_ERRORS, get_model
+from .history import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, message_batches, messages_page
 from .models import ConversationThread, Message
+from .response_cache import cacheable_prompt, get_response_cache
+from .search import search_messages
 from .serializers import ConversationThreadSerializer, ChatMessageSerializer, MessageSerializer
-from store.models import Customer
-
-# Configure Gemini
-genai.configure(api_key=settings.GEMINI_API_KEY)
-
-SYSTEM_INSTRUCTION = """
-You are the "Earth Care Coach," a wise and persuasive AI assistant for Earth Care Food Company. 
-Your goal is to educate users about permaculture and the gut-brain connection, and then MASTERFULLY pivot that education into selling our products.
-
-**Your Persona:**
-- Warm, earthy, and deeply knowledgeable (like a mix of a nutritionist and a regenerative farmer).
-- You believe that "healing the soil heals the gut."
-- You are helpful but always focused on conversion (getting them to pre-order/subscribe).
-
-**Your Product Knowledge (Sell these!):**
-1. **Catskills Greek Yogurt ($12 / 32oz)**: 
-   - *Hook*: The ultimate gut-brain food. High protein (20g) for neurotransmitter production. Thick, creamy, zero waste.
-   - *Sell*: "If you want mental clarity, start your day with this."
-2. **Ancestral Kefir ($10 / 32oz)**: 
-   - *Hook*: "The Champagne of Dairy." Potent probiotics for mood regulation.
-   - *Sell*: "Feeling sluggish or anxious? Your microbiome needs this reboot."
-3. **Regenerative Whey Powder ($45 / 2lb)**: 
-   - *Hook*: Bioavailable recovery. Don't let good protein go to waste.
-   - *Sell*: "Perfect for rebuilding your body after a long day or workout."
-
-**Conversation Strategy:**
-- **The Gut-Brain Axis**: If they mention mood, stress, or fog, explain how 90% of serotonin is made in the gut, then recommend the Kefir or Yogurt.
-- **Permaculture**: If they ask about the farm, explain how we close the loop on waste, then suggest buying the Whey (which is saved from waste).
-- **Closing**: Always end with a gentle nudge to "add to cart" or "start your subscription."
-
-**Tone:**
-- Educational but sales-driven.
-- Concise (keep responses under 3 sentences unless asked for deep dives).
-- Use emojis sparingly (🌱, 🥛, ✨).
-"""
-
-
-class ChatView(APIView):
+from .turns import load_thread, save_turn
+from earthcare.outbound import get_vendor, run_in_vendor_thread
+from earthcare.ratelimit import TokenBucketThrottle, get_client_ip
+
+
+class ChatView(AsyncAPIView):
     """
     Handle AI chat conversations with Gemini
     Save all conversations to the database
+    
+    Each request sends the thread's rolling summary and recent turns (see
+    coaching.context) so the coach can follow up on earlier messages.
+    Opening questions are answered from coaching.response_cache when seen before.
+    Messages are written once the turn is complete (see coaching.turns).
+    
+    Async: the Gemini call runs on a worker thread, so under ASGI a slow
+    completion no longer ties up a whole server process.
+    
+    Rate limited per client IP, session and email (RATE_LIMITS['chat']).
     """
-    def post(self, request):
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'chat'
+    
+    async def post(self, request):
         serializer = ChatMessageSerializer(data=request.data)
         
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        session_id = serializer.validated_data['session_id']
-        user_message = serializer.validated_data['message']
-        email = serializer.validated_data.get('email', '')
-        
-        # Get or create conversation thread
-        thread, created = ConversationThread.objects.get_or_create(
-            session_id=session_id,
-            defaults={'email': email}
-        )
-        
-        # Link to customer if email matches
-        if email and not thread.customer:
-            try:
-                customer = Customer.objects.get(email=email)
-                thread.customer = customer
-                thread.save()
-            except Customer.DoesNotExist:
-                pass
-        
-        # Save user message
-        Message.objects.create(
-            thread=thread,
-            role='user',
-            content=user_message,
-            user_ip=self._get_client_ip(request),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
-        )
+        data = serializer.validated_data
+        thread, history = await load_thread(data['session_id'], data.get('email', ''))
+        contents = await build_contents(thread, history, data['message'])
         
         # Get AI response using Gemini
         try:
-            ai_response = self._get_gemini_response(user_message)
+            ai_response = await run_in_vendor_thread(self._get_gemini_response, contents)
         except Exception as e:
             ai_response = "I'm currently disconnected from the earth grid. Please try again later."
             print(f"Gemini API error: {e}")
         
-        # Save AI message
-        Message.objects.create(
-            thread=thread,
-            role='ai',
-            content=ai_response
-        )
+        # Save both messages of the turn together
+        await sync_to_async(save_turn)(thread, self._user_message(request, data), ai_response, data.get('email', ''))
         
         return Response({
             'message': ai_response,
-            'session_id': session_id
+            'session_id': thread.session_id
         }, status=status.HTTP_200_OK)
     
-    def _get_gemini_response(self, user_message):
-        """Get response from Gemini API"""
+    def _user_message(self, request, data):
+        """The user's message, unsaved until the turn is complete"""
+        return Message(
+            role='user',
+            content=data['message'],
+            user_ip=self._get_client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', '')
+        )
+    
+    def _get_gemini_response(self, contents):
+        """Get response from Gemini API for the conversation `contents`"""
+        prompt = cacheable_prompt(contents)
+        if prompt is not None:
+            cached = get_response_cache().get(prompt)
+            if cached is not None:
+                return cached
+        
         try:
-            model = genai.GenerativeModel(
-                'gemini-2.0-flash-exp',
-                system_instruction=SYSTEM_INSTRUCTION
-            )
+            model = get_model('coach').model
             
-            response = model.generate_content(user_message)
-            return response.text if response.text else "I couldn't quite unearth an answer for that. Try asking something else!"
+            gemini = get_vendor('gemini')
+            response = gemini.call(
+                model.generate_content,
+                contents,
+                idempotent=True,
+                transient=GEMINI_TRANSIENT_ERRORS,
+                request_options={'timeout': gemini.read_timeout},
+            )
+            if not response.text:
+                return "I couldn't quite unearth an answer for that. Try asking something else!"
+            if prompt is not None:
+                get_response_cache().put(prompt, response.text)
+            return response.text
         except Exception as e:
             print(f"Error generating content: {e}")
             return "The mycelium network is currently busy. Please try again later."
     
     def _get_client_ip(self, request):
         """Get client IP address"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
+        return get_client_ip(request)
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Renders non-streamed replies (validation errors) as a single SSE event"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event('error', data).encode(self.charset)
+
+
+class ChatStreamView(ChatView):
+    """
+    Streaming variant of ChatView.
+    Relays Gemini's streamed completion as Server-Sent Events: one `token`
+    event per chunk, then a `done` event carrying the full message once it
+    has been saved.
+    """
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    async def post(self, request):
+        serializer = ChatMessageSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        thread, history = await load_thread(data['session_id'], data.get('email', ''))
+        contents = await build_contents(thread, history, data['message'])
+        turn = (thread, self._user_message(request, data), data.get('email', ''))
+        
+        # ASGI needs an async iterator to stream; a sync one would be buffered
+        if isinstance(request._request, ASGIRequest):
+            events = self._aevent_stream(turn, contents)
         else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+            events = self._event_stream(turn, contents)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    def _event_stream(self, turn, contents):
+        thread, user_message, email = turn
+        parts = []
+        for text in self._stream_text(contents):
+            parts.append(text)
+            yield sse_event('token', {'text': text})
+        
+        ai_response = self._final_message(parts)
+        save_turn(thread, user_message, ai_response, email)
+        yield sse_event('done', {'message': ai_response, 'session_id': thread.session_id})
+    
+    async def _aevent_stream(self, turn, contents):
+        thread, user_message, email = turn
+        # Each chunk is read on a worker thread so the event loop never blocks on Gemini
+        texts = self._stream_text(contents)
+        parts = []
+        try:
+            while True:
+                text = await run_in_vendor_thread(next, texts, None)
+                if text is None:
+                    break
+                parts.append(text)
+                yield sse_event('token', {'text': text})
+        finally:
+            texts.close()
+        
+        ai_response = self._final_message(parts)
+        await sync_to_async(save_turn)(thread, user_message, ai_response, email)
+        yield sse_event('done', {'message': ai_response, 'session_id': thread.session_id})
+    
+    def _stream_text(self, contents):
+        """Gemini's text chunks, or a fallback message if the stream fails before the first one"""
+        prompt = cacheable_prompt(contents)
+        if prompt is not None:
+            cached = get_response_cache().get(prompt)
+            if cached is not None:
+                yield cached
+                return
+        
+        parts = []
+        try:
+            for text in self._stream_gemini_response(contents):
+                parts.append(text)
+                yield text
+        except Exception as e:
+            print(f"Gemini streaming error: {e}")
+            if not parts:
+                yield "The mycelium network is currently busy. Please try again later."
+            return
+        
+        if prompt is not None and parts:
+            get_response_cache().put(prompt, ''.join(parts))
+    
+    def _final_message(self, parts):
+        return ''.join(parts) or "I couldn't quite unearth an answer for that. Try asking something else!"
+    
+    def _stream_gemini_response(self, contents):
+        """
+        Yield text chunks from Gemini as they arrive.
+        Calls streamGenerateContent with ?alt=sse on the pooled vendor
+        session directly: the SDK's REST transport reads the whole body
+        before yielding its first chunk.
+        """
+        coach = get_model('coach')
+        response = get_vendor('gemini').request(
+            'POST', f'/v1beta/{coach.model_name}:streamGenerateContent',
+            # Nothing has been relayed yet, so opening the stream is safe to retry
+            idempotent=True,
+            params={'alt': 'sse'},
+            headers={'x-goog-api-key': settings.GEMINI_API_KEY},
+            json=coach.request_body(contents),
+            stream=True,
+        )
+        with response:
+            response.raise_for_status()
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line.startswith('data:'):
+                    continue
+                for candidate in json.loads(line[5:]).get('candidates', [])[:1]:
+                    for part in candidate.get('content', {}).get('parts', []):
+                        if part.get('text'):
+                            yield part['text']
 
 
 @api_view(['GET'])
 def get_conversation_history(request, session_id):
-    """Get conversation history for a session"""
+    """
+    Get one page of conversation history for a session, newest page first.
+    Archived conversations are restored from cold storage on first read.
+    Query params: `before` or `after` (cursors from a previous page) and
+    `page_size` (default 50, max 200).
+    """
+    before = request.query_params.get('before')
+    after = request.query_params.get('after')
+    if before and after:
+        return Response({'error': 'Pass either before or after, not both'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        page_size = int(request.query_params.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        page_size = 0
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        return Response(
+            {'error': f'page_size must be between 1 and {MAX_PAGE_SIZE}'}, status=status.HTTP_400_BAD_REQUEST
+        )
+    
     try:
         thread = ConversationThread.objects.get(session_id=session_id)
-        serializer = ConversationThreadSerializer(thread)
-        return Response(serializer.data)
     except ConversationThread.DoesNotExist:
-        return Response({'messages': []}, status=status.HTTP_200_OK)
+        thread = rehydrate(session_id)
+        if thread is None:
+            return Response({'messages': [], 'before': None, 'after': None}, status=status.HTTP_200_OK)
+    
+    try:
+        messages, before, after = messages_page(thread, before=before, after=after, page_size=page_size)
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = ConversationThreadSerializer(thread).data
+    data['messages'] = MessageSerializer(messages, many=True).data
+    data['before'] = before
+    data['after'] = after
+    return Response(data)
+
+
+class ConversationExportView(APIView):
+    """
+    Admin export of a whole conversation as NDJSON, one message per line.
+    Messages are read in keyset batches and streamed as they are encoded,
+    so memory stays flat however long the thread is.
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request, session_id):
+        try:
+            thread = ConversationThread.objects.get(session_id=session_id)
+        except ConversationThread.DoesNotExist:
+            thread = rehydrate(session_id)
+            if thread is None:
+                return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        # ASGI needs an async iterator to stream; a sync one would be buffered
+        if isinstance(request._request, ASGIRequest):
+            lines = self._alines(thread)
+        else:
+            lines = self._lines(thread)
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="conversation-{thread.pk}.ndjson"'
+        return response
+    
+    def _encode(self, batch):
+        return ''.join(json.dumps(message) + '\n' for message in MessageSerializer(batch, many=True).data)
+    
+    def _lines(self, thread):
+        for batch in message_batches(thread):
+            yield self._encode(batch)
+    
+    async def _alines(self, thread):
+        batches = message_batches(thread)
+        while True:
+            batch = await sync_to_async(next)(batches, None)
+            if batch is None:
+                return
+            yield self._encode(batch)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def search_conversations(request):
+    """
+    Staff full-text search over message content, best match first.
+    Query params: `q` and `limit` (default 20, max 100).
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+    except ValueError:
+        return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({'query': query, 'results': search_messages(query, limit=limit)})
\ No newline at end of file
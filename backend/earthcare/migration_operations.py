@@ -0,0 +1,31 @@
+"""
+Migration operations shared by the apps.
+
+AddIndexOnline adds an index without blocking writes on PostgreSQL by
+building it CONCURRENTLY, which matters for tables the webhook, checkout
+and chat paths write to all the time. CONCURRENTLY cannot run inside a
+transaction, so migrations using it must set `atomic = False`. On other
+databases it is a plain AddIndex.
+"""
+from django.db.migrations.operations import AddIndex
+
+
+class AddIndexOnline(AddIndex):
+    """AddIndex that builds the index CONCURRENTLY on PostgreSQL"""
+
+    def _concurrently(self, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return {}
+        if schema_editor.connection.in_atomic_block:
+            raise ValueError(f'{self.describe()} needs a migration with atomic = False')
+        return {'concurrently': True}
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, **self._concurrently(schema_editor))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, **self._concurrently(schema_editor))
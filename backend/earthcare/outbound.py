@@ -0,0 +1,249 @@
+"""
+Shared outbound HTTP layer for vendor calls (Stripe, SendGrid, Gemini).
+
+Each vendor gets a persistent requests.Session with its own keep-alive
+connection pool, explicit connect/read timeouts, bounded retries with
+jittered exponential backoff for idempotent calls, and a circuit breaker.
+When a vendor keeps failing the breaker opens and calls fail fast with
+CircuitOpenError instead of tying up a worker until the timeout.
+
+Vendors are configured in settings.OUTBOUND_HTTP and looked up with
+get_vendor(name). Async views await blocking vendor calls with
+run_in_vendor_thread(), which runs them on a dedicated pool of
+OUTBOUND_THREADS threads so the event loop is never blocked.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+DEFAULTS = {
+    'base_url': '',
+    'connect_timeout': 3.05,
+    'read_timeout': 10.0,
+    'max_retries': 2,
+    'backoff_base': 0.25,
+    'backoff_max': 2.0,
+    'pool_size': 10,
+    'failure_threshold': 5,
+    'reset_timeout': 30.0,
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised when a vendor's circuit breaker is open"""
+
+    def __init__(self, vendor, retry_after):
+        super().__init__(f"{vendor} circuit is open; retry in {retry_after:.1f}s")
+        self.vendor = vendor
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    Opens after failure_threshold failures in a row, lets a single trial call
+    through once reset_timeout has passed, and closes again on success.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if elapsed < self.reset_timeout or self._trial_in_flight:
+                raise CircuitOpenError(self.name, max(self.reset_timeout - elapsed, 0))
+            self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        """End a call that said nothing about the vendor's health, so the next one can be the trial"""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class Vendor:
+    """Connection pool, timeouts, retry policy and circuit breaker for one vendor"""
+
+    def __init__(self, name, **options):
+        config = dict(DEFAULTS, **options)
+        self.name = name
+        self.base_url = config['base_url'].rstrip('/')
+        self.connect_timeout = config['connect_timeout']
+        self.read_timeout = config['read_timeout']
+        self.max_retries = config['max_retries']
+        self.backoff_base = config['backoff_base']
+        self.backoff_max = config['backoff_max']
+        self.pool_size = config['pool_size']
+        self.breaker = CircuitBreaker(name, config['failure_threshold'], config['reset_timeout'])
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff for the given retry attempt"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, url, idempotent=None, **kwargs):
+        """
+        Send an HTTP request through the vendor's pooled session.
+        Idempotent requests are retried on connection errors, timeouts and
+        429/5xx responses; others only when the connection was never made.
+        Returns the final requests.Response. Any other exception (a bad
+        URL, an error in a hook) leaves the breaker as it was.
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        if not url.startswith(('http://', 'https://')):
+            url = f"{self.base_url}{url}"
+        kwargs.setdefault('timeout', self.timeout)
+
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectTimeout:
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.breaker.record_failure()
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+            except Exception:
+                self.breaker.release_trial()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                if not idempotent or attempt >= self.max_retries:
+                    return response
+                # Release the connection of a streamed response before retrying
+                response.close()
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def call(self, func, *args, idempotent=False, transient=(), **kwargs):
+        """
+        Run a vendor SDK call under this vendor's breaker and retry policy.
+        Exceptions listed in `transient` count as vendor failures and are
+        retried when the call is idempotent; anything else is re-raised
+        straight away and does not trip the breaker.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                result = func(*args, **kwargs)
+            except transient:
+                self.breaker.record_failure()
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+            except Exception:
+                self.breaker.record_success()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+
+_vendors = {}
+_vendors_lock = threading.Lock()
+_executor = None
+
+
+def get_vendor(name):
+    """Return the process-wide Vendor for `name`, built from settings.OUTBOUND_HTTP"""
+    vendor = _vendors.get(name)
+    if vendor is None:
+        with _vendors_lock:
+            vendor = _vendors.get(name)
+            if vendor is None:
+                vendor = Vendor(name, **settings.OUTBOUND_HTTP.get(name, {}))
+                _vendors[name] = vendor
+    return vendor
+
+
+def reset_vendors():
+    """Drop all vendor pools and breakers (used by tests)"""
+    with _vendors_lock:
+        for vendor in _vendors.values():
+            if vendor._session is not None:
+                vendor._session.close()
+        _vendors.clear()
+
+
+def vendor_executor():
+    """Process-wide thread pool for vendor calls made from async views"""
+    global _executor
+    if _executor is None:
+        with _vendors_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.OUTBOUND_THREADS, thread_name_prefix='outbound'
+                )
+    return _executor
+
+
+async def run_in_vendor_thread(func, *args, **kwargs):
+    """Await a blocking vendor call without blocking the event loop"""
+    return await sync_to_async(func, thread_sensitive=False, executor=vendor_executor())(*args, **kwargs)
@@ -0,0 +1,117 @@
+"""
+EXPLAIN checks for the hot queries.
+
+HOT_QUERIES builds the querysets the store, coaching and newsletter
+request paths and workers run most often, and full_scans() explains one
+and returns the tables it reads in full. QueryPlanTests runs every entry,
+so a query that loses its index fails the suite.
+
+On PostgreSQL the EXPLAIN runs with enable_seqscan off: test tables are
+tiny, and the planner would happily scan them otherwise, so a Seq Scan
+left in the plan means no index can serve the query at all. SQLite
+reports the same thing as a bare SCAN of the table. An index walked from
+end to end without a condition is a full scan as well, unless the query
+only wants the first page.
+
+Tables that stay small by design (products, scheduled jobs) are left out.
+"""
+import json
+import re
+
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from coaching.models import ConversationThread, Message
+from coaching.turns import history_query
+from newsletter.models import NewsletterCampaign, NewsletterSubscriber, OutboxEmail
+from store.models import Customer, DailyProductSales, DailySales, Order, WholesaleInquiry
+from store.webhooks import due_events
+
+# Admin changelists show 100 rows per page
+ADMIN_PAGE = 100
+
+HOT_QUERIES = {
+    # store
+    'customer by email': lambda: Customer.objects.filter(email='buyer@example.com'),
+    'customer by Stripe ID': lambda: Customer.objects.filter(stripe_customer_id='cus_123'),
+    'order by payment intent': lambda: Order.objects.filter(stripe_payment_intent_id='pi_123'),
+    'pending orders to expire': lambda: (
+        Order.objects.filter(status='pending', created_at__lt=timezone.now()).order_by('created_at')
+    ),
+    'order admin': lambda: Order.objects.order_by('-created_at')[:ADMIN_PAGE],
+    'order admin by status': lambda: Order.objects.filter(status='paid').order_by('-created_at')[:ADMIN_PAGE],
+    'inquiry admin by status': lambda: (
+        WholesaleInquiry.objects.filter(status='new').order_by('-created_at')[:ADMIN_PAGE]
+    ),
+    'due Stripe events': lambda: due_events(timezone.now())[:50],
+    'sales dashboard days': lambda: (
+        DailySales.objects.filter(date__range=(timezone.localdate(), timezone.localdate()))
+    ),
+    'sales dashboard products': lambda: (
+        DailyProductSales.objects.filter(date__range=(timezone.localdate(), timezone.localdate()))
+        .values('product_id').annotate(units=Sum('units')).order_by('-units')[:10]
+    ),
+    # coaching
+    'chat history': lambda: history_query('session-123'),
+    'thread by session': lambda: ConversationThread.objects.filter(session_id='session-123'),
+    'threads by email': lambda: ConversationThread.objects.filter(email='buyer@example.com'),
+    'history page': lambda: Message.objects.filter(thread_id=1).order_by('-timestamp', '-pk')[:51],
+    'idle threads': lambda: ConversationThread.objects.filter(is_active=True, last_activity__lt=timezone.now()),
+    'thread admin': lambda: ConversationThread.objects.order_by('-last_activity')[:ADMIN_PAGE],
+    # newsletter
+    'subscriber by email': lambda: NewsletterSubscriber.objects.filter(email='reader@example.com'),
+    'active subscribers page': lambda: (
+        NewsletterSubscriber.objects.filter(is_active=True, id__gt=0).order_by('id').values_list('id', 'email')
+    ),
+    'subscriber admin': lambda: NewsletterSubscriber.objects.order_by('-subscribed_at')[:ADMIN_PAGE],
+    'due outbox emails': lambda: (
+        OutboxEmail.objects.filter(status='pending', next_attempt_at__lte=timezone.now()).order_by('next_attempt_at')
+    ),
+    'due campaigns': lambda: (
+        NewsletterCampaign.objects.filter(status='scheduled', scheduled_for__lte=timezone.now())
+        .order_by('scheduled_for')
+    ),
+}
+
+# "SCAN t" reads the whole table, "SCAN t USING INDEX i" the whole index;
+# "SEARCH t USING INDEX i (a=?)" is an index lookup
+SQLITE_SCAN = re.compile(r'\bSCAN (\w+)( USING)?')
+
+
+def explain(queryset, **options):
+    """The query plan of `queryset` as text"""
+    if connection.vendor != 'postgresql':
+        return queryset.explain(**options)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain(**options)
+
+
+def _postgres_full_scans(node, limited):
+    tables = set()
+    if node['Node Type'] == 'Seq Scan':
+        tables.add(node['Relation Name'])
+    elif node['Node Type'] in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in node and not limited:
+        tables.add(node['Relation Name'])
+    for child in node.get('Plans', []):
+        tables |= _postgres_full_scans(child, limited)
+    return tables
+
+
+def full_scans(queryset):
+    """
+    Tables `queryset` reads in full, according to EXPLAIN. Walking a whole
+    index counts too, unless the query is LIMITed (an ordered page).
+    """
+    limited = queryset.query.high_mark is not None
+    if connection.vendor == 'postgresql':
+        plan = json.loads(explain(queryset, format='json'))[0]['Plan']
+        return sorted(_postgres_full_scans(plan, limited))
+    if connection.vendor == 'sqlite':
+        return sorted({
+            match.group(1) for match in SQLITE_SCAN.finditer(explain(queryset))
+            if match.group(1) != 'CONSTANT' and not (match.group(2) and limited)
+        })
+    raise NotImplementedError(f'No plan check for {connection.vendor}')
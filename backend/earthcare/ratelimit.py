@@ -0,0 +1,194 @@
+"""
+Token-bucket rate limiting for the expensive endpoints.
+
+Views opt in with `throttle_classes = [TokenBucketThrottle]` and a
+`throttle_scope`; settings.RATE_LIMITS[scope] maps key types to DRF-style
+rates, e.g. {'ip': '30/min', 'session': '10/min', 'email': '20/min'}; an
+empty rate turns that bucket off. Each rate is a bucket of that many tokens refilled evenly over the period, so
+short bursts pass while the sustained rate stays capped. A request spends
+one token from the bucket of every key it carries, or none when one of
+them is empty, in which case it is refused with a 429 and Retry-After.
+
+The IP key is the client address as seen by the trusted proxies (see
+get_client_ip), which the client cannot choose. Session and email come
+from the request body, so a client can rotate them freely: those buckets
+only stop one session or address from being hammered from many IPs, and
+the IP bucket is what caps a single client.
+
+Buckets live in memory per worker (RATE_LIMIT_BACKEND='memory'), or in the
+Django cache (RATE_LIMIT_BACKEND='cache') so all workers share them; the
+shared backend does an unlocked read-modify-write, which can let a few
+extra requests through under contention. A bucket is two numbers. One
+that has been idle long enough to refill completely is identical to a
+fresh one, so in memory it is evicted, and in the cache it expires.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60)"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def get_client_ip(request):
+    """
+    The address of the client, as seen by the outermost trusted proxy.
+    Each of the TRUSTED_PROXY_COUNT proxies in front of the app appends the
+    address it received the request from to X-Forwarded-For, so the client
+    is that many entries from the right; anything further left was sent by
+    the client and cannot be trusted. Without proxies it is REMOTE_ADDR.
+    """
+    proxies = settings.TRUSTED_PROXY_COUNT
+    if proxies:
+        hops = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+def _refill(bucket, capacity, per_second, now):
+    """`bucket` (tokens, stamp) topped up to `now`; returns (tokens, seconds until one is available)"""
+    tokens, stamp = bucket or (capacity, now)
+    tokens = min(capacity, tokens + (now - stamp) * per_second)
+    if tokens >= 1:
+        return tokens, 0
+    return tokens, (1 - tokens) / per_second
+
+
+class Buckets:
+    """
+    take_all() spends a token from every bucket or from none: if one is
+    empty, the others keep their tokens and the longest wait is returned.
+    """
+
+    def take(self, key, capacity, per_second):
+        return self.take_all([(key, capacity, per_second)])
+
+
+class MemoryBuckets(Buckets):
+    """Per-worker buckets in least recently used order, dropped once idle and full"""
+
+    def __init__(self, max_keys=100000, clock=time.time):
+        self.max_keys = max_keys
+        self.clock = clock
+        # key -> (tokens, stamp, time the bucket is full again)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take_all(self, requests):
+        """requests: [(key, capacity, per_second)]; returns seconds to wait, 0 if tokens were spent"""
+        now = self.clock()
+        with self._lock:
+            self._evict(now)
+            refilled = []
+            for key, capacity, per_second in requests:
+                entry = self._buckets.pop(key, None)
+                refilled.append(_refill(entry[:2] if entry else None, capacity, per_second, now))
+            wait = max((bucket_wait for _, bucket_wait in refilled), default=0)
+            for (key, capacity, per_second), (tokens, _) in zip(requests, refilled):
+                if not wait:
+                    tokens -= 1
+                self._buckets[key] = (tokens, now, now + (capacity - tokens) / per_second)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _evict(self, now):
+        # Amortized O(1): only the least recently used end is inspected
+        while self._buckets:
+            key, (_, _, full_at) = next(iter(self._buckets.items()))
+            if full_at > now and len(self._buckets) < self.max_keys:
+                return
+            del self._buckets[key]
+
+
+class CacheBuckets(Buckets):
+    """Buckets shared by all workers through the Django cache"""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+
+    def take_all(self, requests):
+        now = self.clock()
+        cache_keys = [f"ratelimit:{hashlib.sha1(key.encode()).hexdigest()}" for key, _, _ in requests]
+        stored = cache.get_many(cache_keys)
+        refilled = [
+            _refill(stored.get(cache_key), capacity, per_second, now)
+            for cache_key, (_, capacity, per_second) in zip(cache_keys, requests)
+        ]
+        wait = max((bucket_wait for _, bucket_wait in refilled), default=0)
+        if wait:
+            return wait
+        for cache_key, (_, capacity, per_second), (tokens, _) in zip(cache_keys, requests, refilled):
+            tokens -= 1
+            # Expire once refilled: a missing bucket reads as full
+            cache.set(cache_key, (tokens, now), int((capacity - tokens) / per_second) + 1)
+        return 0
+
+
+_buckets = None
+_buckets_lock = threading.Lock()
+
+
+def get_buckets():
+    """The bucket store for settings.RATE_LIMIT_BACKEND"""
+    global _buckets
+    if _buckets is None:
+        with _buckets_lock:
+            if _buckets is None:
+                if settings.RATE_LIMIT_BACKEND == 'cache':
+                    _buckets = CacheBuckets()
+                else:
+                    _buckets = MemoryBuckets()
+    return _buckets
+
+
+def reset_rate_limits():
+    """Forget every bucket (used by tests and after changing the backend)"""
+    global _buckets
+    with _buckets_lock:
+        _buckets = None
+
+
+def request_keys(request):
+    """The rate-limited identities a request carries, by key type"""
+    data = request.data if hasattr(request.data, 'get') else {}
+    return {
+        'ip': get_client_ip(request),
+        'session': str(data.get('session_id') or ''),
+        'email': str(data.get('email') or '').strip().lower(),
+    }
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Applies settings.RATE_LIMITS[view.throttle_scope]"""
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        limits = settings.RATE_LIMITS.get(scope) if scope else None
+        self.wait_time = 0
+        if not limits:
+            return True
+
+        keys = request_keys(request)
+        requests = []
+        for kind, rate in limits.items():
+            if rate and keys.get(kind):
+                capacity, period = parse_rate(rate)
+                requests.append((f'{scope}:{kind}:{keys[kind]}', capacity, capacity / period))
+        self.wait_time = get_buckets().take_all(requests)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
@@ -59,6 +59,7 @@ INSTALLED_APPS = [
     'store',
     'coaching',
     'newsletter',
+    'scheduler',
 ]
 
 MIDDLEWARE = [
@@ -124,6 +125,9 @@ else:
             'PORT': config('DB_PORT', default=''),
         }
     }
+    if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+        # Seconds a write waits for SQLite's single writer lock before "database is locked"
+        DATABASES['default']['OPTIONS'] = {'timeout': config('SQLITE_TIMEOUT', default=20, cast=int)}
 
 
 # Password validation
@@ -186,8 +190,9 @@ MEDIA_ROOT = BASE_DIR / 'media'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # CORS Settings
+FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
 CORS_ALLOWED_ORIGINS = [
-    config('FRONTEND_URL', default='http://localhost:3000'),
+    FRONTEND_URL,
 ]
 CORS_ALLOW_CREDENTIALS = True
 
@@ -200,19 +205,185 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Cache
+# Point CACHE_BACKEND/CACHE_LOCATION at a shared backend (e.g. Redis or
+# Memcached) so cache-based invalidation reaches every worker and instance.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='earthcare'),
+    }
+}
+
+# Upper bound (seconds) on how long a worker serves its catalog snapshot
+# without rebuilding, in case a version bump never reaches it
+CATALOG_CACHE_MAX_AGE = config('CATALOG_CACHE_MAX_AGE', default=300, cast=int)
+
+# Cache-Control max-age (seconds) sent with product list/detail responses;
+# clients and proxies revalidate with If-None-Match after it expires
+CATALOG_HTTP_MAX_AGE = config('CATALOG_HTTP_MAX_AGE', default=60, cast=int)
+
+# Reverse proxies in front of the app that append to X-Forwarded-For (1 for
+# Cloud Run or a single nginx); the client IP is read that many entries from
+# the right. 0 trusts no header and uses REMOTE_ADDR.
+TRUSTED_PROXY_COUNT = config('TRUSTED_PROXY_COUNT', default=0, cast=int)
+
+# Rate limits (see earthcare/ratelimit.py): token buckets per throttle scope
+# and key type. 'memory' keeps buckets per worker; 'cache' shares them
+# through CACHES['default'] (use a shared backend such as Redis for that)
+RATE_LIMIT_BACKEND = config('RATE_LIMIT_BACKEND', default='memory')
+RATE_LIMITS = {
+    'chat': {
+        'ip': config('CHAT_RATE_LIMIT_IP', default='30/min'),
+        'session': config('CHAT_RATE_LIMIT_SESSION', default='10/min'),
+        'email': config('CHAT_RATE_LIMIT_EMAIL', default='20/min'),
+    },
+    'checkout': {
+        'ip': config('CHECKOUT_RATE_LIMIT_IP', default='10/min'),
+        'email': config('CHECKOUT_RATE_LIMIT_EMAIL', default='5/min'),
+    },
+}
+
 # Stripe Settings
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='')
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+# How long (seconds) an email -> Stripe customer ID lookup stays cached
+STRIPE_CUSTOMER_CACHE_TTL = config('STRIPE_CUSTOMER_CACHE_TTL', default=86400, cast=int)
+# Webhook event queue (see store/webhooks.py); events are applied in the
+# webhook request unless this is off, and retried by the scheduler
+STRIPE_APPLY_EVENTS_INLINE = config('STRIPE_APPLY_EVENTS_INLINE', default=True, cast=bool)
+STRIPE_EVENT_MAX_ATTEMPTS = config('STRIPE_EVENT_MAX_ATTEMPTS', default=8, cast=int)
+STRIPE_EVENT_LEASE_SECONDS = config('STRIPE_EVENT_LEASE_SECONDS', default=120, cast=int)
 
 # SendGrid Settings
 SENDGRID_API_KEY = config('SENDGRID_API_KEY', default='')
 FROM_EMAIL = config('FROM_EMAIL', default='hello@earthcare.food')
 ADMIN_EMAIL = config('ADMIN_EMAIL', default='admin@earthcare.food')
 
+# Email outbox (see newsletter/outbox.py)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+OUTBOX_LEASE_SECONDS = config('OUTBOX_LEASE_SECONDS', default=300, cast=int)
+
 # Gemini API
 GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
 
+# Gemini models (see coaching/gemini.py)
+# `system_instruction` is a dotted path to the prompt string; `cache_ttl`
+# (seconds) keeps it cached server-side as a cached context, 0 sends it
+# with every request
+GEMINI_MODELS = {
+    'coach': {
+        'model': config('GEMINI_MODEL', default='gemini-2.0-flash-exp'),
+        'system_instruction': 'coaching.prompts.SYSTEM_INSTRUCTION',
+        'generation_config': {
+            'temperature': config('GEMINI_TEMPERATURE', default=1.0, cast=float),
+            'max_output_tokens': config('GEMINI_MAX_OUTPUT_TOKENS', default=8192, cast=int),
+        },
+        'cache_ttl': config('GEMINI_CONTEXT_CACHE_TTL', default=3600, cast=int),
+    },
+    'summarizer': {
+        'model': config('GEMINI_MODEL', default='gemini-2.0-flash-exp'),
+        'system_instruction': 'coaching.prompts.SUMMARY_INSTRUCTION',
+        'generation_config': {'temperature': 0.2, 'max_output_tokens': 400},
+    },
+}
+
+# Chat context window (see coaching/context.py)
+# Estimated tokens of recent turns sent with each message; older turns are
+# folded into the thread's rolling summary
+COACH_HISTORY_TOKEN_BUDGET = config('COACH_HISTORY_TOKEN_BUDGET', default=2000, cast=int)
+COACH_HISTORY_MAX_MESSAGES = config('COACH_HISTORY_MAX_MESSAGES', default=50, cast=int)
+
+# Per-worker cache of replies to opening questions (see coaching/response_cache.py)
+# max_entries=0 disables it; `embedding` is the dotted path of a text -> vector
+# function (e.g. coaching.response_cache.gemini_embedding) enabling similarity hits
+COACH_RESPONSE_CACHE = {
+    'max_entries': config('COACH_CACHE_MAX_ENTRIES', default=500, cast=int),
+    'ttl': config('COACH_CACHE_TTL', default=86400, cast=int),
+    'embedding': config('COACH_CACHE_EMBEDDING', default=''),
+    'embedding_model': config('COACH_CACHE_EMBEDDING_MODEL', default='models/text-embedding-004'),
+    'similarity_threshold': config('COACH_CACHE_SIMILARITY', default=0.92, cast=float),
+}
+
+# Threads per server process that async views run blocking vendor calls on
+OUTBOUND_THREADS = config('OUTBOUND_THREADS', default=64, cast=int)
+
+# Outbound HTTP (see earthcare/outbound.py)
+# Per-vendor connection pool size, connect/read timeouts (seconds), retry
+# budget for idempotent calls and circuit breaker thresholds
+OUTBOUND_HTTP = {
+    'stripe': {
+        'connect_timeout': 3.05,
+        'read_timeout': config('STRIPE_READ_TIMEOUT', default=20.0, cast=float),
+        'max_retries': 2,
+    },
+    'sendgrid': {
+        'base_url': config('SENDGRID_API_URL', default='https://api.sendgrid.com'),
+        'connect_timeout': 3.05,
+        'read_timeout': config('SENDGRID_READ_TIMEOUT', default=10.0, cast=float),
+        'max_retries': 2,
+    },
+    'gemini': {
+        'base_url': config('GEMINI_API_URL', default='https://generativelanguage.googleapis.com'),
+        'read_timeout': config('GEMINI_READ_TIMEOUT', default=30.0, cast=float),
+        'max_retries': 1,
+    },
+}
+
+# Campaign open/click tracking (see newsletter/tracking.py)
+# Public base URL of this API, used in tracking pixels and click redirects
+TRACKING_BASE_URL = config('TRACKING_BASE_URL', default='http://localhost:8000')
+# Buffered hits are flushed after this many seconds or events
+TRACKING_FLUSH_INTERVAL = config('TRACKING_FLUSH_INTERVAL', default=10, cast=int)
+TRACKING_FLUSH_SIZE = config('TRACKING_FLUSH_SIZE', default=500, cast=int)
+# Events are dropped after failing this many flushes, and the oldest ones
+# beyond TRACKING_BUFFER_MAX, so a database outage cannot exhaust memory
+TRACKING_MAX_ATTEMPTS = config('TRACKING_MAX_ATTEMPTS', default=5, cast=int)
+TRACKING_BUFFER_MAX = config('TRACKING_BUFFER_MAX', default=20000, cast=int)
+
+# Scheduler (see scheduler/dispatch.py)
+# Recurring jobs run by `manage.py run_scheduler`; interval is in seconds
+SCHEDULED_JOBS = {
+    'send_due_campaigns': {
+        'callable': 'newsletter.jobs.send_due_campaigns',
+        'interval': 60,
+    },
+    'send_outbox': {
+        'callable': 'newsletter.jobs.send_outbox',
+        'interval': 30,
+    },
+    'process_stripe_events': {
+        'callable': 'store.jobs.process_stripe_events',
+        'interval': 60,
+    },
+    'expire_pending_orders': {
+        'callable': 'store.jobs.expire_pending_orders',
+        'interval': 600,
+    },
+    'deactivate_idle_conversations': {
+        'callable': 'coaching.jobs.deactivate_idle_conversations',
+        'interval': 3600,
+    },
+    'move_conversations_to_archive': {
+        'callable': 'coaching.jobs.move_conversations_to_archive',
+        'interval': 86400,
+    },
+}
+SCHEDULER_LEASE_SECONDS = config('SCHEDULER_LEASE_SECONDS', default=900, cast=int)
+PENDING_ORDER_TTL_HOURS = config('PENDING_ORDER_TTL_HOURS', default=24, cast=int)
+CONVERSATION_IDLE_DAYS = config('CONVERSATION_IDLE_DAYS', default=30, cast=int)
+# Conversations idle this long move to cold storage (see coaching/archive.py)
+CONVERSATION_ARCHIVE_DAYS = config('CONVERSATION_ARCHIVE_DAYS', default=180, cast=int)
+CONVERSATION_ARCHIVE_BATCH_SIZE = config('CONVERSATION_ARCHIVE_BATCH_SIZE', default=200, cast=int)
+# Any Django storage backend and its options, e.g. an S3 bucket
+CONVERSATION_ARCHIVE_STORAGE = {
+    'BACKEND': config('CONVERSATION_ARCHIVE_BACKEND', default='django.core.files.storage.FileSystemStorage'),
+    'OPTIONS': {'location': config('CONVERSATION_ARCHIVE_ROOT', default=str(BASE_DIR / 'archive' / 'conversations'))},
+}
+CAMPAIGN_BATCH_SIZE = config('CAMPAIGN_BATCH_SIZE', default=500, cast=int)
+CAMPAIGN_SEND_CONCURRENCY = config('CAMPAIGN_SEND_CONCURRENCY', default=4, cast=int)
+
 # TinyMCE Configuration
 TINYMCE_DEFAULT_CONFIG = {
     'height': 500,
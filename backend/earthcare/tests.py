@@ -0,0 +1,173 @@
+from unittest import mock, skipUnless
+
+import requests
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from store.models import Order
+
+from .outbound import CircuitOpenError, Vendor
+from .query_plans import HOT_QUERIES, full_scans
+from .ratelimit import CacheBuckets, MemoryBuckets, get_client_ip, parse_rate
+
+
+class TransientError(Exception):
+    pass
+
+
+class VendorCallTests(SimpleTestCase):
+    def make_vendor(self, **options):
+        options.setdefault('backoff_base', 0)
+        return Vendor('test', **options)
+
+    def test_idempotent_call_retried_until_success(self):
+        vendor = self.make_vendor(max_retries=2)
+        func = mock.Mock(side_effect=[TransientError(), TransientError(), 'ok'])
+        self.assertEqual(vendor.call(func, idempotent=True, transient=TransientError), 'ok')
+        self.assertEqual(func.call_count, 3)
+
+    def test_non_idempotent_call_not_retried(self):
+        vendor = self.make_vendor(max_retries=2)
+        func = mock.Mock(side_effect=TransientError())
+        with self.assertRaises(TransientError):
+            vendor.call(func, transient=TransientError)
+        self.assertEqual(func.call_count, 1)
+
+    def test_breaker_opens_and_fails_fast(self):
+        vendor = self.make_vendor(max_retries=0, failure_threshold=3, reset_timeout=60)
+        func = mock.Mock(side_effect=TransientError())
+        for _ in range(3):
+            with self.assertRaises(TransientError):
+                vendor.call(func, transient=TransientError)
+        with self.assertRaises(CircuitOpenError):
+            vendor.call(func, transient=TransientError)
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(vendor.breaker.state, 'open')
+
+    def test_breaker_half_open_trial_closes_on_success(self):
+        vendor = self.make_vendor(max_retries=0, failure_threshold=1, reset_timeout=0)
+        with self.assertRaises(TransientError):
+            vendor.call(mock.Mock(side_effect=TransientError()), transient=TransientError)
+        self.assertEqual(vendor.breaker.state, 'half-open')
+        self.assertEqual(vendor.call(mock.Mock(return_value='ok')), 'ok')
+        self.assertEqual(vendor.breaker.state, 'closed')
+
+    def test_client_errors_do_not_trip_breaker(self):
+        vendor = self.make_vendor(failure_threshold=1)
+        with self.assertRaises(ValueError):
+            vendor.call(mock.Mock(side_effect=ValueError()), transient=TransientError)
+        self.assertEqual(vendor.breaker.state, 'closed')
+
+
+class VendorRequestTests(SimpleTestCase):
+    def make_vendor(self, responses):
+        vendor = Vendor('test', base_url='https://vendor.test', backoff_base=0, max_retries=2)
+        vendor._session = mock.Mock()
+        vendor._session.request.side_effect = responses
+        return vendor
+
+    def test_get_retried_on_503_with_timeouts(self):
+        vendor = self.make_vendor([mock.Mock(status_code=503), mock.Mock(status_code=200)])
+        response = vendor.request('GET', '/v1/things')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(vendor._session.request.call_count, 2)
+        args, kwargs = vendor._session.request.call_args
+        self.assertEqual(args, ('GET', 'https://vendor.test/v1/things'))
+        self.assertEqual(kwargs['timeout'], vendor.timeout)
+
+    def test_post_only_retried_when_connection_never_made(self):
+        vendor = self.make_vendor([requests.exceptions.ConnectTimeout(), mock.Mock(status_code=202)])
+        self.assertEqual(vendor.request('POST', '/send').status_code, 202)
+
+        vendor = self.make_vendor([requests.exceptions.ReadTimeout()])
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            vendor.request('POST', '/send')
+        self.assertEqual(vendor._session.request.call_count, 1)
+
+    def test_unexpected_error_releases_half_open_trial(self):
+        vendor = self.make_vendor([requests.exceptions.ConnectionError(), ValueError(), mock.Mock(status_code=200)])
+        vendor.max_retries = 0
+        vendor.breaker.failure_threshold = 1
+        vendor.breaker.reset_timeout = 0
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            vendor.request('GET', '/v1/things')
+        with self.assertRaises(ValueError):
+            vendor.request('GET', '/v1/things')
+        self.assertEqual(vendor.breaker.state, 'half-open')
+        self.assertEqual(vendor.request('GET', '/v1/things').status_code, 200)
+        self.assertEqual(vendor.breaker.state, 'closed')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/min'), (10, 60))
+        self.assertEqual(parse_rate('5/s'), (5, 1))
+        self.assertEqual(parse_rate('100/hour'), (100, 3600))
+
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        for buckets in (MemoryBuckets(clock=clock), CacheBuckets(clock=clock)):
+            with self.subTest(buckets=type(buckets).__name__):
+                # 3 per minute: a burst of 3, then one token every 20s
+                waits = [buckets.take('k', 3, 3 / 60) for _ in range(4)]
+                self.assertEqual(waits[:3], [0, 0, 0])
+                self.assertAlmostEqual(waits[3], 20)
+                clock.now += 20
+                self.assertEqual(buckets.take('k', 3, 3 / 60), 0)
+                self.assertEqual(buckets.take('other', 3, 3 / 60), 0)
+                clock.now += 1000
+
+    def test_refused_request_spends_no_tokens(self):
+        clock = FakeClock()
+        for buckets in (MemoryBuckets(clock=clock), CacheBuckets(clock=clock)):
+            with self.subTest(buckets=type(buckets).__name__):
+                buckets.take('narrow', 1, 1 / 60)
+                # 'narrow' is empty, so 'wide' must keep its only token
+                self.assertAlmostEqual(buckets.take_all([('wide', 1, 1 / 60), ('narrow', 1, 1 / 60)]), 60)
+                self.assertEqual(buckets.take('wide', 1, 1 / 60), 0)
+                clock.now += 1000
+
+    def test_client_ip_ignores_client_supplied_hops(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='6.6.6.6, 1.2.3.4')
+        with override_settings(TRUSTED_PROXY_COUNT=0):
+            self.assertEqual(get_client_ip(request), '10.0.0.1')
+        with override_settings(TRUSTED_PROXY_COUNT=1):
+            self.assertEqual(get_client_ip(request), '1.2.3.4')
+        with override_settings(TRUSTED_PROXY_COUNT=3):
+            self.assertEqual(get_client_ip(request), '10.0.0.1')
+
+    def test_idle_full_buckets_are_evicted(self):
+        clock = FakeClock()
+        buckets = MemoryBuckets(clock=clock)
+        buckets.take('a', 2, 1)
+        buckets.take('b', 2, 1)
+        self.assertEqual(len(buckets), 2)
+        # Both refilled after a second; the next access sweeps them
+        clock.now += 1
+        buckets.take('c', 2, 1)
+        self.assertEqual(len(buckets), 1)
+
+    def test_key_count_is_bounded(self):
+        buckets = MemoryBuckets(max_keys=3, clock=FakeClock())
+        for i in range(10):
+            buckets.take(f'k{i}', 5, 0.1)
+        self.assertEqual(len(buckets), 3)
+
+
+@skipUnless(connection.vendor in ('postgresql', 'sqlite'), 'Query plans are only checked on PostgreSQL and SQLite')
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        for name, build in HOT_QUERIES.items():
+            with self.subTest(name):
+                self.assertEqual(full_scans(build()), [])
+
+    def test_unindexed_filter_is_reported(self):
+        self.assertEqual(full_scans(Order.objects.filter(shipping_city='Catskill')), ['store_order'])
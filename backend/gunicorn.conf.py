@@ -0,0 +1,60 @@
+"""
+Gunicorn settings.
+
+SERVER_MODE=asgi serves earthcare.asgi through uvicorn workers: the async
+chat, checkout and subscribe views await Gemini/Stripe on the
+OUTBOUND_THREADS pool while the event loop keeps accepting requests.
+SERVER_MODE=wsgi runs earthcare.wsgi on classic sync workers, where every
+in-flight vendor call holds a whole process. Without SERVER_MODE, asgi is
+used on PostgreSQL and wsgi on SQLite: SQLite takes one writer at a time,
+and the extra concurrent writes of async workers turn into "database is
+locked" errors (35 of 100 requests under bench_serving, against 5 on wsgi).
+
+Workers invalidate each other's catalog snapshots (and share rate-limit
+buckets with RATE_LIMIT_BACKEND=cache) through the Django cache, so with
+more than one worker it must be shared: without CACHE_BACKEND they use a
+file cache on this host, and a per-process backend refuses to start.
+Running several hosts or instances needs Redis or Memcached instead.
+"""
+import os
+
+# Not `from decouple import config`: gunicorn reads `config` as a setting
+import decouple
+
+
+def _uses_sqlite():
+    """Whether earthcare.settings will pick SQLite"""
+    if os.environ.get('USE_CLOUD_SQL') == 'True':
+        return False
+    return decouple.config('DB_ENGINE', default='django.db.backends.sqlite3').endswith('sqlite3')
+
+
+SERVER_MODE = os.environ.get('SERVER_MODE') or ('wsgi' if _uses_sqlite() else 'asgi')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '3'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'earthcare.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+elif SERVER_MODE == 'wsgi':
+    wsgi_app = 'earthcare.wsgi:application'
+else:
+    raise RuntimeError(f"SERVER_MODE must be 'asgi' or 'wsgi', not {SERVER_MODE!r}")
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+if workers > 1:
+    cache_backend = decouple.config('CACHE_BACKEND', default='')
+    if not cache_backend:
+        # Inherited by the workers, where settings.CACHES reads it
+        os.environ['CACHE_BACKEND'] = 'django.core.cache.backends.filebased.FileBasedCache'
+        os.environ['CACHE_LOCATION'] = decouple.config('CACHE_LOCATION', default='/tmp/earthcare-cache')
+    elif cache_backend in PROCESS_LOCAL_CACHES:
+        raise RuntimeError(
+            f"CACHE_BACKEND={cache_backend} is per process; {workers} workers would not see "
+            f"each other's catalog invalidations. Use Redis, Memcached or FileBasedCache"
+        )
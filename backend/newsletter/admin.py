@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import NewsletterSubscriber, NewsletterCampaign
+from django.utils import timezone
+from earthcare.exports import export_actions, streaming_response
+from .exports import SUBSCRIBER_EXPORT
+from .models import NewsletterSubscriber, NewsletterCampaign, CampaignEvent, OutboxEmail
 
 
 @admin.register(NewsletterSubscriber)
@@ -19,13 +22,11 @@ class NewsletterSubscriberAdmin(admin.ModelAdmin):
         }),
     )
 
-    actions = ['export_active_emails']
+    actions = ['export_active_emails', *export_actions(SUBSCRIBER_EXPORT)]
 
     def export_active_emails(self, request, queryset):
-        """Action to export active subscriber emails"""
-        active_subs = queryset.filter(is_active=True)
-        emails = ', '.join([sub.email for sub in active_subs])
-        self.message_user(request, f"Active emails ({active_subs.count()}): {emails}")
+        """Action to download the selected active subscribers as CSV"""
+        return streaming_response(request, SUBSCRIBER_EXPORT, queryset.filter(is_active=True))
     export_active_emails.short_description = "Export active subscriber emails"
 
 
@@ -34,7 +35,7 @@ class NewsletterCampaignAdmin(admin.ModelAdmin):
     list_display = ('subject', 'status', 'recipients_count', 'opened_count', 'clicked_count', 'scheduled_for', 'sent_at')
     list_filter = ('status', 'scheduled_for', 'sent_at', 'created_at')
     search_fields = ('subject', 'content_text')
-    readonly_fields = ('recipients_count', 'opened_count', 'clicked_count', 'sent_at', 'created_at', 'updated_at')
+    readonly_fields = ('recipients_count', 'opened_count', 'clicked_count', 'sent_at', 'last_sent_subscriber_id', 'created_at', 'updated_at')
     
     fieldsets = (
         ('Campaign Information', {
@@ -44,7 +45,7 @@ class NewsletterCampaignAdmin(admin.ModelAdmin):
             'fields': ('content_html', 'content_text')
         }),
         ('Analytics', {
-            'fields': ('recipients_count', 'opened_count', 'clicked_count', 'sent_at'),
+            'fields': ('recipients_count', 'opened_count', 'clicked_count', 'sent_at', 'last_sent_subscriber_id'),
             'classes': ('collapse',)
         }),
         ('Timestamps', {
@@ -52,3 +53,28 @@ class NewsletterCampaignAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(CampaignEvent)
+class CampaignEventAdmin(admin.ModelAdmin):
+    list_display = ('campaign', 'subscriber', 'kind', 'url', 'occurred_at')
+    list_filter = ('kind', 'occurred_at')
+    search_fields = ('subscriber__email', 'url')
+    list_select_related = ('campaign', 'subscriber')
+    readonly_fields = ('campaign', 'subscriber', 'kind', 'url', 'occurred_at')
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'kind', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'kind', 'created_at')
+    search_fields = ('to_email', 'subject')
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'sent_at')
+    actions = ['requeue_emails']
+
+    def requeue_emails(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} email(s) requeued.')
+    requeue_emails.short_description = 'Requeue selected emails'
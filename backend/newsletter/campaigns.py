@@ -0,0 +1,243 @@
+"""
+Campaign send engine.
+
+Active subscribers are streamed in subscriber-ID order with a server-side
+cursor and grouped into fixed-size batches. Each batch becomes one
+SendGrid mail/send request with one personalization per recipient, and up
+to `concurrency` requests are in flight at once.
+
+Every batch is recorded as a CampaignBatch row before it is sent and marked
+sent, with SendGrid's X-Message-Id, once SendGrid accepts it. The
+campaign's last_sent_subscriber_id only advances over the contiguous run of
+sent batches, so a crashed or failed send can be resumed: sent batches are
+skipped and only the rest go out.
+
+Sends are at most once. A batch SendGrid refused (an error response, or a
+connection that was never made) is sent again on resume. A batch whose
+outcome is unknown (still marked sending after a crash, or a timeout or
+dropped connection after the request went out) may already have been
+delivered, so it is marked unconfirmed and skipped. Once SendGrid's
+activity feed shows it never arrived, resume with resend_unconfirmed to
+send those batches again.
+"""
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from django.conf import settings
+from django.db.models import F, Min
+from django.utils import timezone
+
+from earthcare.outbound import get_vendor
+
+from .models import CampaignBatch, NewsletterCampaign, NewsletterSubscriber
+from .tracking import TOKEN_PLACEHOLDER, instrument_html, make_token
+
+# SendGrid accepts at most 1000 personalizations per request
+MAX_BATCH_SIZE = 1000
+
+
+class CampaignSendError(Exception):
+    """Raised when a campaign cannot be started or a batch fails to send"""
+
+
+def build_payload(campaign, recipients, html=None):
+    """
+    mail/send request body for one batch of (id, email, first_name) rows.
+    `html` is the tracking-instrumented body; defaults to the raw content.
+    """
+    return {
+        'personalizations': [
+            {
+                'to': [{'email': email}],
+                'substitutions': {
+                    '{{first_name}}': first_name or 'there',
+                    '{{email}}': email,
+                    TOKEN_PLACEHOLDER: make_token(campaign.id, subscriber_id),
+                },
+            }
+            for subscriber_id, email, first_name in recipients
+        ],
+        'from': {'email': settings.FROM_EMAIL},
+        'subject': campaign.subject,
+        'content': [
+            {'type': 'text/plain', 'value': campaign.content_text},
+            {'type': 'text/html', 'value': html or campaign.content_html},
+        ],
+        'custom_args': {'campaign_id': str(campaign.id)},
+    }
+
+
+def post_batch(payload):
+    """Send one mail/send request; returns SendGrid's message ID"""
+    response = get_vendor('sendgrid').request(
+        'POST', '/v3/mail/send',
+        json=payload,
+        headers={'Authorization': f'Bearer {settings.SENDGRID_API_KEY}'},
+    )
+    response.raise_for_status()
+    return response.headers.get('X-Message-Id', '')
+
+
+def _refused(error):
+    """Whether SendGrid certainly did not accept a batch that failed with `error`"""
+    return isinstance(error, (requests.exceptions.HTTPError, requests.exceptions.ConnectTimeout))
+
+
+class CampaignSender:
+    """Sends one campaign in checkpointed, concurrently posted batches"""
+
+    def __init__(self, campaign, batch_size=500, concurrency=4, progress=None):
+        if not 0 < batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f'batch_size must be between 1 and {MAX_BATCH_SIZE}')
+        self.campaign = campaign
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.progress = progress
+        self.sent = 0
+        self.unconfirmed = 0
+        self.started = None
+
+    @property
+    def rate(self):
+        """Emails per second since the send started"""
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return self.sent / elapsed if elapsed else 0.0
+
+    def run(self, resume=False, resend_unconfirmed=False):
+        """
+        Send the campaign; returns the number of emails sent by this run.
+        Unconfirmed batches are skipped (and counted in self.unconfirmed)
+        unless resend_unconfirmed is set.
+        """
+        if not settings.SENDGRID_API_KEY:
+            raise CampaignSendError('SendGrid API key not configured')
+        self._claim(resume)
+
+        batches = CampaignBatch.objects.filter(campaign=self.campaign)
+        # A batch still marked sending may have been accepted before the crash
+        batches.filter(status='sending').update(
+            status='unconfirmed', error='Send was interrupted before SendGrid answered'
+        )
+        retry = batches.filter(status__in=['failed', 'unconfirmed'] if resend_unconfirmed else ['failed'])
+        # Skipped unconfirmed batches let the checkpoint move past them
+        first_retried = retry.aggregate(first=Min('first_subscriber_id'))['first']
+        checkpoint = self.campaign.last_sent_subscriber_id
+        if first_retried is not None:
+            checkpoint = min(checkpoint, first_retried - 1)
+        retry.delete()
+        skipped = (
+            batches.filter(last_subscriber_id__gt=checkpoint)
+            .values_list('first_subscriber_id', 'last_subscriber_id', 'status', 'recipients')
+        )
+        sent_ranges = []
+        for first, last, status, recipients in skipped:
+            sent_ranges.append((first, last))
+            if status == 'unconfirmed':
+                self.unconfirmed += recipients
+
+        html = instrument_html(self.campaign.content_html)
+        self.started = time.monotonic()
+        in_flight = deque()
+        failure = None
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for recipients in self._batches(checkpoint, sent_ranges):
+                # Bound the number of requests in flight
+                while True:
+                    pending = [e['future'] for e in in_flight if not e['future'].done()]
+                    if len(pending) < self.concurrency:
+                        break
+                    wait(pending, return_when=FIRST_COMPLETED)
+                failure = self._collect(in_flight)
+                if failure:
+                    break
+
+                batch = CampaignBatch.objects.create(
+                    campaign=self.campaign,
+                    first_subscriber_id=recipients[0][0],
+                    last_subscriber_id=recipients[-1][0],
+                    recipients=len(recipients),
+                )
+                future = pool.submit(post_batch, build_payload(self.campaign, recipients, html))
+                in_flight.append({'batch': batch, 'future': future, 'recorded': False})
+
+            wait([e['future'] for e in in_flight])
+            failure = self._collect(in_flight) or failure
+
+        if failure:
+            raise CampaignSendError(f'Campaign {self.campaign.id} stopped: {failure}')
+
+        NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(
+            status='sent', sent_at=timezone.now()
+        )
+        return self.sent
+
+    def _claim(self, resume):
+        statuses = ['draft', 'scheduled'] + (['sending', 'failed'] if resume else [])
+        claimed = NewsletterCampaign.objects.filter(
+            pk=self.campaign.pk, status__in=statuses
+        ).update(status='sending')
+        if not claimed:
+            raise CampaignSendError(
+                f'Campaign {self.campaign.id} is not sendable '
+                f'(use resume to continue a send that is already in progress)'
+            )
+        self.campaign.refresh_from_db()
+
+    def _batches(self, checkpoint, sent_ranges):
+        subscribers = (
+            NewsletterSubscriber.objects
+            .filter(is_active=True, id__gt=checkpoint)
+            .order_by('id')
+            .values_list('id', 'email', 'first_name')
+            .iterator(chunk_size=self.batch_size)
+        )
+        batch = []
+        for row in subscribers:
+            if any(first <= row[0] <= last for first, last in sent_ranges):
+                continue
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _collect(self, in_flight):
+        """
+        Record newly finished batches and advance the checkpoint over the
+        contiguous prefix of sent batches. Returns the first error seen.
+        """
+        failure = None
+        for entry in in_flight:
+            batch, future = entry['batch'], entry['future']
+            if entry['recorded'] or not future.done():
+                continue
+            entry['recorded'] = True
+            error = future.exception()
+            if error is None:
+                CampaignBatch.objects.filter(pk=batch.pk).update(
+                    status='sent', message_id=future.result(), sent_at=timezone.now()
+                )
+                NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(
+                    recipients_count=F('recipients_count') + batch.recipients
+                )
+                batch.status = 'sent'
+                self.sent += batch.recipients
+                if self.progress:
+                    self.progress(self)
+            else:
+                batch.status = 'failed' if _refused(error) else 'unconfirmed'
+                CampaignBatch.objects.filter(pk=batch.pk).update(status=batch.status, error=str(error))
+                failure = failure or error
+
+        checkpoint = None
+        while in_flight and in_flight[0]['batch'].status == 'sent':
+            checkpoint = in_flight.popleft()['batch'].last_subscriber_id
+        if checkpoint is not None:
+            # Re-sent batches sit below the checkpoint; never move it back
+            NewsletterCampaign.objects.filter(pk=self.campaign.pk, last_sent_subscriber_id__lt=checkpoint).update(
+                last_sent_subscriber_id=checkpoint
+            )
+        return failure
@@ -0,0 +1,101 @@
+"""Email content for newsletter and transactional messages"""
+from django.conf import settings
+from django.utils.html import escape
+
+WELCOME_SUBJECT = 'Welcome to Earth Care Food Company! 🌱'
+ORDER_CONFIRMATION_SUBJECT = 'Your Earth Care order {order_number} is confirmed'
+
+
+def welcome_email_html(subscriber):
+    """HTML body of the welcome email sent to new subscribers"""
+    return f'''
+    <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h1 style="color: #4a5d23;">Welcome to Earth Care Food Company!</h1>
+                
+                <p>Hi {subscriber.first_name or 'there'},</p>
+                
+                <p>Thank you for subscribing to our newsletter! We're thrilled to have you join our community of health-conscious food lovers who care about the planet.</p>
+                
+                <h2 style="color: #4a5d23;">🎁 Special Welcome Offer</h2>
+                <p style="font-size: 18px; background-color: #f4f4f4; padding: 15px; border-left: 4px solid #4a5d23;">
+                    <strong>Get 10% off your first order!</strong><br>
+                    Subscribe at checkout to automatically receive your discount.
+                </p>
+                
+                <h3>What to Expect:</h3>
+                <ul>
+                    <li>🥛 Updates on new products and seasonal offerings</li>
+                    <li>🌱 Tips on gut health and the gut-brain connection</li>
+                    <li>♻️ Stories from our zero-waste dairy farm</li>
+                    <li>🎯 Exclusive subscriber-only deals</li>
+                </ul>
+                
+                <p style="margin-top: 30px;">
+                    <a href="{settings.FRONTEND_URL}" style="background-color: #4a5d23; color: white; padding: 12px 24px; text-decoration: none; border-radius: 4px; display: inline-block;">
+                        Start Shopping
+                    </a>
+                </p>
+                
+                <p style="margin-top: 30px; color: #666; font-size: 14px;">
+                    Questions? Reply to this email – we'd love to hear from you!
+                </p>
+                
+                <p style="margin-top: 20px; color: #666; font-size: 12px;">
+                    If you didn't subscribe to this newsletter, you can 
+                    <a href="{settings.FRONTEND_URL}/unsubscribe?email={subscriber.email}">unsubscribe here</a>.
+                </p>
+            </div>
+        </body>
+    </html>
+    '''
+
+
+def order_confirmation_html(order):
+    """HTML body of the email sent when an order is paid"""
+    rows = ''.join(
+        f'''
+                    <tr>
+                        <td style="padding: 6px 0;">{escape(item.product_name)} × {item.quantity}</td>
+                        <td style="padding: 6px 0; text-align: right;">${item.total_price}</td>
+                    </tr>'''
+        for item in order.items.all()
+    )
+    discount = f'''
+                    <tr>
+                        <td style="padding: 6px 0;">Subscriber discount</td>
+                        <td style="padding: 6px 0; text-align: right;">-${order.discount_amount}</td>
+                    </tr>''' if order.discount_amount else ''
+    return f'''
+    <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h1 style="color: #4a5d23;">Thank you for your order!</h1>
+                
+                <p>Hi {escape(order.shipping_first_name) or 'there'},</p>
+                
+                <p>We've received your payment for order <strong>{order.order_number}</strong> and are getting it ready to ship.</p>
+                
+                <table style="width: 100%; border-collapse: collapse; border-top: 1px solid #ddd;">{rows}{discount}
+                    <tr style="border-top: 1px solid #ddd; font-weight: bold;">
+                        <td style="padding: 6px 0;">Total</td>
+                        <td style="padding: 6px 0; text-align: right;">${order.total_amount}</td>
+                    </tr>
+                </table>
+                
+                <h3>Shipping to:</h3>
+                <p>
+                    {escape(order.shipping_first_name)} {escape(order.shipping_last_name)}<br>
+                    {escape(order.shipping_address_line1)}<br>
+                    {escape(order.shipping_address_line2) + '<br>' if order.shipping_address_line2 else ''}
+                    {escape(order.shipping_city)}, {escape(order.shipping_state)} {escape(order.shipping_zip_code)}
+                </p>
+                
+                <p style="margin-top: 30px; color: #666; font-size: 14px;">
+                    Questions? Reply to this email – we'd love to hear from you!
+                </p>
+            </div>
+        </body>
+    </html>
+    '''
@@ -0,0 +1,10 @@
+"""Bulk exports of newsletter data; see earthcare/exports.py"""
+from earthcare.exports import Export
+
+from .models import NewsletterSubscriber
+
+SUBSCRIBER_EXPORT = Export(
+    'subscribers', NewsletterSubscriber,
+    fields=('email', 'first_name', 'is_active', 'source', 'subscribed_at', 'unsubscribed_at'),
+    date_field='subscribed_at',
+)
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.utils import timezone
+
+from scheduler.dispatch import claim_rows
+
+from .campaigns import CampaignSender
+from .models import NewsletterCampaign
+from .outbox import process_batch
+
+
+def send_due_campaigns():
+    """
+    Send every scheduled campaign whose scheduled_for has passed.
+    Each campaign is claimed by flipping it to 'sending', so only one
+    scheduler replica ever sends it. A send that fails marks the campaign
+    'failed' (continue it with send_campaign --resume) and the next due
+    campaign is sent.
+    """
+    sent, failed = [], []
+    while True:
+        due = NewsletterCampaign.objects.filter(
+            status='scheduled', scheduled_for__lte=timezone.now()
+        ).order_by('scheduled_for')
+        claimed = claim_rows(due, 1, status='sending')
+        if not claimed:
+            break
+
+        campaign = claimed[0]
+        try:
+            CampaignSender(
+                campaign,
+                batch_size=settings.CAMPAIGN_BATCH_SIZE,
+                concurrency=settings.CAMPAIGN_SEND_CONCURRENCY,
+            ).run(resume=True)
+        except Exception as e:
+            print(f"Error sending campaign {campaign.id}: {e}")
+            NewsletterCampaign.objects.filter(pk=campaign.pk, status='sending').update(status='failed')
+            failed.append(campaign.id)
+        else:
+            sent.append(campaign.id)
+    if not (sent or failed):
+        return 'No campaigns due'
+    return f'Sent campaigns: {sent}' + (f'; failed: {failed}' if failed else '')
+
+
+def send_outbox(batch_size=50):
+    """Deliver every outbox email that is due"""
+    totals = [0, 0, 0]
+    while True:
+        counts = process_batch(batch_size)
+        if not any(counts):
+            break
+        totals = [total + count for total, count in zip(totals, counts)]
+    return 'Outbox: {} sent, {} retrying, {} dead-lettered'.format(*totals)
@@ -0,0 +1,31 @@
+"""
+Drain the email outbox.
+
+Runs a single batch by default; with --loop it keeps polling, sleeping
+--interval seconds whenever the outbox has nothing due.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from newsletter.outbox import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbox emails in batches, retrying and dead-lettering failures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new emails')
+        parser.add_argument('--interval', type=float, default=5.0, help='Idle poll interval in seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, retried, dead = process_batch(options['batch_size'])
+            if sent or retried or dead:
+                self.stdout.write(f'Outbox batch: {sent} sent, {retried} retrying, {dead} dead-lettered')
+
+            if not options['loop']:
+                break
+            if not (sent or retried or dead):
+                time.sleep(options['interval'])
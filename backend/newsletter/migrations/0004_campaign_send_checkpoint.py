@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0003_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newslettercampaign',
+            name='last_sent_subscriber_id',
+            field=models.BigIntegerField(default=0, help_text='Send checkpoint: every active subscriber up to this ID has been sent to'),
+        ),
+        migrations.AlterField(
+            model_name='newslettercampaign',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('scheduled', 'Scheduled'), ('sending', 'Sending'), ('sent', 'Sent'), ('cancelled', 'Cancelled')], default='draft', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='CampaignBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_subscriber_id', models.BigIntegerField()),
+                ('last_subscriber_id', models.BigIntegerField()),
+                ('recipients', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='sending', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='newsletter.newslettercampaign')),
+            ],
+            options={
+                'verbose_name': 'Campaign Batch',
+                'verbose_name_plural': 'Campaign Batches',
+                'ordering': ['campaign', 'first_subscriber_id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='campaignbatch',
+            constraint=models.UniqueConstraint(fields=('campaign', 'first_subscriber_id'), name='unique_campaign_batch_start'),
+        ),
+    ]
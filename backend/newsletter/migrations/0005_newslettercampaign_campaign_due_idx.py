@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0004_campaign_send_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newslettercampaign',
+            index=models.Index(fields=['status', 'scheduled_for'], name='campaign_due_idx'),
+        ),
+    ]
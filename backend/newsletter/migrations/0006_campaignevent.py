@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0005_newslettercampaign_campaign_due_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('open', 'Open'), ('click', 'Click')], max_length=10)),
+                ('url', models.URLField(blank=True, max_length=1000)),
+                ('occurred_at', models.DateTimeField()),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='newsletter.newslettercampaign')),
+                ('subscriber', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='campaign_events', to='newsletter.newslettersubscriber')),
+            ],
+            options={
+                'verbose_name': 'Campaign Event',
+                'verbose_name_plural': 'Campaign Events',
+                'ordering': ['-occurred_at'],
+                'indexes': [models.Index(fields=['campaign', 'kind'], name='campaignevent_kind_idx'), models.Index(fields=['subscriber', 'occurred_at'], name='campaignevent_sub_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:50
+
+from django.db import migrations, models
+
+from earthcare.migration_operations import AddIndexOnline
+
+
+class Migration(migrations.Migration):
+    # Indexes are built CONCURRENTLY on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('newsletter', '0006_campaignevent'),
+    ]
+
+    operations = [
+        AddIndexOnline(
+            model_name='newslettersubscriber',
+            index=models.Index(fields=['subscribed_at'], name='subscriber_subscribed_idx'),
+        ),
+        AddIndexOnline(
+            model_name='newslettersubscriber',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='subscriber_active_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0007_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaignbatch',
+            name='message_id',
+            field=models.CharField(blank=True, help_text='X-Message-Id SendGrid returned', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='campaignbatch',
+            name='status',
+            field=models.CharField(choices=[('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'), ('unconfirmed', 'Unconfirmed')], default='sending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0008_campaignbatch_message_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='newslettercampaign',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('scheduled', 'Scheduled'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='draft', max_length=20),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import EmailValidator
+from django.utils import timezone
 from tinymce.models import HTMLField
 
 
@@ -18,6 +19,11 @@ class NewsletterSubscriber(models.Model):
 
     class Meta:
         ordering = ['-subscribed_at']
+        indexes = [
+            models.Index(fields=['subscribed_at'], name='subscriber_subscribed_idx'),
+            # Campaign sends page through active subscribers by id
+            models.Index(fields=['id'], name='subscriber_active_idx', condition=models.Q(is_active=True)),
+        ]
         verbose_name = 'Newsletter Subscriber'
         verbose_name_plural = 'Newsletter Subscribers'
 
@@ -30,7 +36,9 @@ class NewsletterCampaign(models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
         ('scheduled', 'Scheduled'),
+        ('sending', 'Sending'),
         ('sent', 'Sent'),
+        ('failed', 'Failed'),
         ('cancelled', 'Cancelled'),
     ]
 
@@ -43,13 +51,112 @@ class NewsletterCampaign(models.Model):
     recipients_count = models.IntegerField(default=0)
     opened_count = models.IntegerField(default=0)
     clicked_count = models.IntegerField(default=0)
+    last_sent_subscriber_id = models.BigIntegerField(
+        default=0,
+        help_text="Send checkpoint: every active subscriber up to this ID has been sent to"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'scheduled_for'], name='campaign_due_idx'),
+        ]
         verbose_name = 'Newsletter Campaign'
         verbose_name_plural = 'Newsletter Campaigns'
 
     def __str__(self):
         return f"{self.subject} - {self.status}"
+
+
+class CampaignBatch(models.Model):
+    """One SendGrid request of a campaign send, covering a range of subscriber IDs"""
+    STATUS_CHOICES = [
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('unconfirmed', 'Unconfirmed'),
+    ]
+
+    campaign = models.ForeignKey(NewsletterCampaign, on_delete=models.CASCADE, related_name='batches')
+    first_subscriber_id = models.BigIntegerField()
+    last_subscriber_id = models.BigIntegerField()
+    recipients = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='sending')
+    message_id = models.CharField(max_length=100, blank=True, help_text='X-Message-Id SendGrid returned')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['campaign', 'first_subscriber_id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['campaign', 'first_subscriber_id'], name='unique_campaign_batch_start'
+            ),
+        ]
+        verbose_name = 'Campaign Batch'
+        verbose_name_plural = 'Campaign Batches'
+
+    def __str__(self):
+        return f"{self.campaign_id}: subscribers {self.first_subscriber_id}-{self.last_subscriber_id} ({self.status})"
+
+
+class CampaignEvent(models.Model):
+    """Append-only log of campaign opens and clicks, one row per tracked hit"""
+    KIND_CHOICES = [
+        ('open', 'Open'),
+        ('click', 'Click'),
+    ]
+
+    campaign = models.ForeignKey(NewsletterCampaign, on_delete=models.CASCADE, related_name='events')
+    subscriber = models.ForeignKey(
+        NewsletterSubscriber, on_delete=models.SET_NULL, null=True, related_name='campaign_events'
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    url = models.URLField(max_length=1000, blank=True)
+    occurred_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-occurred_at']
+        indexes = [
+            models.Index(fields=['campaign', 'kind'], name='campaignevent_kind_idx'),
+            models.Index(fields=['subscriber', 'occurred_at'], name='campaignevent_sub_idx'),
+        ]
+        verbose_name = 'Campaign Event'
+        verbose_name_plural = 'Campaign Events'
+
+    def __str__(self):
+        return f"{self.kind} - campaign {self.campaign_id}"
+
+
+class OutboxEmail(models.Model):
+    """Transactional email queued for delivery by the send_outbox worker"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead-lettered'),
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=200)
+    html_content = models.TextField()
+    kind = models.CharField(max_length=50, default='transactional', help_text="e.g., welcome")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+        verbose_name = 'Outbox Email'
+        verbose_name_plural = 'Outbox Emails'
+
+    def __str__(self):
+        return f"{self.kind} to {self.to_email} - {self.status}"
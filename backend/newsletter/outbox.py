@@ -0,0 +1,116 @@
+"""
+Durable email outbox.
+
+Request handlers only insert an OutboxEmail row; the send_outbox scheduler
+job (or the send_outbox command) claims due rows in batches and delivers
+them through SendGrid. Claims go through scheduler.dispatch.claim_rows, a
+compare-and-set UPDATE on the due filter, so two workers never claim the
+same row, even on SQLite. A claimed row is hidden from other workers for
+OUTBOX_LEASE_SECONDS, so a worker that crashes mid-batch simply lets its
+rows become due again. Failed sends
+are retried with exponential backoff and dead-lettered after
+OUTBOX_MAX_ATTEMPTS.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from sendgrid.helpers.mail import Mail
+
+from earthcare.outbound import get_vendor
+from scheduler.dispatch import claim_rows
+
+from .emails import ORDER_CONFIRMATION_SUBJECT, WELCOME_SUBJECT, order_confirmation_html, welcome_email_html
+from .models import OutboxEmail
+
+
+def enqueue_email(to_email, subject, html_content, kind='transactional'):
+    """Queue an email for delivery"""
+    return OutboxEmail.objects.create(
+        to_email=to_email,
+        subject=subject,
+        html_content=html_content,
+        kind=kind,
+    )
+
+
+def enqueue_welcome_email(subscriber):
+    """Queue the welcome email for a new or reactivated subscriber"""
+    return enqueue_email(
+        subscriber.email, WELCOME_SUBJECT, welcome_email_html(subscriber), kind='welcome'
+    )
+
+
+def enqueue_order_confirmation(order):
+    """Queue the confirmation email for a paid order; guest orders without a customer get none"""
+    if order.customer is None:
+        return None
+    return enqueue_email(
+        order.customer.email,
+        ORDER_CONFIRMATION_SUBJECT.format(order_number=order.order_number),
+        order_confirmation_html(order),
+        kind='order_confirmation',
+    )
+
+
+def claim_batch(batch_size):
+    """Claim up to batch_size due emails, pushing them out of view for the lease period"""
+    now = timezone.now()
+    due = OutboxEmail.objects.filter(status='pending', next_attempt_at__lte=now).order_by('next_attempt_at')
+    return claim_rows(
+        due, batch_size,
+        next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS),
+    )
+
+
+def deliver(email):
+    """Send one outbox email through SendGrid; raises on failure"""
+    if not settings.SENDGRID_API_KEY:
+        raise RuntimeError("SendGrid API key not configured")
+
+    message = Mail(
+        from_email=settings.FROM_EMAIL,
+        to_emails=email.to_email,
+        subject=email.subject,
+        html_content=email.html_content,
+    )
+    response = get_vendor('sendgrid').request(
+        'POST', '/v3/mail/send',
+        json=message.get(),
+        headers={'Authorization': f'Bearer {settings.SENDGRID_API_KEY}'},
+    )
+    response.raise_for_status()
+
+
+def retry_delay(attempts):
+    """Exponential backoff between delivery attempts, capped at one hour"""
+    return timedelta(seconds=min(60 * (2 ** (attempts - 1)), 3600))
+
+
+def process_batch(batch_size=50):
+    """Claim and deliver one batch; returns (sent, retried, dead) counts"""
+    sent = retried = dead = 0
+    for email in claim_batch(batch_size):
+        attempts = email.attempts + 1
+        try:
+            deliver(email)
+        except Exception as e:
+            print(f"Error sending {email.kind} email to {email.to_email}: {e}")
+            if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                OutboxEmail.objects.filter(pk=email.pk).update(
+                    status='dead', attempts=attempts, last_error=str(e)
+                )
+                dead += 1
+            else:
+                OutboxEmail.objects.filter(pk=email.pk).update(
+                    attempts=attempts,
+                    last_error=str(e),
+                    next_attempt_at=timezone.now() + retry_delay(attempts),
+                )
+                retried += 1
+        else:
+            OutboxEmail.objects.filter(pk=email.pk).update(
+                status='sent', attempts=attempts, last_error='', sent_at=timezone.now()
+            )
+            sent += 1
+    return sent, retried, dead
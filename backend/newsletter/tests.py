@@ -1,3 +1,317 @@
-from django.test import TestCase
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from earthcare.outbound import reset_vendors
+
+from .campaigns import CampaignSendError, CampaignSender
+from .models import CampaignBatch, CampaignEvent, NewsletterCampaign, NewsletterSubscriber, OutboxEmail
+from .jobs import send_outbox
+from .outbox import claim_batch, enqueue_email, process_batch
+from .tracking import TOKEN_PLACEHOLDER, TrackingBuffer, buffer, instrument_html, make_token, sign_url
+
+
+class FakeSendGrid:
+    """Minimal local stand-in for the SendGrid v3 mail/send endpoint"""
+
+    def __init__(self):
+        self.requests = []
+        self.status_code = 202
+        self.queued_statuses = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                fake.requests.append({
+                    'path': self.path,
+                    'authorization': self.headers.get('Authorization'),
+                    'body': json.loads(body),
+                })
+                status_code = fake.queued_statuses.pop(0) if fake.queued_statuses else fake.status_code
+                self.send_response(status_code)
+                self.send_header('X-Message-Id', f'msg-{len(fake.requests)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeSendGridMixin:
+    def setUp(self):
+        super().setUp()
+        self.fake = FakeSendGrid().__enter__()
+        self.addCleanup(self.fake.__exit__)
+        outbound = dict(settings.OUTBOUND_HTTP)
+        outbound['sendgrid'] = dict(outbound['sendgrid'], base_url=self.fake.url, backoff_base=0)
+        override = override_settings(
+            OUTBOUND_HTTP=outbound, SENDGRID_API_KEY='SG.test', OUTBOX_MAX_ATTEMPTS=2
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        reset_vendors()
+        self.addCleanup(reset_vendors)
+
+
+class OutboxTests(FakeSendGridMixin, TestCase):
+    def test_subscribe_only_queues_email(self):
+        response = APIClient().post(
+            '/api/newsletter/subscribe/', {'email': 'new@example.com', 'first_name': 'Ada'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(NewsletterSubscriber.objects.filter(email='new@example.com').exists())
+        self.assertEqual(self.fake.requests, [])
+
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.kind, email.status), ('welcome', 'pending'))
+        self.assertIn('Hi Ada', email.html_content)
+
+    def test_worker_delivers_batch(self):
+        for i in range(3):
+            enqueue_email(f'user{i}@example.com', 'Hello', '<p>Hi</p>')
+
+        self.assertEqual(process_batch(batch_size=2), (2, 0, 0))
+        self.assertEqual(process_batch(batch_size=2), (1, 0, 0))
+        self.assertEqual(process_batch(batch_size=2), (0, 0, 0))
+
+        self.assertEqual(len(self.fake.requests), 3)
+        request = self.fake.requests[0]
+        self.assertEqual(request['path'], '/v3/mail/send')
+        self.assertEqual(request['authorization'], 'Bearer SG.test')
+        self.assertEqual(request['body']['personalizations'][0]['to'][0]['email'], 'user0@example.com')
+        self.assertFalse(OutboxEmail.objects.exclude(status='sent').exists())
+
+    def test_claimed_emails_are_not_claimed_again(self):
+        for i in range(3):
+            enqueue_email(f'user{i}@example.com', 'Hello', '<p>Hi</p>')
+        self.assertEqual(len(claim_batch(2)), 2)
+        self.assertEqual(len(claim_batch(5)), 1)
+        self.assertEqual(claim_batch(5), [])
+
+    def test_scheduled_job_drains_the_outbox(self):
+        for i in range(3):
+            enqueue_email(f'user{i}@example.com', 'Hello', '<p>Hi</p>')
+        self.assertEqual(send_outbox(batch_size=2), 'Outbox: 3 sent, 0 retrying, 0 dead-lettered')
+        self.assertEqual(len(self.fake.requests), 3)
+
+    def test_failures_retry_then_dead_letter(self):
+        self.fake.status_code = 500
+        email = enqueue_email('user@example.com', 'Hello', '<p>Hi</p>')
+
+        self.assertEqual(process_batch(), (0, 1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+        OutboxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(process_batch(), (0, 0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'dead')
+        self.assertIn('500', email.last_error)
+
+
+class CampaignSendTests(FakeSendGridMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(7):
+            NewsletterSubscriber.objects.create(email=f'sub{i}@example.com', first_name=f'Sub{i}')
+        NewsletterSubscriber.objects.create(email='gone@example.com', is_active=False)
+        self.campaign = NewsletterCampaign.objects.create(
+            subject='Spring kefir', content_html='<p>Hi {{first_name}}</p>', content_text='Hi {{first_name}}'
+        )
+
+    def delivered(self):
+        return [
+            p['to'][0]['email']
+            for request in self.fake.requests
+            for p in request['body']['personalizations']
+        ]
+
+    def test_sends_batches_to_active_subscribers(self):
+        progress = []
+        sender = CampaignSender(self.campaign, batch_size=3, concurrency=2, progress=progress.append)
+        self.assertEqual(sender.run(), 7)
+
+        self.assertEqual(len(self.fake.requests), 3)
+        self.assertEqual(sorted(self.delivered()), [f'sub{i}@example.com' for i in range(7)])
+        body = self.fake.requests[0]['body']
+        self.assertEqual(body['subject'], 'Spring kefir')
+        self.assertIn('{{first_name}}', body['personalizations'][0]['substitutions'])
+        self.assertEqual(len(progress), 3)
+
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, 'sent')
+        self.assertEqual(self.campaign.recipients_count, 7)
+        last_active = NewsletterSubscriber.objects.filter(is_active=True).latest('id')
+        self.assertEqual(self.campaign.last_sent_subscriber_id, last_active.id)
+
+    def test_resume_after_failure_has_no_duplicates(self):
+        self.fake.queued_statuses = [202, 500]
+        sender = CampaignSender(self.campaign, batch_size=3, concurrency=1)
+        with self.assertRaises(CampaignSendError):
+            sender.run()
+
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, 'sending')
+        self.assertEqual(self.campaign.recipients_count, 3)
+        self.assertEqual(CampaignBatch.objects.filter(status='failed').count(), 1)
+
+        with self.assertRaises(CampaignSendError):
+            CampaignSender(self.campaign, batch_size=3).run()
+        CampaignSender(self.campaign, batch_size=3, concurrency=1).run(resume=True)
+
+        delivered = self.delivered()
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, 'sent')
+        self.assertEqual(self.campaign.recipients_count, 7)
+        # Request 2 (recipients 3-5) was rejected; every address is accepted exactly once
+        accepted = delivered[:3] + delivered[6:]
+        self.assertEqual(sorted(accepted), [f'sub{i}@example.com' for i in range(7)])
+        self.assertEqual(
+            list(CampaignBatch.objects.values_list('message_id', flat=True)), ['msg-1', 'msg-3', 'msg-4']
+        )
+
+    def test_resume_skips_batches_that_may_have_been_accepted(self):
+        # A crash after SendGrid answered but before the batch was marked sent
+        first = NewsletterSubscriber.objects.filter(is_active=True).order_by('id')[:3]
+        CampaignBatch.objects.create(
+            campaign=self.campaign, first_subscriber_id=first[0].id, last_subscriber_id=first[2].id, recipients=3
+        )
+        NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(status='sending')
+
+        sender = CampaignSender(self.campaign, batch_size=3)
+        self.assertEqual(sender.run(resume=True), 4)
+        self.assertEqual(sender.unconfirmed, 3)
+        self.assertEqual(sorted(self.delivered()), [f'sub{i}@example.com' for i in range(3, 7)])
+        self.assertEqual(CampaignBatch.objects.filter(status='unconfirmed').count(), 1)
+
+        NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(status='sending')
+        self.fake.requests.clear()
+        CampaignSender(self.campaign, batch_size=3).run(resume=True, resend_unconfirmed=True)
+        self.assertEqual(sorted(self.delivered()), [f'sub{i}@example.com' for i in range(3)])
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.recipients_count, 7)
+        self.assertEqual(self.campaign.last_sent_subscriber_id, first[2].id + 4)
+
+
+@override_settings(TRACKING_FLUSH_INTERVAL=3600, TRACKING_FLUSH_SIZE=1000)
+class TrackingTests(TestCase):
+    def setUp(self):
+        buffer.flush()
+        self.campaign = NewsletterCampaign.objects.create(
+            subject='Kefir', content_html='<a href="https://earthcare.food/shop">Shop</a>', content_text='x'
+        )
+        self.subscriber = NewsletterSubscriber.objects.create(email='sub@example.com')
+        self.token = make_token(self.campaign.id, self.subscriber.id)
+
+    def test_instrumented_html_links_through_tracker(self):
+        html = instrument_html(self.campaign.content_html)
+        self.assertIn(f'/api/newsletter/track/click/{TOKEN_PLACEHOLDER}/?url=https%3A%2F%2Fearthcare.food%2Fshop', html)
+        self.assertIn(f'/api/newsletter/track/open/{TOKEN_PLACEHOLDER}/', html)
+
+    def test_open_pixel_goes_inside_the_body(self):
+        html = instrument_html('<html><body><p>Hi</p></BODY></html>')
+        self.assertRegex(html, r'<p>Hi</p><img [^>]+/></BODY></html>$')
+        self.assertTrue(instrument_html('<p>Hi</p>').startswith('<p>Hi</p><img '))
+
+    def test_hits_are_buffered_then_flushed_in_one_batch(self):
+        for _ in range(3):
+            response = self.client.get(f'/api/newsletter/track/open/{self.token}/')
+            self.assertEqual(response['Content-Type'], 'image/gif')
+        url = 'https://earthcare.food/shop'
+        response = self.client.get(
+            f'/api/newsletter/track/click/{self.token}/', {'url': url, 'sig': sign_url(url)}
+        )
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.opened_count, self.campaign.clicked_count), (0, 0))
+
+        with self.assertNumQueries(6):
+            self.assertEqual(buffer.flush(), 4)
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.opened_count, self.campaign.clicked_count), (3, 1))
+        self.assertEqual(CampaignEvent.objects.filter(subscriber=self.subscriber).count(), 4)
+
+    def test_forged_links_are_rejected(self):
+        response = self.client.get(
+            f'/api/newsletter/track/click/{self.token}/', {'url': 'https://evil.example', 'sig': 'nope'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.client.get('/api/newsletter/track/open/forged-token/')
+        self.assertEqual(buffer.flush(), 0)
+
+
+class TrackingBufferTests(TestCase):
+    def setUp(self):
+        buffer.flush()
+        self.campaign = NewsletterCampaign.objects.create(subject='Kefir', content_html='x', content_text='x')
+
+    @override_settings(TRACKING_FLUSH_INTERVAL=3600, TRACKING_FLUSH_SIZE=1000)
+    def test_long_click_urls_are_cut_to_the_column(self):
+        buffer.record('click', self.campaign.id, None, url='https://earthcare.food/' + 'a' * 2000)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(len(CampaignEvent.objects.get().url), 1000)
+
+    @override_settings(TRACKING_FLUSH_INTERVAL=3600, TRACKING_FLUSH_SIZE=1000, TRACKING_MAX_ATTEMPTS=2,
+                       TRACKING_BUFFER_MAX=3)
+    def test_failing_events_are_dropped_and_buffer_is_bounded(self):
+        tracking = TrackingBuffer()
+        for _ in range(5):
+            tracking.record('open', self.campaign.id, None)
+        self.assertEqual(len(tracking._events), 3)
+
+        with mock.patch.object(TrackingBuffer, '_write', side_effect=ValueError('bad row')), \
+                mock.patch('builtins.print'):
+            self.assertEqual(tracking.flush(), 0)
+            self.assertEqual(len(tracking._events), 3)
+            tracking.flush()
+        self.assertEqual(tracking._events, [])
+
+        tracking.record('open', self.campaign.id, None)
+        self.assertEqual(tracking.flush(), 1)
+
+    @override_settings(TRACKING_FLUSH_INTERVAL=0.01)
+    def test_quiet_worker_flushes_on_a_timer(self):
+        tracking = TrackingBuffer()
+        flushed = threading.Event()
+        with mock.patch.object(tracking, 'flush', side_effect=flushed.set):
+            tracking.start()
+            self.assertTrue(flushed.wait(5))
+        self.assertTrue(tracking._flusher.daemon)
+
+
+class SubscriberExportTests(TestCase):
+    def test_export_active_emails_streams_csv(self):
+        NewsletterSubscriber.objects.create(email='active@example.com')
+        NewsletterSubscriber.objects.create(email='gone@example.com', is_active=False)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+        response = self.client.post('/admin/newsletter/newslettersubscriber/', {
+            'action': 'export_active_emails',
+            '_selected_action': list(NewsletterSubscriber.objects.values_list('pk', flat=True)),
+        })
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[0], 'email')
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], ['active@example.com'])
@@ -0,0 +1,192 @@
+"""
+Campaign open/click tracking.
+
+Campaign emails carry a signed per-recipient token ({{tracking_token}},
+filled in through SendGrid substitutions), a 1x1 open pixel and links
+rewritten to the click redirect endpoint with a signed target URL.
+
+Hits are buffered in memory per worker and flushed every
+TRACKING_FLUSH_INTERVAL seconds by a daemon thread the worker starts with
+its first hit, or as soon as TRACKING_FLUSH_SIZE events are waiting: raw
+events go into CampaignEvent with one bulk_create, and the campaign
+counters get a single F() increment per campaign, so a blast does not turn
+into one contended UPDATE per open.
+
+A failed flush puts its events back for the next one; events that have
+failed TRACKING_MAX_ATTEMPTS flushes are dropped, and so are the oldest
+ones beyond TRACKING_BUFFER_MAX, each with a log line, so a database
+outage cannot grow the buffer without bound. Click URLs are cut to the
+column length when recorded.
+"""
+import atexit
+import os
+import re
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import CampaignEvent, NewsletterCampaign, NewsletterSubscriber
+
+TOKEN_SALT = 'newsletter.tracking.recipient'
+URL_SALT = 'newsletter.tracking.url'
+TOKEN_PLACEHOLDER = '{{tracking_token}}'
+
+HREF_RE = re.compile(r'href="(https?://[^"]+)"', re.IGNORECASE)
+
+
+def make_token(campaign_id, subscriber_id):
+    return signing.dumps([campaign_id, subscriber_id], salt=TOKEN_SALT, compress=True)
+
+
+def read_token(token):
+    """Return (campaign_id, subscriber_id), or None for a forged token"""
+    try:
+        campaign_id, subscriber_id = signing.loads(token, salt=TOKEN_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    return campaign_id, subscriber_id
+
+
+def sign_url(url):
+    return signing.Signer(salt=URL_SALT).signature(url)
+
+
+def verify_url(url, signature):
+    return signing.constant_time_compare(sign_url(url), signature or '')
+
+
+def _tracking_url(name, **query):
+    # The token placeholder is substituted per recipient by SendGrid
+    path = reverse(name, kwargs={'token': 'TOKEN'}).replace('TOKEN', TOKEN_PLACEHOLDER)
+    url = f"{settings.TRACKING_BASE_URL.rstrip('/')}{path}"
+    return f"{url}?{urlencode(query)}" if query else url
+
+
+def instrument_html(html):
+    """Rewrite links through the click redirect and add the open pixel before </body> (or at the end)"""
+    def rewrite(match):
+        target = match.group(1)
+        return f'href="{_tracking_url("newsletter-track-click", url=target, sig=sign_url(target))}"'
+
+    pixel = f'<img src="{_tracking_url("newsletter-track-open")}" width="1" height="1" alt="" />'
+    html = HREF_RE.sub(rewrite, html)
+    # Content after </html> is invalid and some clients drop it
+    body_end = html.lower().rfind('</body>')
+    if body_end == -1:
+        return html + pixel
+    return html[:body_end] + pixel + html[body_end:]
+
+
+class TrackingBuffer:
+    """Per-worker buffer of tracking hits, flushed in batches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (kind, campaign_id, subscriber_id, url, occurred_at, failed flushes)
+        self._events = []
+        self._last_flush = time.monotonic()
+        self._flusher = None
+        self._flusher_pid = None
+
+    def record(self, kind, campaign_id, subscriber_id, url=''):
+        url = url[:CampaignEvent._meta.get_field('url').max_length]
+        with self._lock:
+            self._events.append((kind, campaign_id, subscriber_id, url, timezone.now(), 0))
+            self._trim()
+            due = (
+                len(self._events) >= settings.TRACKING_FLUSH_SIZE
+                or time.monotonic() - self._last_flush >= settings.TRACKING_FLUSH_INTERVAL
+            )
+        self.start()
+        if due:
+            self.flush()
+
+    def start(self):
+        """Start this worker's periodic flush thread, unless it is running"""
+        with self._lock:
+            # A forked worker inherits the attribute but not the thread
+            if self._flusher_pid == os.getpid() and self._flusher.is_alive():
+                return
+            self._flusher_pid = os.getpid()
+            self._flusher = threading.Thread(target=self._flush_periodically, name='tracking-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.TRACKING_FLUSH_INTERVAL)
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error in campaign tracking flush thread: {e}")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write buffered events and counter increments; returns events written"""
+        with self._lock:
+            events, self._events = self._events, []
+            self._last_flush = time.monotonic()
+        if not events:
+            return 0
+
+        try:
+            self._write(events)
+        except Exception as e:
+            print(f"Error flushing {len(events)} campaign tracking event(s): {e}")
+            retry = [event[:5] + (event[5] + 1,) for event in events]
+            kept = [event for event in retry if event[5] < settings.TRACKING_MAX_ATTEMPTS]
+            if len(kept) < len(retry):
+                print(f"Dropped {len(retry) - len(kept)} campaign tracking event(s) after "
+                      f"{settings.TRACKING_MAX_ATTEMPTS} failed flushes")
+            # Put the rest back so the next flush retries them
+            with self._lock:
+                self._events[:0] = kept
+                self._trim()
+            return 0
+        return len(events)
+
+    def _trim(self):
+        excess = len(self._events) - settings.TRACKING_BUFFER_MAX
+        if excess > 0:
+            del self._events[:excess]
+            print(f"Dropped {excess} campaign tracking event(s): buffer is over {settings.TRACKING_BUFFER_MAX}")
+
+    def _write(self, events):
+        campaign_ids = set(
+            NewsletterCampaign.objects.filter(id__in={e[1] for e in events}).values_list('id', flat=True)
+        )
+        subscriber_ids = set(
+            NewsletterSubscriber.objects.filter(id__in={e[2] for e in events}).values_list('id', flat=True)
+        )
+        events = [e for e in events if e[1] in campaign_ids]
+        counts = Counter((campaign_id, kind) for kind, campaign_id, _, _, _, _ in events)
+
+        with transaction.atomic():
+            CampaignEvent.objects.bulk_create([
+                CampaignEvent(
+                    campaign_id=campaign_id,
+                    subscriber_id=subscriber_id if subscriber_id in subscriber_ids else None,
+                    kind=kind,
+                    url=url,
+                    occurred_at=occurred_at,
+                )
+                for kind, campaign_id, subscriber_id, url, occurred_at, _ in events
+            ])
+            for campaign_id in sorted({campaign_id for campaign_id, _ in counts}):
+                NewsletterCampaign.objects.filter(pk=campaign_id).update(
+                    opened_count=F('opened_count') + counts[(campaign_id, 'open')],
+                    clicked_count=F('clicked_count') + counts[(campaign_id, 'click')],
+                )
+
+
+buffer = TrackingBuffer()
+atexit.register(buffer.flush)
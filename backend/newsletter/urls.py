@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import NewsletterSubscribeView, unsubscribe
+from .views import NewsletterSubscribeView, unsubscribe, track_open, track_click
 
 urlpatterns = [
     path('subscribe/', NewsletterSubscribeView.as_view(), name='newsletter-subscribe'),
     path('unsubscribe/', unsubscribe, name='newsletter-unsubscribe'),
+    path('track/open/<str:token>/', track_open, name='newsletter-track-open'),
+    path('track/click/<str:token>/', track_click, name='newsletter-track-click'),
 ]
@@ -1,20 +1,23 @@
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from rest_framework.views import APIView
-from django.conf import settings
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
+from django.views.decorators.cache import never_cache
+import base64
 
 from .models import NewsletterSubscriber
+from .outbox import enqueue_welcome_email
+from .tracking import buffer as tracking_buffer, read_token, verify_url
 from .serializers import NewsletterSubscribeSerializer
 
 
-class NewsletterSubscribeView(APIView):
+class NewsletterSubscribeView(AsyncAPIView):
     """
     Handle newsletter subscriptions
     """
-    def post(self, request):
+    async def post(self, request):
         serializer = NewsletterSubscribeSerializer(data=request.data)
         
         if not serializer.is_valid():
@@ -25,7 +28,7 @@ class NewsletterSubscribeView(APIView):
         source = serializer.validated_data.get('source', 'website')
         
         # Check if already subscribed
-        subscriber, created = NewsletterSubscriber.objects.get_or_create(
+        subscriber, created = await NewsletterSubscriber.objects.aget_or_create(
             email=email,
             defaults={
                 'first_name': first_name,
@@ -43,77 +46,15 @@ class NewsletterSubscribeView(APIView):
                 # Reactivate subscription
                 subscriber.is_active = True
                 subscriber.unsubscribed_at = None
-                subscriber.save()
+                await subscriber.asave()
         
-        # Send welcome email
-        self._send_welcome_email(subscriber)
+        # Queue welcome email; the send_outbox worker delivers it
+        await sync_to_async(enqueue_welcome_email)(subscriber)
         
         return Response({
             'message': 'Successfully subscribed to the newsletter! Check your email for a special welcome offer.',
             'subscribed': True
         }, status=status.HTTP_201_CREATED)
-    
-    def _send_welcome_email(self, subscriber):
-        """Send welcome email to new subscriber"""
-        if not settings.SENDGRID_API_KEY:
-            print("SendGrid API key not configured")
-            return
-        
-        try:
-            message = Mail(
-                from_email=settings.FROM_EMAIL,
-                to_emails=subscriber.email,
-                subject='Welcome to Earth Care Food Company! 🌱',
-                html_content=f'''
-                <html>
-                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                            <h1 style="color: #4a5d23;">Welcome to Earth Care Food Company!</h1>
-                            
-                            <p>Hi {subscriber.first_name or 'there'},</p>
-                            
-                            <p>Thank you for subscribing to our newsletter! We're thrilled to have you join our community of health-conscious food lovers who care about the planet.</p>
-                            
-                            <h2 style="color: #4a5d23;">🎁 Special Welcome Offer</h2>
-                            <p style="font-size: 18px; background-color: #f4f4f4; padding: 15px; border-left: 4px solid #4a5d23;">
-                                <strong>Get 10% off your first order!</strong><br>
-                                Subscribe at checkout to automatically receive your discount.
-                            </p>
-                            
-                            <h3>What to Expect:</h3>
-                            <ul>
-                                <li>🥛 Updates on new products and seasonal offerings</li>
-                                <li>🌱 Tips on gut health and the gut-brain connection</li>
-                                <li>♻️ Stories from our zero-waste dairy farm</li>
-                                <li>🎯 Exclusive subscriber-only deals</li>
-                            </ul>
-                            
-                            <p style="margin-top: 30px;">
-                                <a href="{settings.FRONTEND_URL}" style="background-color: #4a5d23; color: white; padding: 12px 24px; text-decoration: none; border-radius: 4px; display: inline-block;">
-                                    Start Shopping
-                                </a>
-                            </p>
-                            
-                            <p style="margin-top: 30px; color: #666; font-size: 14px;">
-                                Questions? Reply to this email – we'd love to hear from you!
-                            </p>
-                            
-                            <p style="margin-top: 20px; color: #666; font-size: 12px;">
-                                If you didn't subscribe to this newsletter, you can 
-                                <a href="{settings.FRONTEND_URL}/unsubscribe?email={subscriber.email}">unsubscribe here</a>.
-                            </p>
-                        </div>
-                    </body>
-                </html>
-                '''
-            )
-            
-            sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
-            response = sg.send(message)
-            print(f"Welcome email sent to {subscriber.email}: Status {response.status_code}")
-            
-        except Exception as e:
-            print(f"Error sending welcome email: {e}")
 
 
 @api_view(['POST'])
@@ -139,3 +80,28 @@ def unsubscribe(request):
         return Response({
             'message': 'Email not found in our subscriber list.'
         }, status=status.HTTP_404_NOT_FOUND)
+
+
+TRANSPARENT_GIF = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+
+@never_cache
+def track_open(request, token):
+    """Record a campaign open and return a 1x1 transparent GIF"""
+    recipient = read_token(token)
+    if recipient:
+        tracking_buffer.record('open', *recipient)
+    return HttpResponse(TRANSPARENT_GIF, content_type='image/gif')
+
+
+@never_cache
+def track_click(request, token):
+    """Record a campaign click and redirect to the signed target URL"""
+    url = request.GET.get('url', '')
+    if not url or not verify_url(url, request.GET.get('sig')):
+        return HttpResponseBadRequest('Invalid link')
+
+    recipient = read_token(token)
+    if recipient:
+        tracking_buffer.record('click', *recipient, url=url)
+    return HttpResponseRedirect(url)
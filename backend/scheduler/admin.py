@@ -0,0 +1,17 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import ScheduledJob
+
+
+@admin.register(ScheduledJob)
+class ScheduledJobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'scheduled_for', 'interval_seconds', 'last_started_at', 'last_finished_at')
+    list_filter = ('status',)
+    list_editable = ('status',)
+    readonly_fields = ('name', 'last_started_at', 'last_finished_at', 'last_result', 'last_error')
+    actions = ['run_now']
+
+    def run_now(self, request, queryset):
+        updated = queryset.update(scheduled_for=timezone.now())
+        self.message_user(request, f'{updated} job(s) will run on the next scheduler tick.')
+    run_now.short_description = 'Run selected jobs on the next tick'
@@ -0,0 +1,90 @@
+"""
+Lightweight job scheduler.
+
+Recurring jobs are configured in settings.SCHEDULED_JOBS and mirrored into
+ScheduledJob rows. Each run_scheduler replica polls for due rows and claims
+them with claim_rows(): on Postgres the candidates are locked with
+SELECT ... FOR UPDATE SKIP LOCKED so replicas never block on each other,
+and every claim is a conditional UPDATE that only succeeds while the row
+still matches the due filter. That makes the claim safe on SQLite too,
+where row locks do not exist and the compare-and-set alone decides.
+
+A claimed job is leased for SCHEDULER_LEASE_SECONDS; if its replica dies
+mid-run the job simply becomes due again once the lease runs out.
+"""
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ScheduledJob
+
+
+def claim_rows(queryset, limit, **updates):
+    """
+    Claim up to `limit` rows of `queryset` by applying `updates` to them.
+    A row is claimed only if it still matches `queryset` at UPDATE time, so
+    concurrent claimers can never both win the same row. Returns the
+    claimed rows as they were read, before the update.
+    """
+    claimed = []
+    with transaction.atomic(using=queryset.db):
+        candidates = queryset
+        if connections[queryset.db].features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        for row in candidates[:limit]:
+            if queryset.filter(pk=row.pk).update(**updates):
+                claimed.append(row)
+    return claimed
+
+
+def sync_jobs():
+    """Create or update ScheduledJob rows for every configured job"""
+    for name, job in settings.SCHEDULED_JOBS.items():
+        ScheduledJob.objects.update_or_create(
+            name=name, defaults={'interval_seconds': job['interval']}
+        )
+
+
+def claim_due_jobs(limit=10):
+    now = timezone.now()
+    due = ScheduledJob.objects.filter(
+        status='active', scheduled_for__lte=now, name__in=list(settings.SCHEDULED_JOBS)
+    ).order_by('scheduled_for')
+    return claim_rows(
+        due, limit,
+        scheduled_for=now + timedelta(seconds=settings.SCHEDULER_LEASE_SECONDS),
+        last_started_at=now,
+    )
+
+
+def run_job(job):
+    """Run one claimed job and schedule its next run"""
+    started = timezone.now()
+    result, error = '', ''
+    try:
+        func = import_string(settings.SCHEDULED_JOBS[job.name]['callable'])
+        result = str(func() or '')
+    except Exception:
+        error = traceback.format_exc()
+        print(f"Scheduled job {job.name} failed: {error}")
+
+    finished = timezone.now()
+    ScheduledJob.objects.filter(pk=job.pk).update(
+        scheduled_for=started + timedelta(seconds=job.interval_seconds),
+        last_finished_at=finished,
+        last_result=result,
+        last_error=error,
+    )
+    return result, error
+
+
+def tick(limit=10):
+    """Claim and run every job that is currently due; returns the jobs run"""
+    jobs = claim_due_jobs(limit)
+    for job in jobs:
+        run_job(job)
+    return jobs
@@ -0,0 +1 @@
+# Required for Python to treat the directory as a package
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from scheduler.dispatch import sync_jobs, tick
+
+
+class Command(BaseCommand):
+    help = 'Dispatch due scheduled jobs; safe to run as several replicas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run one tick and exit')
+        parser.add_argument('--interval', type=float, default=5.0, help='Poll interval in seconds')
+        parser.add_argument('--limit', type=int, default=10, help='Maximum jobs claimed per tick')
+
+    def handle(self, *args, **options):
+        sync_jobs()
+        while True:
+            for job in tick(options['limit']):
+                self.stdout.write(f'Ran {job.name}')
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
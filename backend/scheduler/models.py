@@ -0,0 +1,30 @@
+from django.db import models
+from django.utils import timezone
+
+
+class ScheduledJob(models.Model):
+    """A recurring background job dispatched by the run_scheduler command"""
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('paused', 'Paused'),
+    ]
+
+    name = models.CharField(max_length=100, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    scheduled_for = models.DateTimeField(default=timezone.now, help_text="Next time the job is due")
+    interval_seconds = models.PositiveIntegerField()
+    last_started_at = models.DateTimeField(null=True, blank=True)
+    last_finished_at = models.DateTimeField(null=True, blank=True)
+    last_result = models.TextField(blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['scheduled_for']
+        indexes = [
+            models.Index(fields=['status', 'scheduled_for'], name='scheduledjob_due_idx'),
+        ]
+        verbose_name = 'Scheduled Job'
+        verbose_name_plural = 'Scheduled Jobs'
+
+    def __str__(self):
+        return f"{self.name} - {self.status}"
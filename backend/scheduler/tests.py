@@ -0,0 +1,127 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from coaching.jobs import deactivate_idle_conversations
+from coaching.models import ConversationThread
+from newsletter.campaigns import CampaignSendError
+from newsletter.jobs import send_due_campaigns
+from newsletter.models import NewsletterCampaign
+from store.jobs import expire_pending_orders
+from store.models import Order
+
+from .dispatch import claim_rows, sync_jobs, tick
+from .models import ScheduledJob
+
+TEST_JOBS = {
+    'noop': {'callable': 'scheduler.tests.noop_job', 'interval': 60},
+    'broken': {'callable': 'scheduler.tests.broken_job', 'interval': 60},
+}
+
+
+def noop_job():
+    return 'done'
+
+
+def broken_job():
+    raise RuntimeError('boom')
+
+
+@override_settings(SCHEDULED_JOBS=TEST_JOBS)
+class DispatchTests(TestCase):
+    def setUp(self):
+        sync_jobs()
+
+    def test_claim_is_exclusive(self):
+        due = ScheduledJob.objects.filter(status='active', scheduled_for__lte=timezone.now())
+        later = timezone.now() + timedelta(minutes=5)
+        self.assertEqual(len(claim_rows(due, 10, scheduled_for=later)), 2)
+        self.assertEqual(claim_rows(due, 10, scheduled_for=later), [])
+
+    def test_tick_runs_due_jobs_and_reschedules(self):
+        ran = tick()
+        self.assertEqual(sorted(job.name for job in ran), ['broken', 'noop'])
+        self.assertEqual(tick(), [])
+
+        noop = ScheduledJob.objects.get(name='noop')
+        self.assertEqual(noop.last_result, 'done')
+        self.assertGreater(noop.scheduled_for, timezone.now() + timedelta(seconds=50))
+        self.assertIn('boom', ScheduledJob.objects.get(name='broken').last_error)
+
+    def test_paused_jobs_are_skipped(self):
+        ScheduledJob.objects.filter(name='broken').update(status='paused')
+        self.assertEqual([job.name for job in tick()], ['noop'])
+
+
+class JobTests(TestCase):
+    def test_send_due_campaigns_claims_each_once(self):
+        now = timezone.now()
+        due = NewsletterCampaign.objects.create(
+            subject='Due', content_html='x', content_text='x', status='scheduled',
+            scheduled_for=now - timedelta(minutes=1),
+        )
+        NewsletterCampaign.objects.create(
+            subject='Later', content_html='x', content_text='x', status='scheduled',
+            scheduled_for=now + timedelta(days=1),
+        )
+        with mock.patch('newsletter.jobs.CampaignSender') as sender:
+            send_due_campaigns()
+            send_due_campaigns()
+        self.assertEqual(sender.call_count, 1)
+        self.assertEqual(sender.call_args.args[0].id, due.id)
+        due.refresh_from_db()
+        self.assertEqual(due.status, 'sending')
+
+    def test_failed_campaign_does_not_block_the_others(self):
+        now = timezone.now()
+        broken, ok = [
+            NewsletterCampaign.objects.create(
+                subject=subject, content_html='x', content_text='x', status='scheduled',
+                scheduled_for=now - timedelta(minutes=minutes),
+            )
+            for subject, minutes in (('Broken', 2), ('Ok', 1))
+        ]
+        with mock.patch('newsletter.jobs.CampaignSender') as sender:
+            sender.return_value.run.side_effect = [CampaignSendError('SendGrid API key not configured'), 1]
+            result = send_due_campaigns()
+        self.assertEqual(result, f'Sent campaigns: [{ok.id}]; failed: [{broken.id}]')
+        broken.refresh_from_db()
+        self.assertEqual(broken.status, 'failed')
+
+    @mock.patch('store.jobs.cancel_payment_intent')
+    def test_expire_pending_orders(self, cancel):
+        def make_order(number, **fields):
+            return Order.objects.create(
+                order_number=number, subtotal=Decimal('10.00'), total_amount=Decimal('10.00'),
+                shipping_first_name='A', shipping_last_name='B', shipping_address_line1='1 Road',
+                shipping_city='C', shipping_state='NY', shipping_zip_code='12414', **fields
+            )
+
+        stale = make_order('EC-STALE', stripe_payment_intent_id='pi_stale')
+        fresh = make_order('EC-FRESH')
+        paid = make_order('EC-PAID', status='paid')
+        Order.objects.filter(pk__in=[stale.pk, paid.pk]).update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+
+        expire_pending_orders()
+
+        statuses = dict(Order.objects.values_list('order_number', 'status'))
+        self.assertEqual(statuses, {'EC-STALE': 'cancelled', 'EC-FRESH': 'pending', 'EC-PAID': 'paid'})
+        self.assertIn('Expired', Order.objects.get(pk=stale.pk).notes)
+        cancel.assert_called_once_with('pi_stale')
+
+    def test_deactivate_idle_conversations(self):
+        idle = ConversationThread.objects.create(session_id='idle')
+        ConversationThread.objects.create(session_id='recent')
+        ConversationThread.objects.filter(pk=idle.pk).update(
+            last_activity=timezone.now() - timedelta(days=90)
+        )
+        deactivate_idle_conversations()
+        self.assertEqual(
+            list(ConversationThread.objects.filter(is_active=True).values_list('session_id', flat=True)),
+            ['recent'],
+        )
@@ -1,5 +1,13 @@
 from django.contrib import admin
-from .models import Product, Customer, Order, OrderItem, WholesaleInquiry
+from django.utils import timezone
+from .models import (
+    Product, Customer, Order, OrderItem, WholesaleInquiry, StripeEvent, DailySales, DailyProductSales
+)
+from earthcare.exports import export_actions
+from .catalog_cache import bump_catalog_version
+from .exports import CUSTOMER_EXPORT, INQUIRY_EXPORT, ORDER_EXPORT
+from .rollups import record_checkout, record_payment
+from .webhooks import requeue
 
 
 class OrderItemInline(admin.TabularInline):
@@ -36,12 +44,16 @@ class ProductAdmin(admin.ModelAdmin):
     )
     
     def activate_products(self, request, queryset):
-        updated = queryset.update(is_active=True)
+        updated = queryset.update(is_active=True, updated_at=timezone.now())
+        # queryset.update() skips auto_now and post_save, so touch updated_at
+        # (it feeds the catalog ETag) and invalidate explicitly
+        bump_catalog_version()
         self.message_user(request, f'{updated} product(s) activated.')
     activate_products.short_description = 'Activate selected products'
     
     def deactivate_products(self, request, queryset):
-        updated = queryset.update(is_active=False)
+        updated = queryset.update(is_active=False, updated_at=timezone.now())
+        bump_catalog_version()
         self.message_user(request, f'{updated} product(s) deactivated.')
     deactivate_products.short_description = 'Deactivate selected products'
 
@@ -52,6 +64,7 @@ class CustomerAdmin(admin.ModelAdmin):
     list_filter = ('is_subscribed', 'created_at')
     search_fields = ('email', 'first_name', 'last_name', 'phone')
     readonly_fields = ('stripe_customer_id', 'created_at', 'updated_at')
+    actions = export_actions(CUSTOMER_EXPORT)
     fieldsets = (
         ('Contact Information', {
             'fields': ('email', 'first_name', 'last_name', 'phone')
@@ -76,6 +89,7 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ('order_number', 'customer__email', 'shipping_first_name', 'shipping_last_name')
     readonly_fields = ('order_number', 'created_at', 'updated_at')
     inlines = [OrderItemInline]
+    actions = export_actions(ORDER_EXPORT)
     
     fieldsets = (
         ('Order Information', {
@@ -108,6 +122,23 @@ class OrderAdmin(admin.ModelAdmin):
             return self.readonly_fields + ('subtotal', 'discount_amount', 'total_amount')
         return self.readonly_fields
 
+    def save_model(self, request, obj, form, change):
+        previous = Order.objects.get(pk=obj.pk) if change else None
+        was_paid = previous is not None and previous.status in Order.PAID_STATUSES
+        is_paid = obj.status in Order.PAID_STATUSES
+        if is_paid and obj.paid_at is None:
+            obj.paid_at = timezone.now()
+        super().save_model(request, obj, form, change)
+        # Keep the sales rollups in step with new orders, status and payment date edits
+        if not change:
+            record_checkout(obj)
+        if was_paid == is_paid and (not is_paid or previous.paid_at == obj.paid_at):
+            return
+        if was_paid:
+            record_payment(previous, sign=-1)
+        if is_paid:
+            record_payment(obj)
+
 
 @admin.register(WholesaleInquiry)
 class WholesaleInquiryAdmin(admin.ModelAdmin):
@@ -116,6 +147,7 @@ class WholesaleInquiryAdmin(admin.ModelAdmin):
     search_fields = ('business_name', 'contact_name', 'email', 'location')
     list_editable = ('status',)
     readonly_fields = ('created_at', 'updated_at')
+    actions = export_actions(INQUIRY_EXPORT)
     
     fieldsets = (
         ('Business Information', {
@@ -132,3 +164,46 @@ class WholesaleInquiryAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'type', 'payment_intent_id', 'status', 'attempts', 'stripe_created', 'processed_at')
+    list_filter = ('status', 'type', 'received_at')
+    search_fields = ('event_id', 'payment_intent_id')
+    readonly_fields = ('event_id', 'type', 'payment_intent_id', 'stripe_created', 'payload',
+                       'attempts', 'last_error', 'received_at', 'processed_at')
+    actions = ['requeue_events']
+
+    def requeue_events(self, request, queryset):
+        updated = requeue(queryset)
+        self.message_user(request, f'{updated} event(s) requeued.')
+    requeue_events.short_description = 'Requeue (re-apply) selected events'
+
+
+class ReadOnlyRollupAdmin(admin.ModelAdmin):
+    """Rollups are written by store/rollups.py only; rebuild_sales_rollups fixes them"""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(ReadOnlyRollupAdmin):
+    list_display = ('date', 'checkouts', 'converted', 'paid_orders', 'revenue', 'discount_total', 'units',
+                    'subscriber_orders', 'subscriber_revenue', 'guest_orders', 'guest_revenue')
+    date_hierarchy = 'date'
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(ReadOnlyRollupAdmin):
+    list_display = ('date', 'product_name', 'units', 'revenue')
+    list_filter = ('product_name',)
+    search_fields = ('product_name',)
+    date_hierarchy = 'date'
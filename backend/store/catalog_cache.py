@@ -0,0 +1,147 @@
+"""
+In-process cache of the serialized product catalog.
+
+Each worker keeps its own snapshot of the active products, run through
+ProductSerializer once per version. The snapshot is tagged with the catalog version
+it was built from; the version lives in Django's cache so that a bump from
+any worker (product save/delete signals, bulk admin actions) invalidates
+the snapshot everywhere on the next request. That needs a cache every
+worker shares: gunicorn.conf.py falls back to a file cache on the host
+when several workers run without CACHE_BACKEND, and several hosts need
+Redis or Memcached. Versions are random tokens rather than a counter, so
+a version key lost to eviction can never come back as an old version.
+"""
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+
+CATALOG_VERSION_KEY = 'store:catalog_version'
+
+_lock = threading.Lock()
+_snapshot = None
+_stats = {'hits': 0, 'misses': 0}
+
+
+class CatalogSnapshot:
+    """
+    Active products for one catalog version.
+    The catalog state (row count and newest updated_at) is read up front so
+    conditional requests can be answered without serializing anything;
+    the serialized products are built on first use.
+    """
+
+    def __init__(self, version, count, last_modified):
+        self.version = version
+        self.count = count
+        self.last_modified = last_modified
+        self.built_at = time.monotonic()
+        self._products = None
+        self._by_id = None
+        self._lock = threading.Lock()
+
+    @property
+    def etag(self):
+        stamp = self.last_modified.timestamp() if self.last_modified else 0
+        return f'{self.count}-{stamp:.6f}'
+
+    @property
+    def products(self):
+        self._load()
+        return self._products
+
+    @property
+    def by_id(self):
+        self._load()
+        return self._by_id
+
+    def _load(self):
+        if self._products is not None:
+            return
+        with self._lock:
+            if self._products is None:
+                from .models import Product
+                from .serializers import ProductSerializer
+
+                products = list(ProductSerializer(Product.objects.filter(is_active=True), many=True).data)
+                self._by_id = {str(product['id']): product for product in products}
+                self._products = products
+
+
+def get_catalog_version():
+    """Return the current shared catalog version"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every worker's catalog snapshot"""
+    version = uuid.uuid4().hex
+    cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def _is_fresh(snapshot, version):
+    if snapshot is None or snapshot.version != version:
+        return False
+    max_age = getattr(settings, 'CATALOG_CACHE_MAX_AGE', 300)
+    return time.monotonic() - snapshot.built_at < max_age
+
+
+def _build_snapshot(version):
+    from .models import Product
+
+    # Max updated_at spans inactive products too, so deactivations move it
+    state = Product.objects.aggregate(
+        count=Count('id', filter=Q(is_active=True)),
+        last_modified=Max('updated_at'),
+    )
+    return CatalogSnapshot(version, state['count'], state['last_modified'])
+
+
+def get_catalog():
+    """
+    Return (snapshot, hit) for the current catalog version.
+    Rebuilds the snapshot from the database only when the version changed.
+    """
+    global _snapshot
+
+    version = get_catalog_version()
+    snapshot = _snapshot
+    if _is_fresh(snapshot, version):
+        with _lock:
+            _stats['hits'] += 1
+        return snapshot, True
+
+    with _lock:
+        snapshot = _snapshot
+        if _is_fresh(snapshot, version):
+            _stats['hits'] += 1
+            return snapshot, True
+        snapshot = _build_snapshot(version)
+        _snapshot = snapshot
+        _stats['misses'] += 1
+        return snapshot, False
+
+
+def get_cache_stats():
+    """Hit/miss counters for this worker"""
+    with _lock:
+        stats = dict(_stats)
+        stats['version'] = _snapshot.version if _snapshot else None
+    return stats
+
+
+def reset_catalog_cache():
+    """Drop this worker's snapshot and counters (used by tests)"""
+    global _snapshot
+    with _lock:
+        _snapshot = None
+        _stats['hits'] = 0
+        _stats['misses'] = 0
@@ -0,0 +1,32 @@
+"""Bulk exports of store data; see earthcare/exports.py"""
+from earthcare.exports import Export
+
+from .models import Customer, Order, WholesaleInquiry
+
+ORDER_EXPORT = Export(
+    'orders', Order,
+    fields=(
+        'order_number', 'status', 'customer__email', 'subtotal', 'discount_amount', 'total_amount',
+        'shipping_first_name', 'shipping_last_name', 'shipping_address_line1', 'shipping_address_line2',
+        'shipping_city', 'shipping_state', 'shipping_zip_code', 'shipping_country',
+        'stripe_payment_intent_id', 'payment_method', 'paid_at', 'created_at', 'notes',
+    ),
+    nested='items',
+    nested_fields=('product_id', 'product_name', 'quantity', 'unit_price', 'total_price'),
+)
+
+CUSTOMER_EXPORT = Export(
+    'customers', Customer,
+    fields=(
+        'email', 'first_name', 'last_name', 'phone', 'is_subscribed', 'subscription_discount',
+        'stripe_customer_id', 'created_at',
+    ),
+)
+
+INQUIRY_EXPORT = Export(
+    'wholesale-inquiries', WholesaleInquiry,
+    fields=(
+        'business_name', 'contact_name', 'email', 'phone', 'business_type', 'location', 'website',
+        'estimated_monthly_volume', 'message', 'status', 'notes', 'created_at',
+    ),
+)
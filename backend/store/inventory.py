@@ -0,0 +1,133 @@
+"""
+Stock reservation for checkout.
+
+Checkout reserves the whole cart in its first transaction with one
+conditional UPDATE:
+
+    UPDATE store_product
+    SET stock_quantity = stock_quantity - CASE id WHEN 'a' THEN 2 WHEN 'b' THEN 1 END
+    WHERE id IN ('a', 'b') AND stock_quantity >= CASE id WHEN 'a' THEN 2 WHEN 'b' THEN 1 END
+
+so for every product the check and the decrement are one atomic step and
+two buyers can never both take the last unit. If fewer rows than products
+were updated, something is short and a savepoint rolls the UPDATE back.
+On PostgreSQL the rows are first locked with SELECT ... FOR UPDATE in
+primary key order, which releases use as well, so concurrent carts always
+lock products in the same order and cannot deadlock.
+
+Reserved stock goes back when the order moves from pending to cancelled
+(payment failed, checkout abandoned, order expired); the release happens in
+the same transaction as that conditional status change, so it happens
+exactly once. A payment that succeeds after its order was cancelled
+reserves the stock again.
+
+The catalog snapshot shows stock as of its build; it is invalidated when a
+product sells out or stock is released, so sold-out items show promptly.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from .catalog_cache import bump_catalog_version
+from .models import Order, OrderItem, Product
+
+
+class OutOfStock(Exception):
+    """Raised when a product does not have enough stock for the cart"""
+
+    def __init__(self, product_id):
+        super().__init__(f'Product {product_id} is out of stock')
+        self.product_id = product_id
+
+
+def cart_quantities(items):
+    """{product_id: total quantity} for (product_id, quantity) pairs"""
+    quantities = Counter()
+    for product_id, quantity in items:
+        quantities[str(product_id)] += quantity
+    return quantities
+
+
+def _per_product(quantities):
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _lock(product_ids):
+    """
+    Lock the products in primary key order. SQLite has no row locks and
+    takes the whole database for the UPDATE instead, so it skips this.
+    """
+    if connection.features.has_select_for_update:
+        list(Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk').values_list('pk'))
+
+
+class _Shortfall(Exception):
+    pass
+
+
+def reserve_stock(quantities):
+    """Take `quantities` ({product_id: n}) out of stock, or raise OutOfStock"""
+    if not quantities:
+        return
+    product_ids = sorted(quantities)
+    _lock(product_ids)
+    needed = _per_product(quantities)
+    try:
+        with transaction.atomic():
+            reserved = Product.objects.filter(
+                pk__in=product_ids, stock_quantity__gte=needed
+            ).update(stock_quantity=F('stock_quantity') - needed)
+            if reserved < len(product_ids):
+                raise _Shortfall
+    except _Shortfall:
+        # Rolled back to before the UPDATE, so this is the stock it saw
+        stock = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock_quantity'))
+        raise OutOfStock(next(
+            (product_id for product_id in product_ids if stock.get(product_id, 0) < quantities[product_id]),
+            product_ids[0],
+        ))
+
+    if Product.objects.filter(pk__in=product_ids, stock_quantity=0).exists():
+        transaction.on_commit(bump_catalog_version)
+
+
+def order_quantities(order_ids):
+    """{product_id: n} for the items of `order_ids`"""
+    return dict(
+        OrderItem.objects
+        .filter(order_id__in=order_ids, product__isnull=False)
+        .order_by()
+        .values_list('product_id')
+        .annotate(total=Sum('quantity'))
+    )
+
+
+def release_stock(order_ids):
+    """Put the stock reserved by `order_ids` back"""
+    quantities = order_quantities(order_ids)
+    if not quantities:
+        return
+    _lock(list(quantities))
+    Product.objects.filter(pk__in=list(quantities)).update(
+        stock_quantity=F('stock_quantity') + _per_product(quantities)
+    )
+    transaction.on_commit(bump_catalog_version)
+
+
+@transaction.atomic
+def cancel_pending_order(order_id, note):
+    """Cancel an order that is still pending and release its stock; returns whether it was cancelled"""
+    cancelled = Order.objects.filter(pk=order_id, status='pending').update(
+        status='cancelled',
+        notes=Concat(F('notes'), Value(f"\n\n{note}")),
+        updated_at=timezone.now(),
+    )
+    if cancelled:
+        release_stock([order_id])
+    return bool(cancelled)
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from scheduler.dispatch import claim_rows
+
+from .inventory import release_stock
+from .models import Order
+from .stripe_service import cancel_payment_intent
+from .webhooks import process_batch
+
+
+def expire_pending_orders(limit=200):
+    """
+    Cancel orders left pending longer than PENDING_ORDER_TTL_HOURS, e.g.
+    abandoned checkouts, release their stock and void their Stripe payment
+    intents.
+    """
+    cutoff = timezone.now() - timedelta(hours=settings.PENDING_ORDER_TTL_HOURS)
+    stale = Order.objects.filter(status='pending', created_at__lt=cutoff).order_by('created_at')
+    with transaction.atomic():
+        expired = claim_rows(
+            stale, limit,
+            status='cancelled',
+            notes=Concat(F('notes'), Value('\n\nExpired: payment not completed')),
+            updated_at=timezone.now(),
+        )
+        release_stock([order.pk for order in expired])
+
+    # Stripe calls run after the claim transaction has committed
+    for order in expired:
+        if order.stripe_payment_intent_id:
+            cancel_payment_intent(order.stripe_payment_intent_id)
+    return f'Expired {len(expired)} pending order(s)'
+
+
+def process_stripe_events(batch_size=50):
+    """Apply the Stripe events still pending (retries, or all of them with inline apply off)"""
+    totals = [0, 0, 0]
+    while True:
+        counts = process_batch(batch_size)
+        if not any(counts):
+            break
+        totals = [total + count for total, count in zip(totals, counts)]
+    return 'Stripe events: {} applied, {} retrying, {} dead-lettered'.format(*totals)
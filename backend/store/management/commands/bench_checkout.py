@@ -0,0 +1,126 @@
+"""
+Benchmark how long checkout holds a database transaction open.
+
+Stripe is stubbed with a fixed artificial latency, and every outermost
+transaction.atomic block entered during a checkout is timed. Because the
+Stripe calls run between the two short checkout transactions, the lock
+hold time per checkout should stay flat no matter how slow Stripe is.
+"""
+import statistics
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from earthcare.ratelimit import reset_rate_limits
+
+from store.inventory import release_stock
+from store.models import Customer, Order, Product
+from store.stripe_service import forget_stripe_customer
+from store.views import CheckoutView
+
+BENCH_EMAIL = 'checkout-bench@example.com'
+
+
+class Command(BaseCommand):
+    help = 'Measure DB transaction hold time per checkout with stubbed Stripe latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=20)
+        parser.add_argument('--cart-size', type=int, default=3)
+        parser.add_argument('--stripe-latency-ms', type=float, default=200.0)
+
+    def handle(self, *args, **options):
+        products = list(Product.objects.filter(is_active=True)[:options['cart_size']])
+        if not products:
+            raise CommandError('No active products; run seed_products first')
+
+        latency = options['stripe_latency_ms'] / 1000
+        hold_times = []
+        per_checkout_hold = []
+        per_checkout_total = []
+        order_numbers = []
+
+        def fake_customer(**kwargs):
+            time.sleep(latency)
+            return SimpleNamespace(id='cus_bench')
+
+        def fake_intent(**kwargs):
+            time.sleep(latency)
+            return SimpleNamespace(id=f'pi_bench_{time.monotonic_ns()}', client_secret='bench')
+
+        original_enter = transaction.Atomic.__enter__
+        original_exit = transaction.Atomic.__exit__
+
+        def timed_enter(atomic):
+            outermost = not transaction.get_connection(atomic.using).in_atomic_block
+            original_enter(atomic)
+            if outermost:
+                atomic._bench_started = time.perf_counter()
+
+        def timed_exit(atomic, exc_type, exc_value, traceback):
+            started = atomic.__dict__.pop('_bench_started', None)
+            try:
+                return original_exit(atomic, exc_type, exc_value, traceback)
+            finally:
+                if started is not None:
+                    hold_times.append(time.perf_counter() - started)
+
+        payload = {
+            'email': BENCH_EMAIL,
+            'first_name': 'Bench',
+            'last_name': 'Mark',
+            'cart_items': [{'id': product.id, 'quantity': 1} for product in products],
+            'shipping_address_line1': '1 Bench Road',
+            'shipping_city': 'Catskill',
+            'shipping_state': 'NY',
+            'shipping_zip_code': '12414',
+        }
+        factory = APIRequestFactory()
+        view = CheckoutView.as_view()
+
+        # Every checkout comes from one email and IP; the rate limits are not what is measured
+        reset_rate_limits()
+        with override_settings(RATE_LIMITS={}), \
+                mock.patch('store.stripe_service.create_or_get_stripe_customer', side_effect=fake_customer), \
+                mock.patch('store.views.create_payment_intent', side_effect=fake_intent), \
+                mock.patch.object(transaction.Atomic, '__enter__', timed_enter), \
+                mock.patch.object(transaction.Atomic, '__exit__', timed_exit):
+            for _ in range(options['checkouts']):
+                hold_times.clear()
+                request = factory.post('/api/store/checkout/', payload, format='json')
+                started = time.perf_counter()
+                response = async_to_sync(view)(request)
+                per_checkout_total.append(time.perf_counter() - started)
+                per_checkout_hold.append(sum(hold_times))
+                if response.status_code != 201:
+                    raise CommandError(f'Checkout failed: {response.data}')
+                order_numbers.append(response.data['order_number'])
+
+        bench_orders = Order.objects.filter(order_number__in=order_numbers)
+        with transaction.atomic():
+            release_stock(list(bench_orders.values_list('pk', flat=True)))
+            bench_orders.delete()
+        Customer.objects.filter(email=BENCH_EMAIL).delete()
+        forget_stripe_customer(BENCH_EMAIL)
+
+        self._report('Transaction hold time', per_checkout_hold)
+        self._report('Checkout latency', per_checkout_total)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(order_numbers)} checkouts, stubbed Stripe latency '
+            f'{options["stripe_latency_ms"]:.0f}ms per call'
+        ))
+
+    def _report(self, label, samples):
+        samples_ms = sorted(sample * 1000 for sample in samples)
+        p95 = samples_ms[max(0, int(len(samples_ms) * 0.95) - 1)]
+        self.stdout.write(
+            f'{label}: mean {statistics.mean(samples_ms):.2f}ms, '
+            f'p50 {statistics.median(samples_ms):.2f}ms, '
+            f'p95 {p95:.2f}ms, max {samples_ms[-1]:.2f}ms'
+        )
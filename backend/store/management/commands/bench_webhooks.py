@@ -0,0 +1,152 @@
+"""
+Benchmark Stripe webhook acknowledgement latency.
+
+Signed webhook requests are sent to StripeWebhookView and timed, first
+against an empty event queue and then while a worker thread is draining a
+large backlog with a deliberately slow handler. Since the view only
+verifies and stores the event, the ack latency should stay flat however
+far behind the worker is; for contrast, the time the same events took when
+they were handled inside the request is reported too.
+"""
+import hashlib
+import hmac
+import json
+import statistics
+import threading
+import time
+import uuid
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from store.models import StripeEvent
+from store.stripe_service import verify_webhook_signature
+from store.views import StripeWebhookView
+from store.webhooks import process_batch
+
+BENCH_SECRET = 'whsec_bench'
+BENCH_PREFIX = 'evt_bench_'
+
+
+def _event(index):
+    return {
+        'id': f'{BENCH_PREFIX}{uuid.uuid4().hex}',
+        'object': 'event',
+        'type': 'payment_intent.succeeded',
+        'created': int(time.time()),
+        'data': {'object': {'id': f'pi_bench_{index}', 'object': 'payment_intent'}},
+    }
+
+
+def _sign(payload):
+    timestamp = int(time.time())
+    signature = hmac.new(BENCH_SECRET.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+class Command(BaseCommand):
+    help = 'Measure webhook ack latency with an idle queue and with a backlogged worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--webhooks', type=int, default=200)
+        parser.add_argument('--backlog', type=int, default=2000)
+        parser.add_argument('--handler-ms', type=float, default=50.0,
+                            help='Artificial time the worker spends applying each event')
+
+    def handle(self, *args, **options):
+        if options['webhooks'] < 1:
+            raise CommandError('--webhooks must be at least 1')
+        handler_delay = options['handler_ms'] / 1000
+
+        def slow_handler(payment_intent):
+            time.sleep(handler_delay)
+
+        factory = APIRequestFactory()
+        view = StripeWebhookView.as_view()
+
+        def send(count):
+            samples = []
+            for index in range(count):
+                payload = json.dumps(_event(index))
+                request = factory.post(
+                    '/api/store/stripe/webhook/', payload,
+                    content_type='application/json', HTTP_STRIPE_SIGNATURE=_sign(payload),
+                )
+                started = time.perf_counter()
+                response = view(request)
+                samples.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f'Webhook rejected: {response.data}')
+            return samples
+
+        stop = threading.Event()
+
+        def worker():
+            try:
+                while not stop.is_set():
+                    try:
+                        busy = any(process_batch(20))
+                    except OperationalError:
+                        # SQLite allows one writer; the webhook INSERTs win sometimes
+                        continue
+                    if not busy:
+                        time.sleep(0.05)
+            finally:
+                connection.close()
+
+        with override_settings(STRIPE_WEBHOOK_SECRET=BENCH_SECRET), \
+                mock.patch.dict('store.webhooks.HANDLERS', {'payment_intent.succeeded': slow_handler}):
+            try:
+                idle = send(options['webhooks'])
+                StripeEvent.objects.filter(event_id__startswith=BENCH_PREFIX).delete()
+
+                now = timezone.now()
+                StripeEvent.objects.bulk_create([
+                    StripeEvent(
+                        event_id=event['id'], type=event['type'],
+                        payment_intent_id=event['data']['object']['id'],
+                        stripe_created=now, payload=event,
+                    )
+                    for event in map(_event, range(options['backlog']))
+                ], batch_size=500)
+                thread = threading.Thread(target=worker, daemon=True)
+                thread.start()
+                try:
+                    backlogged = send(options['webhooks'])
+                finally:
+                    stop.set()
+                    thread.join()
+                remaining = StripeEvent.objects.filter(
+                    event_id__startswith=BENCH_PREFIX, status='pending'
+                ).count()
+
+                inline = []
+                for index in range(min(options['webhooks'], 20)):
+                    payload = json.dumps(_event(index))
+                    started = time.perf_counter()
+                    event = verify_webhook_signature(payload, _sign(payload))
+                    slow_handler(event['data']['object'])
+                    inline.append(time.perf_counter() - started)
+            finally:
+                StripeEvent.objects.filter(event_id__startswith=BENCH_PREFIX).delete()
+
+        self._report('Ack latency, empty queue', idle)
+        self._report(f'Ack latency, {options["backlog"]} event backlog', backlogged)
+        self._report('Inline handling (handler in the request)', inline)
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["webhooks"]} webhooks per run, worker handler {options["handler_ms"]:.0f}ms, '
+            f'{remaining} events still queued when the backlogged run finished'
+        ))
+
+    def _report(self, label, samples):
+        samples_ms = sorted(sample * 1000 for sample in samples)
+        p95 = samples_ms[max(0, int(len(samples_ms) * 0.95) - 1)]
+        self.stdout.write(
+            f'{label}: mean {statistics.mean(samples_ms):.2f}ms, '
+            f'p50 {statistics.median(samples_ms):.2f}ms, '
+            f'p95 {p95:.2f}ms, max {samples_ms[-1]:.2f}ms'
+        )
@@ -0,0 +1,62 @@
+"""
+Stream a bulk export of orders, customers, subscribers or wholesale
+inquiries to a file or stdout.
+
+Uses the same streaming encoder as the admin export actions
+(earthcare/exports.py), so memory stays flat however large the table is.
+--since keeps rows created (subscribed, for subscribers) on or after a date.
+"""
+import sys
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from earthcare.exports import FORMATS, export_filename, export_stream
+from newsletter.exports import SUBSCRIBER_EXPORT
+from store.exports import CUSTOMER_EXPORT, INQUIRY_EXPORT, ORDER_EXPORT
+
+EXPORTS = {
+    'orders': ORDER_EXPORT,
+    'customers': CUSTOMER_EXPORT,
+    'subscribers': SUBSCRIBER_EXPORT,
+    'inquiries': INQUIRY_EXPORT,
+}
+
+
+class Command(BaseCommand):
+    help = 'Stream orders (with items), customers, subscribers or wholesale inquiries as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORTS))
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--output', '-o',
+                            help='File to write; "-" for stdout, default <kind>-<date>.<format>[.gz]')
+        parser.add_argument('--since', help='Only rows created on or after this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options['kind']]
+        queryset = export.model.objects.all()
+        if options['since']:
+            day = parse_date(options['since'])
+            if day is None:
+                raise CommandError(f'Invalid --since: {options["since"]}')
+            since = timezone.make_aware(datetime.combine(day, time.min))
+            queryset = queryset.filter(**{f'{export.date_field}__gte': since})
+
+        chunks = export_stream(export, queryset, options['format'], options['gzip'])
+        output = options['output'] or export_filename(export, options['format'], options['gzip'])
+        if output == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        written = 0
+        with open(output, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {options["kind"]} export to {output} ({written} bytes)'))
@@ -0,0 +1,33 @@
+"""
+Apply stored Stripe webhook events.
+
+Runs a single batch by default; with --loop it keeps polling, sleeping
+--interval seconds whenever no event is due.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.webhooks import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Apply queued Stripe webhook events in order per payment intent, retrying and dead-lettering failures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new events')
+        parser.add_argument('--interval', type=float, default=1.0, help='Idle poll interval in seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            processed, retried, dead = process_batch(options['batch_size'])
+            if processed or retried or dead:
+                self.stdout.write(
+                    f'Stripe events: {processed} applied, {retried} retrying, {dead} dead-lettered'
+                )
+
+            if not options['loop']:
+                break
+            if not (processed or retried or dead):
+                time.sleep(options['interval'])
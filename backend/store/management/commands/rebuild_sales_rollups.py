@@ -0,0 +1,43 @@
+"""
+Recompute the daily sales rollups from the orders.
+
+Rebuilds every day from the first order to today by default; --since and
+--until (dates, inclusive) narrow it down. Use it to backfill after
+deploying the rollup tables, or after orders were changed outside the
+checkout, webhook and admin paths (shell edits, data migrations).
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from store.models import Order
+from store.rollups import rebuild_rollups
+
+
+def _parse_day(value, option):
+    day = parse_date(value)
+    if day is None:
+        raise CommandError(f'Invalid {option}: {value}')
+    return day
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales and product rollups from orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First day to rebuild (YYYY-MM-DD); defaults to the first order')
+        parser.add_argument('--until', help='Last day to rebuild (YYYY-MM-DD); defaults to today')
+
+    def handle(self, *args, **options):
+        until = _parse_day(options['until'], '--until') if options['until'] else timezone.localdate()
+        if options['since']:
+            since = _parse_day(options['since'], '--since')
+        else:
+            first = Order.objects.aggregate(first=Min('created_at'))['first']
+            since = timezone.localdate(first) if first else until
+        if since > until:
+            raise CommandError('--since is after --until')
+
+        days = rebuild_rollups(since, until)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups for {since}..{until}: {days} day(s) with sales'))
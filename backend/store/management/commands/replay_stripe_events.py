@@ -0,0 +1,67 @@
+"""
+Put stored Stripe events back in the queue so the worker applies them again.
+
+Events are chosen by ID and/or --payment-intent, --status and --since.
+Handlers are idempotent, so replaying processed events is safe. With
+--from-stripe, events Stripe created since --since are fetched from the
+API first, which recovers deliveries that never reached the webhook.
+"""
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from store.models import StripeEvent
+from store.stripe_service import list_events
+from store.webhooks import HANDLERS, record_event, requeue
+
+
+def _parse_since(value):
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Invalid --since: {value}')
+        since = datetime.combine(day, time.min)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+class Command(BaseCommand):
+    help = 'Requeue stored Stripe webhook events (optionally fetching missed ones from Stripe)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', help='Stripe event IDs (evt_...)')
+        parser.add_argument('--payment-intent', help='Only events for this payment intent')
+        parser.add_argument('--status', choices=['pending', 'processed', 'dead'])
+        parser.add_argument('--since', help='Only events Stripe created at or after this date/time')
+        parser.add_argument('--from-stripe', action='store_true',
+                            help='First fetch events created since --since from the Stripe API')
+
+    def handle(self, *args, **options):
+        if not (options['event_ids'] or options['payment_intent'] or options['status'] or options['since']):
+            raise CommandError('Give event IDs or at least one of --payment-intent, --status, --since')
+
+        since = _parse_since(options['since']) if options['since'] else None
+        if options['from_stripe']:
+            if since is None:
+                raise CommandError('--from-stripe needs --since')
+            fetched = 0
+            for event in list_events(since, types=list(HANDLERS)):
+                record_event(event)
+                fetched += 1
+            self.stdout.write(f'Fetched {fetched} event(s) from Stripe')
+
+        events = StripeEvent.objects.all()
+        if options['event_ids']:
+            events = events.filter(event_id__in=options['event_ids'])
+        if options['payment_intent']:
+            events = events.filter(payment_intent_id=options['payment_intent'])
+        if options['status']:
+            events = events.filter(status=options['status'])
+        if since is not None:
+            events = events.filter(stripe_created__gte=since)
+
+        self.stdout.write(self.style.SUCCESS(f'Requeued {requeue(events)} event(s)'))
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:44
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(help_text='Stripe event ID (evt_...)', max_length=100, unique=True)),
+                ('type', models.CharField(max_length=100)),
+                ('payment_intent_id', models.CharField(blank=True, help_text='Events for one payment intent are applied in order', max_length=100)),
+                ('stripe_created', models.DateTimeField(help_text='When Stripe created the event')),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('dead', 'Dead-lettered')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Stripe Event',
+                'verbose_name_plural': 'Stripe Events',
+                'ordering': ['stripe_created', 'id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='stripe_event_due_idx'), models.Index(fields=['payment_intent_id', 'status', 'stripe_created'], name='stripe_event_intent_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:50
+
+from django.db import migrations, models
+
+from earthcare.migration_operations import AddIndexOnline
+
+
+class Migration(migrations.Migration):
+    # Indexes are built CONCURRENTLY on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('store', '0002_stripe_event'),
+    ]
+
+    operations = [
+        AddIndexOnline(
+            model_name='customer',
+            index=models.Index(condition=models.Q(('stripe_customer_id__isnull', False)), fields=['stripe_customer_id'], name='customer_stripe_id_idx'),
+        ),
+        AddIndexOnline(
+            model_name='order',
+            index=models.Index(fields=['stripe_payment_intent_id'], name='order_payment_intent_idx'),
+        ),
+        AddIndexOnline(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='order_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='order_pending_idx'),
+        ),
+        AddIndexOnline(
+            model_name='wholesaleinquiry',
+            index=models.Index(fields=['status', 'created_at'], name='inquiry_status_created_idx'),
+        ),
+    ]
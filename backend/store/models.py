@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
@@ -52,6 +53,12 @@ class Customer(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['stripe_customer_id'], name='customer_stripe_id_idx',
+                condition=models.Q(stripe_customer_id__isnull=False),
+            ),
+        ]
         verbose_name = 'Customer'
         verbose_name_plural = 'Customers'
 
@@ -69,6 +76,8 @@ class Order(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     ]
+    # Statuses of an order whose payment went through
+    PAID_STATUSES = ('paid', 'shipped', 'delivered')
 
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, related_name='orders')
     order_number = models.CharField(max_length=50, unique=True)
@@ -98,6 +107,12 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['stripe_payment_intent_id'], name='order_payment_intent_idx'),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            # Orders still waiting for payment, oldest first (expire_pending_orders)
+            models.Index(fields=['created_at'], name='order_pending_idx', condition=models.Q(status='pending')),
+        ]
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
 
@@ -105,6 +120,15 @@ class Order(models.Model):
         return f"Order {self.order_number} - {self.customer.email if self.customer else 'Guest'}"
 
 
+class OrderItemQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create bypasses save(), so compute line totals here as well
+        objs = list(objs)
+        for obj in objs:
+            obj.compute_total_price()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class OrderItem(models.Model):
     """Individual items in an order"""
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -114,6 +138,8 @@ class OrderItem(models.Model):
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    objects = OrderItemQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Order Item'
         verbose_name_plural = 'Order Items'
@@ -121,8 +147,11 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity}x {self.product_name}"
 
-    def save(self, *args, **kwargs):
+    def compute_total_price(self):
         self.total_price = self.unit_price * self.quantity
+
+    def save(self, *args, **kwargs):
+        self.compute_total_price()
         super().save(*args, **kwargs)
 
 
@@ -152,8 +181,92 @@ class WholesaleInquiry(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='inquiry_status_created_idx'),
+        ]
         verbose_name = 'Wholesale Inquiry'
         verbose_name_plural = 'Wholesale Inquiries'
 
     def __str__(self):
         return f"{self.business_name} - {self.contact_name}"
+
+
+class StripeEvent(models.Model):
+    """Stripe webhook event, stored on receipt and applied by the process_stripe_events worker"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('dead', 'Dead-lettered'),
+    ]
+
+    event_id = models.CharField(max_length=100, unique=True, help_text="Stripe event ID (evt_...)")
+    type = models.CharField(max_length=100)
+    payment_intent_id = models.CharField(
+        max_length=100, blank=True, help_text="Events for one payment intent are applied in order"
+    )
+    stripe_created = models.DateTimeField(help_text="When Stripe created the event")
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['stripe_created', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='stripe_event_due_idx'),
+            models.Index(fields=['payment_intent_id', 'status', 'stripe_created'], name='stripe_event_intent_idx'),
+        ]
+        verbose_name = 'Stripe Event'
+        verbose_name_plural = 'Stripe Events'
+
+    def __str__(self):
+        return f"{self.type} {self.event_id} - {self.status}"
+
+
+class DailySales(models.Model):
+    """Sales totals for one day, maintained incrementally by store/rollups.py"""
+    date = models.DateField(unique=True)
+    checkouts = models.IntegerField(default=0, help_text="Orders created at checkout")
+    converted = models.IntegerField(default=0, help_text="Orders created this day that have been paid")
+    paid_orders = models.IntegerField(default=0, help_text="Orders paid this day")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    discount_total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    units = models.IntegerField(default=0)
+    subscriber_orders = models.IntegerField(default=0)
+    subscriber_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    guest_orders = models.IntegerField(default=0)
+    guest_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name = 'Daily Sales'
+        verbose_name_plural = 'Daily Sales'
+
+    def __str__(self):
+        return f"{self.date}: {self.paid_orders} paid, ${self.revenue}"
+
+
+class DailyProductSales(models.Model):
+    """Units and revenue (before discounts) of one product on one day"""
+    date = models.DateField()
+    # No FK constraint: the history outlives deleted products
+    product = models.ForeignKey(
+        Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    product_name = models.CharField(max_length=200)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        ordering = ['-date', 'product']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='unique_daily_product_sales'),
+        ]
+        verbose_name = 'Daily Product Sales'
+        verbose_name_plural = 'Daily Product Sales'
+
+    def __str__(self):
+        return f"{self.date}: {self.product_name} x{self.units}"
@@ -0,0 +1,220 @@
+"""
+Daily sales rollups for the staff dashboard.
+
+DailySales keeps one row per day and DailyProductSales one per day and
+product. They are updated incrementally, in the same transaction as the
+order change they count, so reports never aggregate over Order/OrderItem:
+
+- record_checkout(order): checkout recorded a pending order; counted on
+  the day the order was created.
+- record_payment(order): the order became paid. Its revenue, discount,
+  units and subscriber/guest split count on the day it was paid, and it
+  counts as converted on the day it was created, so the conversion rate
+  of a day is the share of that day's checkouts that were paid.
+- record_payment(order, sign=-1) takes that back when staff move a paid
+  order out of the paid statuses.
+
+Orders with a subscriber discount count as subscriber orders, the rest as
+guest orders. Every update is a row upsert followed by `col = col + n`, so
+concurrent workers never lose an increment. rebuild_rollups() recomputes
+days from the orders themselves, for backfills or after edits made
+outside the checkout, webhook and admin paths. Days are in TIME_ZONE.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Max, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyProductSales, DailySales, Order, OrderItem
+
+# The DailySales columns the dashboard sums over a range
+SUMMED = (
+    'checkouts', 'converted', 'paid_orders', 'revenue', 'discount_total', 'units',
+    'subscriber_orders', 'subscriber_revenue', 'guest_orders', 'guest_revenue',
+)
+
+
+def _day(moment):
+    return timezone.localdate(moment)
+
+
+def _add_to_day(day, **amounts):
+    DailySales.objects.bulk_create([DailySales(date=day)], ignore_conflicts=True)
+    DailySales.objects.filter(date=day).update(**{name: F(name) + value for name, value in amounts.items()})
+
+
+def _per_product(values, output_field):
+    return Case(
+        *[When(product_id=product_id, then=Value(value)) for product_id, value in values.items()],
+        output_field=output_field,
+    )
+
+
+def _add_to_products(day, products):
+    """products: {product_id: [name, units, revenue]}"""
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(date=day, product_id=product_id, product_name=name)
+        for product_id, (name, _, _) in products.items()
+    ], ignore_conflicts=True)
+    DailyProductSales.objects.filter(date=day, product_id__in=list(products)).update(
+        units=F('units') + _per_product({pk: units for pk, (_, units, _) in products.items()}, IntegerField()),
+        revenue=F('revenue') + _per_product(
+            {pk: revenue for pk, (_, _, revenue) in products.items()},
+            DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+
+
+def record_checkout(order):
+    """Count a new pending order"""
+    _add_to_day(_day(order.created_at), checkouts=1)
+
+
+def record_payment(order, sign=1):
+    """Count `order` as paid (sign=1) or take that back (sign=-1)"""
+    products = {}
+    units = 0
+    for product_id, name, quantity, total in order.items.values_list(
+        'product_id', 'product_name', 'quantity', 'total_price'
+    ):
+        units += quantity
+        if product_id is None:
+            continue
+        entry = products.setdefault(product_id, [name, 0, Decimal('0.00')])
+        entry[1] += sign * quantity
+        entry[2] += sign * total
+
+    segment = 'subscriber' if order.discount_amount > 0 else 'guest'
+    paid_day = _day(order.paid_at or timezone.now())
+    _add_to_day(_day(order.created_at), converted=sign)
+    _add_to_day(paid_day, **{
+        'paid_orders': sign,
+        'revenue': sign * order.total_amount,
+        'discount_total': sign * order.discount_amount,
+        'units': sign * units,
+        f'{segment}_orders': sign,
+        f'{segment}_revenue': sign * order.total_amount,
+    })
+    if products:
+        _add_to_products(paid_day, products)
+
+
+def _day_bounds(start, end):
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start, time.min), tz),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz),
+    )
+
+
+@transaction.atomic
+def rebuild_rollups(start, end):
+    """Recompute the rollups of days start..end (inclusive) from the orders"""
+    since, until = _day_bounds(start, end)
+    tz = timezone.get_current_timezone()
+    DailySales.objects.filter(date__range=(start, end)).delete()
+    DailyProductSales.objects.filter(date__range=(start, end)).delete()
+
+    days = defaultdict(dict)
+    created = (
+        Order.objects.filter(created_at__gte=since, created_at__lt=until)
+        .annotate(day=TruncDate('created_at', tzinfo=tz))
+        .values('day')
+        .annotate(checkouts=Count('id'), converted=Count('id', filter=Q(status__in=Order.PAID_STATUSES)))
+        .order_by()
+    )
+    for row in created:
+        days[row.pop('day')].update(row)
+
+    subscriber = Q(discount_amount__gt=0)
+    paid = (
+        Order.objects.filter(status__in=Order.PAID_STATUSES, paid_at__gte=since, paid_at__lt=until)
+        .annotate(day=TruncDate('paid_at', tzinfo=tz))
+        .values('day')
+        .annotate(
+            paid_orders=Count('id'),
+            revenue=Sum('total_amount'),
+            discount_total=Sum('discount_amount'),
+            subscriber_orders=Count('id', filter=subscriber),
+            subscriber_revenue=Sum('total_amount', filter=subscriber),
+            guest_orders=Count('id', filter=~subscriber),
+            guest_revenue=Sum('total_amount', filter=~subscriber),
+        )
+        .order_by()
+    )
+    for row in paid:
+        days[row.pop('day')].update({name: value for name, value in row.items() if value is not None})
+
+    items = (
+        OrderItem.objects
+        .filter(order__status__in=Order.PAID_STATUSES, order__paid_at__gte=since, order__paid_at__lt=until)
+        .annotate(day=TruncDate('order__paid_at', tzinfo=tz))
+        .values('day', 'product_id')
+        .annotate(units=Sum('quantity'), revenue=Sum('total_price'), product_name=Max('product_name'))
+        .order_by()
+    )
+    product_rows = []
+    for row in items:
+        days[row['day']]['units'] = days[row['day']].get('units', 0) + row['units']
+        if row['product_id'] is not None:
+            product_rows.append(DailyProductSales(
+                date=row['day'], product_id=row['product_id'], product_name=row['product_name'],
+                units=row['units'], revenue=row['revenue'],
+            ))
+
+    DailySales.objects.bulk_create([DailySales(date=day, **values) for day, values in days.items()])
+    DailyProductSales.objects.bulk_create(product_rows)
+    return len(days)
+
+
+def _rate(part, whole):
+    return round(part / whole, 4) if whole else 0.0
+
+
+def sales_summary(start, end, top=10):
+    """Dashboard data for days start..end (inclusive), read from the rollup tables only"""
+    rows = {row.date: row for row in DailySales.objects.filter(date__range=(start, end))}
+    totals = {name: 0 for name in SUMMED}
+    days = []
+    day = start
+    while day <= end:
+        row = rows.get(day) or DailySales(date=day)
+        values = {name: getattr(row, name) for name in SUMMED}
+        for name, value in values.items():
+            totals[name] += value
+        days.append({
+            'date': day.isoformat(),
+            **{name: float(value) if isinstance(value, Decimal) else value for name, value in values.items()},
+            'conversion_rate': _rate(row.converted, row.checkouts),
+        })
+        day += timedelta(days=1)
+
+    products = (
+        DailyProductSales.objects.filter(date__range=(start, end))
+        .values('product_id')
+        .annotate(product_name=Max('product_name'), units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'product_id')[:top]
+    )
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'totals': {
+            **{name: float(value) if isinstance(value, Decimal) else value for name, value in totals.items()},
+            'conversion_rate': _rate(totals['converted'], totals['checkouts']),
+            'average_order_value': float(totals['revenue'] / totals['paid_orders']) if totals['paid_orders'] else 0.0,
+        },
+        'days': days,
+        'top_products': [
+            {
+                'product_id': row['product_id'],
+                'product_name': row['product_name'],
+                'units': row['units'],
+                'revenue': float(row['revenue']),
+            }
+            for row in products
+        ],
+    }
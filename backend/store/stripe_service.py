@@ -1,20 +1,98 @@
 import stripe
+import uuid
 from django.conf import settings
+from django.core.cache import cache
 from decimal import Decimal
 
+from earthcare.outbound import get_vendor
+
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+# Route the SDK through the shared pooled session with our timeouts; retries
+# are handled by the outbound layer, not by the SDK
+_vendor = get_vendor('stripe')
+stripe.default_http_client = stripe.http_client.RequestsClient(
+    timeout=_vendor.timeout, session=_vendor.session
+)
+stripe.max_network_retries = 0
+
+STRIPE_TRANSIENT_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.RateLimitError,
+    stripe.error.APIError,
+)
+
+
+def _stripe_call(func, *args, write=False, **kwargs):
+    """
+    Call the Stripe SDK through the outbound layer's breaker and retries.
+    Writes carry an idempotency key generated once, so a retried request
+    can never create a second object.
+    """
+    if write:
+        kwargs.setdefault('idempotency_key', str(uuid.uuid4()))
+    return _vendor.call(
+        func, *args, idempotent=True, transient=STRIPE_TRANSIENT_ERRORS, **kwargs
+    )
+
+
+class StaleStripeCustomerError(Exception):
+    """Raised when Stripe no longer recognises a customer ID we stored"""
+
+    def __init__(self, customer_id):
+        super().__init__(f"Stripe customer {customer_id} no longer exists")
+        self.customer_id = customer_id
+
+
+def _customer_cache_key(email):
+    return f"stripe:customer:{email.strip().lower()}"
+
+
+def get_stripe_customer_id(email, first_name='', last_name='', known_id=None):
+    """
+    Resolve the Stripe customer ID for an email.
+    Trusts an ID we already stored, then the shared email->ID cache, and only
+    searches/creates on Stripe for emails we have not seen before.
+    """
+    if known_id:
+        return known_id
+    
+    key = _customer_cache_key(email)
+    customer_id = cache.get(key)
+    if customer_id:
+        return customer_id
+    
+    customer = create_or_get_stripe_customer(
+        email=email, first_name=first_name, last_name=last_name
+    )
+    if not customer:
+        return None
+    
+    cache.set(key, customer.id, settings.STRIPE_CUSTOMER_CACHE_TTL)
+    return customer.id
+
+
+def forget_stripe_customer(email):
+    """Drop a cached Stripe customer ID, e.g. after Stripe rejected it"""
+    cache.delete(_customer_cache_key(email))
+
+
+def _is_missing_customer_error(error):
+    return error.code == 'resource_missing' and error.param == 'customer'
+
 
 def create_or_get_stripe_customer(email, first_name='', last_name=''):
     """Create or retrieve a Stripe customer"""
     try:
         # Search for existing customer
-        customers = stripe.Customer.list(email=email, limit=1)
+        customers = _stripe_call(stripe.Customer.list, email=email, limit=1)
         if customers.data:
             return customers.data[0]
         
         # Create new customer
-        customer = stripe.Customer.create(
+        customer = _stripe_call(
+            stripe.Customer.create,
+            write=True,
             email=email,
             name=f"{first_name} {last_name}".strip(),
         )
@@ -28,9 +106,12 @@ def create_payment_intent(amount, customer_id, metadata=None):
     """
     Create a Stripe Payment Intent
     amount: in cents (multiply by 100)
+    Raises StaleStripeCustomerError if Stripe does not know customer_id.
     """
     try:
-        intent = stripe.PaymentIntent.create(
+        intent = _stripe_call(
+            stripe.PaymentIntent.create,
+            write=True,
             amount=int(amount * 100),  # Convert to cents
             currency='usd',
             customer=customer_id,
@@ -38,17 +119,33 @@ def create_payment_intent(amount, customer_id, metadata=None):
             automatic_payment_methods={'enabled': True},
         )
         return intent
+    except stripe.error.InvalidRequestError as e:
+        if customer_id and _is_missing_customer_error(e):
+            raise StaleStripeCustomerError(customer_id) from e
+        print(f"Error creating payment intent: {e}")
+        return None
     except Exception as e:
         print(f"Error creating payment intent: {e}")
         return None
 
 
+def cancel_payment_intent(payment_intent_id):
+    """Cancel a Payment Intent whose order could not be completed"""
+    try:
+        return _stripe_call(stripe.PaymentIntent.cancel, payment_intent_id, write=True)
+    except Exception as e:
+        print(f"Error cancelling payment intent {payment_intent_id}: {e}")
+        return None
+
+
 def create_checkout_session(line_items, customer_email, success_url, cancel_url, metadata=None):
     """
     Create a Stripe Checkout Session for redirect-based checkout
     """
     try:
-        session = stripe.checkout.Session.create(
+        session = _stripe_call(
+            stripe.checkout.Session.create,
+            write=True,
             payment_method_types=['card'],
             line_items=line_items,
             mode='payment',
@@ -71,19 +168,25 @@ def create_or_update_product(product_data):
     try:
         # Check if product already exists
         if product_data.get('stripe_product_id'):
-            product = stripe.Product.modify(
+            product = _stripe_call(
+                stripe.Product.modify,
                 product_data['stripe_product_id'],
+                write=True,
                 name=product_data['name'],
                 description=product_data.get('description', ''),
             )
         else:
-            product = stripe.Product.create(
+            product = _stripe_call(
+                stripe.Product.create,
+                write=True,
                 name=product_data['name'],
                 description=product_data.get('description', ''),
             )
         
         # Create or update price
-        price = stripe.Price.create(
+        price = _stripe_call(
+            stripe.Price.create,
+            write=True,
             product=product.id,
             unit_amount=int(float(product_data['price']) * 100),  # Convert to cents
             currency='usd',
@@ -113,3 +216,13 @@ def verify_webhook_signature(payload, sig_header):
         # Invalid signature
         print(f"Invalid signature: {e}")
         return None
+
+
+def list_events(since, types=None):
+    """Iterate over Stripe events created at or after `since` (a datetime), as dicts"""
+    params = {'created': {'gte': int(since.timestamp())}, 'limit': 100}
+    if types:
+        params['types'] = list(types)
+    events = _stripe_call(stripe.Event.list, **params)
+    for event in events.auto_paging_iter():
+        yield event.to_dict_recursive()
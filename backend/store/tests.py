@@ -1,3 +1,772 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from earthcare.exports import export_stream
+from earthcare.ratelimit import reset_rate_limits
+from newsletter.models import OutboxEmail
+
+from .exports import CUSTOMER_EXPORT, ORDER_EXPORT
+from .catalog_cache import bump_catalog_version, get_cache_stats, reset_catalog_cache
+from .inventory import OutOfStock, reserve_stock
+from .jobs import expire_pending_orders, process_stripe_events
+from .models import Product, Customer, Order, OrderItem, StripeEvent, DailySales, DailyProductSales
+from .rollups import rebuild_rollups
+from .stripe_service import StaleStripeCustomerError, get_stripe_customer_id
+from .webhooks import _handle_failed_payment, _handle_successful_payment, process_batch, requeue
+
+
+def make_product(product_id, **overrides):
+    fields = {
+        'id': product_id,
+        'name': f'Product {product_id}',
+        'tagline': 'Tagline',
+        'description': 'Description',
+        'price': Decimal('10.00'),
+        'unit': '32oz',
+        'image': 'https://example.com/image.jpg',
+        'benefits': ['Benefit'],
+        'is_active': True,
+        'stock_quantity': 100,
+    }
+    fields.update(overrides)
+    return Product.objects.create(**fields)
+
+
+def checkout_payload(cart_items, **overrides):
+    payload = {
+        'email': 'buyer@example.com',
+        'first_name': 'Ada',
+        'last_name': 'Soil',
+        'cart_items': cart_items,
+        'shipping_address_line1': '1 Farm Road',
+        'shipping_city': 'Catskill',
+        'shipping_state': 'NY',
+        'shipping_zip_code': '12414',
+    }
+    payload.update(overrides)
+    return payload
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_catalog_cache()
+        self.client = APIClient()
+        make_product('1', name='Greek Yogurt')
+        make_product('2', name='Kefir')
+        make_product('3', name='Hidden', is_active=False)
+
+    def test_list_served_from_cache_without_queries(self):
+        response = self.client.get('/api/store/products/')
+        self.assertEqual(response['X-Catalog-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 2)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/store/products/')
+        self.assertEqual(response['X-Catalog-Cache'], 'HIT')
+        self.assertEqual([p['id'] for p in response.data['results']], ['1', '2'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/store/products/2/')
+        self.assertEqual(response.data['name'], 'Kefir')
+
+        stats = get_cache_stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 2)
+
+    def test_inactive_product_detail_is_404(self):
+        response = self.client.get('/api/store/products/3/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_product_save_and_delete_invalidate(self):
+        self.client.get('/api/store/products/')
+
+        product = Product.objects.get(id='1')
+        product.price = Decimal('12.00')
+        product.save()
+        response = self.client.get('/api/store/products/1/')
+        self.assertEqual(response['X-Catalog-Cache'], 'MISS')
+        self.assertEqual(response.data['price'], '12.00')
+
+        product.delete()
+        response = self.client.get('/api/store/products/')
+        self.assertEqual(response.data['count'], 1)
+
+    def test_evicted_version_is_never_reused(self):
+        self.client.get('/api/store/products/')
+        # The version key is lost (eviction, cache restart) while workers keep their snapshots
+        cache.clear()
+        response = self.client.get('/api/store/products/')
+        self.assertEqual(response['X-Catalog-Cache'], 'MISS')
+
+    def test_bulk_update_requires_explicit_bump(self):
+        self.client.get('/api/store/products/')
+        Product.objects.filter(id='3').update(is_active=True)
+        bump_catalog_version()
+        response = self.client.get('/api/store/products/')
+        self.assertEqual(response.data['count'], 3)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_catalog_cache()
+        self.client = APIClient()
+        make_product('1')
+
+    def test_list_returns_304_without_serializing(self):
+        response = self.client.get('/api/store/products/')
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        self.assertIn('public', response['Cache-Control'])
+
+        # A cold worker answers from the catalog state query alone
+        reset_catalog_cache()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/store/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_changes_with_catalog_and_page(self):
+        list_etag = self.client.get('/api/store/products/')['ETag']
+        detail_etag = self.client.get('/api/store/products/1/')['ETag']
+        self.assertNotEqual(list_etag, detail_etag)
+        self.assertNotEqual(list_etag, self.client.get('/api/store/products/?page=1')['ETag'])
+
+        make_product('2')
+        response = self.client.get('/api/store/products/', HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], list_etag)
+
+    def test_stripe_config_conditional(self):
+        response = self.client.get('/api/store/stripe/config/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/store/stripe/config/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('max-age=3600', response['Cache-Control'])
+
+
+@mock.patch('store.views.create_payment_intent',
+            return_value=SimpleNamespace(id='pi_test', client_secret='pi_test_secret'))
+@mock.patch('store.stripe_service.create_or_get_stripe_customer',
+            return_value=SimpleNamespace(id='cus_test'))
+class CheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_rate_limits()
+        self.client = APIClient()
+        for i in range(1, 11):
+            make_product(str(i), price=Decimal('5.00'))
+
+    def _checkout(self, product_ids):
+        cart = [{'id': product_id, 'quantity': 2} for product_id in product_ids]
+        return self.client.post('/api/store/checkout/', checkout_payload(cart), format='json')
+
+    def test_order_lines_have_totals(self, *mocks):
+        response = self._checkout(['1', '2'])
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(order_number=response.data['order_number'])
+        self.assertEqual(order.subtotal, Decimal('20.00'))
+        self.assertEqual(
+            sorted(order.items.values_list('total_price', flat=True)),
+            [Decimal('10.00'), Decimal('10.00')],
+        )
+
+    def test_unknown_product_rejected(self, *mocks):
+        response = self._checkout(['1', 'missing'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Product missing not found')
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_query_count_independent_of_cart_size(self, *mocks):
+        self._checkout(['1'])  # create the customer up front
+
+        with CaptureQueriesContext(connection) as small:
+            self._checkout(['1'])
+        with CaptureQueriesContext(connection) as large:
+            self._checkout([str(i) for i in range(1, 11)])
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    @override_settings(RATE_LIMITS={'checkout': {'ip': '100/min', 'email': '2/min'}})
+    def test_checkout_is_rate_limited_per_email(self, *mocks):
+        self.assertEqual(self._checkout(['1']).status_code, 201)
+        self.assertEqual(self._checkout(['1']).status_code, 201)
+        response = self._checkout(['1'])
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class CheckoutPhaseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_rate_limits()
+        self.client = APIClient()
+        make_product('1')
+
+    def _checkout(self):
+        payload = checkout_payload([{'id': '1', 'quantity': 1}])
+        return self.client.post('/api/store/checkout/', payload, format='json')
+
+    def test_stripe_calls_run_outside_transaction(self):
+        # TestCase wraps each test in atomic blocks of its own; the Stripe
+        # calls must not run any deeper than that. They may also run on a
+        # worker thread, whose connection starts with no atomic blocks.
+        main_thread = threading.current_thread()
+        baseline = len(connection.atomic_blocks)
+        depths = []
+
+        def depth():
+            own_baseline = baseline if threading.current_thread() is main_thread else 0
+            return len(connection.atomic_blocks) - own_baseline
+
+        def fake_customer(**kwargs):
+            depths.append(depth())
+            return SimpleNamespace(id='cus_test')
+
+        def fake_intent(**kwargs):
+            depths.append(depth())
+            return SimpleNamespace(id='pi_test', client_secret='secret')
+
+        with mock.patch('store.stripe_service.create_or_get_stripe_customer', side_effect=fake_customer), \
+                mock.patch('store.views.create_payment_intent', side_effect=fake_intent):
+            response = self._checkout()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(depths, [0, 0])
+        order = Order.objects.get()
+        self.assertEqual(order.stripe_payment_intent_id, 'pi_test')
+        self.assertEqual(order.customer.stripe_customer_id, 'cus_test')
+
+    @mock.patch('store.views.create_payment_intent', return_value=None)
+    @mock.patch('store.stripe_service.create_or_get_stripe_customer', return_value=None)
+    def test_failed_payment_intent_cancels_order(self, *mocks):
+        response = self._checkout()
+        self.assertEqual(response.status_code, 500)
+        order = Order.objects.get()
+        self.assertEqual(order.status, 'cancelled')
+        self.assertIn('Failed to create payment intent', order.notes)
+
+
+class StripeCustomerCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_rate_limits()
+        self.client = APIClient()
+        make_product('1')
+        self.intent = SimpleNamespace(id='pi_test', client_secret='secret')
+
+    def _checkout(self, email='buyer@example.com'):
+        payload = checkout_payload([{'id': '1', 'quantity': 1}], email=email)
+        return self.client.post('/api/store/checkout/', payload, format='json')
+
+    def test_stored_id_skips_stripe_lookup(self):
+        Customer.objects.create(email='buyer@example.com', stripe_customer_id='cus_stored')
+        with mock.patch('store.stripe_service.create_or_get_stripe_customer') as lookup, \
+                mock.patch('store.views.create_payment_intent', return_value=self.intent) as create:
+            self._checkout()
+        lookup.assert_not_called()
+        self.assertEqual(create.call_args.kwargs['customer_id'], 'cus_stored')
+
+    def test_new_email_looked_up_once_then_cached(self):
+        with mock.patch('store.stripe_service.create_or_get_stripe_customer',
+                        return_value=SimpleNamespace(id='cus_new')) as lookup, \
+                mock.patch('store.views.create_payment_intent', return_value=self.intent):
+            self._checkout()
+            self.assertEqual(get_stripe_customer_id('BUYER@example.com'), 'cus_new')
+        lookup.assert_called_once()
+        self.assertEqual(Customer.objects.get().stripe_customer_id, 'cus_new')
+
+    def test_stale_id_is_refreshed(self):
+        Customer.objects.create(email='buyer@example.com', stripe_customer_id='cus_deleted')
+
+        def fake_intent(amount, customer_id, metadata):
+            if customer_id == 'cus_deleted':
+                raise StaleStripeCustomerError(customer_id)
+            return self.intent
+
+        with mock.patch('store.stripe_service.create_or_get_stripe_customer',
+                        return_value=SimpleNamespace(id='cus_fresh')), \
+                mock.patch('store.views.create_payment_intent', side_effect=fake_intent):
+            response = self._checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Customer.objects.get().stripe_customer_id, 'cus_fresh')
+
+
+def stripe_event(event_id, event_type, payment_intent_id='pi_1', created=1700000000, **intent):
+    return {
+        'id': event_id,
+        'object': 'event',
+        'type': event_type,
+        'created': created,
+        'data': {'object': dict({'id': payment_intent_id, 'object': 'payment_intent'}, **intent)},
+    }
+
+
+class StripeWebhookMixin:
+    def setUp(self):
+        self.client = APIClient()
+        self.order = Order.objects.create(
+            order_number='EC-WEBHOOK', subtotal=Decimal('10.00'), total_amount=Decimal('10.00'),
+            shipping_first_name='A', shipping_last_name='B', shipping_address_line1='1 Road',
+            shipping_city='C', shipping_state='NY', shipping_zip_code='12414',
+            stripe_payment_intent_id='pi_1',
+        )
+
+    def _deliver(self, event):
+        return self.client.post(
+            '/api/store/stripe/webhook/', json.dumps(event),
+            content_type='application/json', HTTP_STRIPE_SIGNATURE='t=1,v1=sig',
+        )
+
+
+@mock.patch('store.views.verify_webhook_signature', return_value={'verified': True})
+@override_settings(STRIPE_APPLY_EVENTS_INLINE=False)
+class StripeWebhookTests(StripeWebhookMixin, TestCase):
+    def test_ack_only_records_event(self, verify):
+        response = self._deliver(stripe_event('evt_1', 'payment_intent.succeeded'))
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+        event = StripeEvent.objects.get()
+        self.assertEqual((event.event_id, event.payment_intent_id, event.status), ('evt_1', 'pi_1', 'pending'))
+
+        self.assertEqual(process_batch(), (1, 0, 0))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'paid')
+        self.assertIsNotNone(self.order.paid_at)
+
+    def test_redelivery_is_deduplicated(self, verify):
+        for _ in range(3):
+            self.assertEqual(self._deliver(stripe_event('evt_1', 'payment_intent.succeeded')).status_code, 200)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+
+    def test_invalid_signature_rejected(self, verify):
+        verify.return_value = None
+        response = self._deliver(stripe_event('evt_1', 'payment_intent.succeeded'))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_events_applied_in_order_per_payment_intent(self, verify):
+        # Delivered out of order: the failure happened before the success
+        self._deliver(stripe_event('evt_ok', 'payment_intent.succeeded', created=1700000100))
+        self._deliver(stripe_event('evt_fail', 'payment_intent.payment_failed', created=1700000000,
+                                   last_payment_error={'message': 'Card declined'}))
+        self._deliver(stripe_event('evt_other', 'payment_intent.succeeded', payment_intent_id='pi_2'))
+
+        # One event per intent per batch, oldest first
+        with mock.patch('store.webhooks.HANDLERS', {}):
+            self.assertEqual(process_batch(), (2, 0, 0))
+        self.assertEqual(
+            set(StripeEvent.objects.filter(status='processed').values_list('event_id', flat=True)),
+            {'evt_fail', 'evt_other'},
+        )
+        requeue(StripeEvent.objects.all())
+
+        process_batch()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')
+        self.assertIn('Card declined', self.order.notes)
+        # Stripe retried the card and it went through
+        process_batch()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'paid')
+
+    def test_unknown_order_retried_then_dead_lettered(self, verify):
+        self._deliver(stripe_event('evt_1', 'payment_intent.succeeded', payment_intent_id='pi_unknown'))
+        self._deliver(stripe_event('evt_2', 'payment_intent.payment_failed', payment_intent_id='pi_unknown',
+                                   created=1700000100))
+
+        with override_settings(STRIPE_EVENT_MAX_ATTEMPTS=2):
+            self.assertEqual(process_batch(), (0, 1, 0))
+            first = StripeEvent.objects.get(event_id='evt_1')
+            self.assertEqual(first.attempts, 1)
+            self.assertGreater(first.next_attempt_at, timezone.now())
+            self.assertIn('pi_unknown', first.last_error)
+            # The later event waits behind the retrying one
+            StripeEvent.objects.filter(event_id='evt_2').update(next_attempt_at=timezone.now())
+            self.assertEqual(process_batch(), (0, 0, 0))
+
+            StripeEvent.objects.filter(event_id='evt_1').update(next_attempt_at=timezone.now())
+            self.assertEqual(process_batch(), (0, 0, 1))
+            self.assertEqual(StripeEvent.objects.get(event_id='evt_1').status, 'dead')
+
+    def test_replay_reapplies_idempotently(self, verify):
+        self._deliver(stripe_event('evt_1', 'payment_intent.succeeded'))
+        process_batch()
+        self.order.refresh_from_db()
+        paid_at = self.order.paid_at
+
+        call_command('replay_stripe_events', 'evt_1', stdout=open('/dev/null', 'w'))
+        self.assertEqual(StripeEvent.objects.get().status, 'pending')
+        self.assertEqual(process_batch(), (1, 0, 0))
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.paid_at), ('paid', paid_at))
+
+    def test_paid_order_queues_one_confirmation_email(self, verify):
+        customer = Customer.objects.create(email='buyer@example.com', first_name='Ana', last_name='B')
+        Order.objects.filter(pk=self.order.pk).update(customer=customer)
+        OrderItem.objects.create(order=self.order, product_name='Kefir <Plain>', quantity=2, unit_price=Decimal('5.00'))
+
+        self._deliver(stripe_event('evt_1', 'payment_intent.succeeded'))
+        process_batch()
+        call_command('replay_stripe_events', 'evt_1', stdout=open('/dev/null', 'w'))
+        process_batch()
+
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.to_email, email.kind), ('buyer@example.com', 'order_confirmation'))
+        self.assertIn('EC-WEBHOOK', email.subject)
+        self.assertIn('Kefir &lt;Plain&gt; × 2', email.html_content)
+
+
+@mock.patch('store.views.verify_webhook_signature', return_value={'verified': True})
+class InlineStripeWebhookTests(StripeWebhookMixin, TestCase):
+    def test_event_is_applied_in_the_request(self, verify):
+        self._deliver(stripe_event('evt_1', 'payment_intent.succeeded'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'paid')
+        self.assertEqual(StripeEvent.objects.get().status, 'processed')
+
+        self._deliver(stripe_event('evt_1', 'payment_intent.succeeded'))
+        self.assertEqual(StripeEvent.objects.get().attempts, 1)
+
+    def test_failed_event_is_retried_by_the_scheduled_job(self, verify):
+        self._deliver(stripe_event('evt_1', 'payment_intent.succeeded', payment_intent_id='pi_late'))
+        event = StripeEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+
+        Order.objects.filter(pk=self.order.pk).update(stripe_payment_intent_id='pi_late')
+        StripeEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_stripe_events(), 'Stripe events: 1 applied, 0 retrying, 0 dead-lettered')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'paid')
+
+
+@mock.patch('store.views.create_payment_intent',
+            return_value=SimpleNamespace(id='pi_test', client_secret='secret'))
+@mock.patch('store.stripe_service.create_or_get_stripe_customer',
+            return_value=SimpleNamespace(id='cus_test'))
+class InventoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_rate_limits()
+        self.client = APIClient()
+        make_product('1', stock_quantity=5)
+        make_product('2', stock_quantity=1)
+
+    def _checkout(self, cart):
+        return self.client.post('/api/store/checkout/', checkout_payload(cart), format='json')
+
+    def _stock(self):
+        return dict(Product.objects.values_list('id', 'stock_quantity'))
+
+    def test_checkout_reserves_stock(self, *mocks):
+        cart = [{'id': '1', 'quantity': 2}, {'id': '2', 'quantity': 1}, {'id': '1', 'quantity': 1}]
+        self.assertEqual(self._checkout(cart).status_code, 201)
+        self.assertEqual(self._stock(), {'1': 2, '2': 0})
+
+    def test_shortfall_rolls_back_whole_cart(self, *mocks):
+        response = self._checkout([{'id': '1', 'quantity': 2}, {'id': '2', 'quantity': 2}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Product 2 is out of stock')
+        self.assertEqual(self._stock(), {'1': 5, '2': 1})
+        self.assertFalse(Order.objects.exists())
+
+    def test_invalid_quantity_rejected(self, *mocks):
+        response = self._checkout([{'id': '1', 'quantity': -3}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self._stock(), {'1': 5, '2': 1})
+
+    def test_abandoned_checkout_releases_stock(self, customer, intent):
+        intent.return_value = None
+        self.assertEqual(self._checkout([{'id': '1', 'quantity': 2}]).status_code, 500)
+        self.assertEqual(Order.objects.get().status, 'cancelled')
+        self.assertEqual(self._stock(), {'1': 5, '2': 1})
+
+    def test_failed_payment_releases_stock_once(self, *mocks):
+        self._checkout([{'id': '1', 'quantity': 2}])
+        for _ in range(2):
+            _handle_failed_payment({'id': 'pi_test'})
+        self.assertEqual(Order.objects.get().status, 'cancelled')
+        self.assertEqual(self._stock(), {'1': 5, '2': 1})
+
+    @mock.patch('store.jobs.cancel_payment_intent')
+    def test_expired_order_releases_stock(self, *mocks):
+        self._checkout([{'id': '1', 'quantity': 2}])
+        Order.objects.update(created_at=timezone.now() - timedelta(days=2))
+        expire_pending_orders()
+        expire_pending_orders()
+        self.assertEqual(Order.objects.get().status, 'cancelled')
+        self.assertEqual(self._stock(), {'1': 5, '2': 1})
+
+    def test_late_payment_reserves_again(self, *mocks):
+        self._checkout([{'id': '1', 'quantity': 2}])
+        _handle_failed_payment({'id': 'pi_test'})
+        _handle_successful_payment({'id': 'pi_test'})
+        self.assertEqual(Order.objects.get().status, 'paid')
+        self.assertEqual(self._stock(), {'1': 3, '2': 1})
+
+
+@mock.patch('store.views.create_payment_intent',
+            return_value=SimpleNamespace(id='pi_test', client_secret='secret'))
+@mock.patch('store.stripe_service.create_or_get_stripe_customer',
+            return_value=SimpleNamespace(id='cus_test'))
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_rate_limits()
+        self.client = APIClient()
+        make_product('1', price=Decimal('10.00'))
+        make_product('2', price=Decimal('4.00'))
+
+    def _checkout(self, cart, email='buyer@example.com', intent='pi_test'):
+        with mock.patch('store.views.create_payment_intent',
+                        return_value=SimpleNamespace(id=intent, client_secret='secret')):
+            response = self.client.post('/api/store/checkout/', checkout_payload(cart, email=email), format='json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(pk=response.data['order_id'])
+
+    def _rollups(self):
+        days = list(DailySales.objects.values())
+        products = list(DailyProductSales.objects.order_by('product_id').values(
+            'date', 'product_id', 'units', 'revenue'
+        ))
+        for row in days:
+            del row['id']
+        return days, products
+
+    def _dashboard(self, **params):
+        self.client.force_login(User.objects.get_or_create(username='staff', defaults={'is_staff': True})[0])
+        return self.client.get('/api/store/dashboard/sales/', params)
+
+    def test_checkout_and_payment_update_rollups(self, *mocks):
+        self._checkout([{'id': '1', 'quantity': 2}, {'id': '2', 'quantity': 1}], intent='pi_a')
+        self._checkout([{'id': '1', 'quantity': 1}], email='other@example.com', intent='pi_b')
+        _handle_successful_payment({'id': 'pi_a'})
+        _handle_successful_payment({'id': 'pi_a'})
+
+        day = DailySales.objects.get()
+        self.assertEqual((day.checkouts, day.converted, day.paid_orders, day.units), (2, 1, 1, 3))
+        self.assertEqual((day.revenue, day.guest_orders, day.guest_revenue), (Decimal('24.00'), 1, Decimal('24.00')))
+        self.assertEqual(
+            dict(DailyProductSales.objects.values_list('product_id', 'units')), {'1': 2, '2': 1}
+        )
+
+    def test_subscriber_orders_split_out(self, *mocks):
+        Customer.objects.create(email='member@example.com', first_name='M', last_name='S', is_subscribed=True)
+        order = self._checkout([{'id': '1', 'quantity': 1}], email='member@example.com')
+        _handle_successful_payment({'id': 'pi_test'})
+
+        day = DailySales.objects.get()
+        self.assertEqual((day.subscriber_orders, day.guest_orders), (1, 0))
+        self.assertEqual((day.subscriber_revenue, day.discount_total), (order.total_amount, order.discount_amount))
+
+    def test_rebuild_matches_incremental_rollups(self, *mocks):
+        self._checkout([{'id': '1', 'quantity': 2}, {'id': '2', 'quantity': 3}], intent='pi_a')
+        self._checkout([{'id': '2', 'quantity': 1}], email='other@example.com', intent='pi_b')
+        self._checkout([{'id': '1', 'quantity': 1}], email='third@example.com', intent='pi_c')
+        _handle_successful_payment({'id': 'pi_a'})
+        _handle_successful_payment({'id': 'pi_c'})
+        incremental = self._rollups()
+
+        today = timezone.localdate()
+        call_command('rebuild_sales_rollups', stdout=open('/dev/null', 'w'))
+        self.assertEqual(self._rollups(), incremental)
+        DailySales.objects.all().delete()
+        DailyProductSales.objects.all().delete()
+        rebuild_rollups(today, today)
+        self.assertEqual(self._rollups(), incremental)
+
+    def test_admin_status_change_updates_rollups(self, *mocks):
+        order = self._checkout([{'id': '1', 'quantity': 2}])
+        _handle_successful_payment({'id': 'pi_test'})
+        order_admin = site._registry[Order]
+
+        order.refresh_from_db()
+        order.status = 'shipped'
+        order_admin.save_model(None, order, None, True)
+        self.assertEqual(DailySales.objects.get().paid_orders, 1)
+
+        order.status = 'cancelled'
+        order_admin.save_model(None, order, None, True)
+        day = DailySales.objects.get()
+        self.assertEqual((day.checkouts, day.converted, day.paid_orders, day.revenue), (1, 0, 0, Decimal('0.00')))
+        self.assertEqual(DailyProductSales.objects.get().units, 0)
+
+    def test_dashboard_is_staff_only(self, *mocks):
+        self.assertEqual(self.client.get('/api/store/dashboard/sales/').status_code, 403)
+        self.client.force_login(User.objects.create_user('buyer', password='pw'))
+        self.assertEqual(self.client.get('/api/store/dashboard/sales/').status_code, 403)
+
+    def test_dashboard_reads_only_rollups(self, *mocks):
+        self._checkout([{'id': '1', 'quantity': 2}], intent='pi_a')
+        self._checkout([{'id': '2', 'quantity': 1}], email='other@example.com', intent='pi_b')
+        _handle_successful_payment({'id': 'pi_a'})
+        today = timezone.localdate()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._dashboard(start=(today - timedelta(days=6)).isoformat(), end=today.isoformat())
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q['sql'] for q in queries if 'store_order' in q['sql']])
+        self.assertEqual(len(response.data['days']), 7)
+        self.assertEqual(response.data['days'][0]['checkouts'], 0)
+        totals = response.data['totals']
+        self.assertEqual((totals['checkouts'], totals['paid_orders'], totals['revenue']), (2, 1, 20.0))
+        self.assertEqual(totals['conversion_rate'], 0.5)
+        self.assertEqual(response.data['top_products'][0]['product_id'], '1')
+
+    def test_dashboard_rejects_bad_ranges(self, *mocks):
+        self.assertEqual(self._dashboard(start='yesterday').status_code, 400)
+        self.assertEqual(self._dashboard(start='2024-02-01', end='2024-01-01').status_code, 400)
+        self.assertEqual(self._dashboard(start='2023-01-01', end='2024-12-31').status_code, 400)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        make_product('1')
+        make_product('2')
+        self.customer = Customer.objects.create(email='buyer@example.com', first_name='Ada', last_name='Soil')
+        self.with_items = self._order('EC-1', [('1', 2), ('2', 1)])
+        self.without_items = self._order('EC-2', [])
+
+    def _order(self, number, items):
+        order = Order.objects.create(
+            customer=self.customer, order_number=number, subtotal=Decimal('10.00'), total_amount=Decimal('10.00'),
+            shipping_first_name='Ada', shipping_last_name='Soil', shipping_address_line1='1 Farm Road',
+            shipping_city='Catskill', shipping_state='NY', shipping_zip_code='12414',
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, product_name=f'Product {product_id}',
+                      quantity=quantity, unit_price=Decimal('10.00'))
+            for product_id, quantity in items
+        ])
+        return order
+
+    def _export(self, export, fmt='csv', compress=False, queryset=None):
+        data = b''.join(export_stream(export, queryset or export.model.objects.all(), fmt, compress))
+        return (gzip.decompress(data) if compress else data).decode()
+
+    def test_order_csv_has_a_line_per_item(self):
+        rows = list(csv.DictReader(io.StringIO(self._export(ORDER_EXPORT))))
+        self.assertEqual(
+            [(row['order_number'], row['items_product_id'], row['items_quantity']) for row in rows],
+            [('EC-1', '1', '2'), ('EC-1', '2', '1'), ('EC-2', '', '')],
+        )
+        self.assertEqual(rows[0]['customer_email'], 'buyer@example.com')
+        self.assertEqual(rows[0]['items_total_price'], '20.00')
+
+    def test_order_ndjson_nests_items(self):
+        records = [json.loads(line) for line in self._export(ORDER_EXPORT, 'ndjson').splitlines()]
+        self.assertEqual([record['order_number'] for record in records], ['EC-1', 'EC-2'])
+        self.assertEqual([item['quantity'] for item in records[0]['items']], [2, 1])
+        self.assertEqual(records[1]['items'], [])
+
+    def test_gzip_round_trips(self):
+        self.assertEqual(self._export(CUSTOMER_EXPORT, compress=True), self._export(CUSTOMER_EXPORT))
+
+    def test_export_is_one_streamed_query(self):
+        for number in range(50):
+            self._order(f'EC-bulk-{number}', [('1', 1), ('2', 1)])
+        with CaptureQueriesContext(connection) as queries:
+            chunks = export_stream(ORDER_EXPORT, Order.objects.all(), 'ndjson')
+            self.assertEqual(len(queries), 0)
+            lines = b''.join(chunks).splitlines()
+        self.assertEqual(len(lines), 52)
+        self.assertEqual(len(queries), 1)
+
+    def test_admin_action_streams_selection(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.post('/admin/store/order/', {
+            'action': 'export_csv', '_selected_action': [self.without_items.pk],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="orders-', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('EC-2,'))
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'orders.ndjson.gz')
+            call_command('export_data', 'orders', '--format', 'ndjson', '--gzip', '--output', path,
+                         stdout=open(os.devnull, 'w'))
+            with gzip.open(path, 'rt') as f:
+                self.assertEqual(len(f.read().splitlines()), 2)
+            with self.assertRaises(CommandError):
+                call_command('export_data', 'orders', '--since', 'soon', '--output', path)
+
+
+class InventoryConcurrencyTests(TransactionTestCase):
+    """Many buyers racing for the same SKU"""
+    BUYERS = 24
+    STOCK = 10
+
+    def setUp(self):
+        make_product('drop', stock_quantity=self.STOCK)
+        make_product('extra', stock_quantity=1000)
+
+    def _buy(self, cart, barrier, results):
+        try:
+            barrier.wait()
+            for _ in range(500):
+                try:
+                    with transaction.atomic():
+                        reserve_stock(cart)
+                    results.append('reserved')
+                    return
+                except OutOfStock:
+                    results.append('sold out')
+                    return
+                except OperationalError as e:
+                    # SQLite has no row locks: colliding writers are told the
+                    # database is locked and try again. Anything else (e.g. a
+                    # PostgreSQL deadlock) fails the test.
+                    if connection.vendor != 'sqlite' or 'locked' not in str(e):
+                        raise
+                    time.sleep(0.001)
+            results.append('gave up')
+        except Exception as e:
+            results.append(repr(e))
+        finally:
+            connection.close()
+
+    def test_no_oversell_and_no_deadlock(self):
+        barrier = threading.Barrier(self.BUYERS)
+        results = []
+        # Carts list the same two products in opposite orders
+        carts = [{'drop': 1, 'extra': 1}, {'extra': 1, 'drop': 1}]
+        threads = [
+            threading.Thread(target=self._buy, args=(carts[i % 2], barrier, results))
+            for i in range(self.BUYERS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+
+        self.assertEqual(sorted(set(results)), ['reserved', 'sold out'])
+        self.assertEqual(results.count('reserved'), self.STOCK)
+        self.assertEqual(results.count('sold out'), self.BUYERS - self.STOCK)
+        stock = dict(Product.objects.values_list('id', 'stock_quantity'))
+        self.assertEqual(stock, {'drop': 0, 'extra': 1000 - self.STOCK})
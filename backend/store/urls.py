@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import (
     ProductViewSet, CheckoutView, StripeWebhookView,
-    WholesaleInquiryView, get_stripe_config
+    WholesaleInquiryView, get_stripe_config, sales_dashboard
 )
 from rest_framework.routers import DefaultRouter
 
@@ -13,4 +13,5 @@ urlpatterns = router.urls + [
     path('stripe/webhook/', StripeWebhookView.as_view(), name='stripe-webhook'),
     path('stripe/config/', get_stripe_config, name='stripe-config'),
     path('wholesale-inquiry/', WholesaleInquiryView.as_view(), name='wholesale-inquiry'),
+    path('dashboard/sales/', sales_dashboard, name='sales-dashboard'),
 ]
@@ -1,10 +1,23 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, action
+from rest_framework.decorators import api_view, action, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.db import transaction
+from datetime import timedelta
 from decimal import Decimal
+import hashlib
+import json
 import uuid
 
 from .models import Product, Customer, Order, OrderItem, WholesaleInquiry
@@ -12,11 +25,22 @@ from .serializers import (
     ProductSerializer, CustomerSerializer, OrderSerializer,
     CheckoutSerializer, WholesaleInquirySerializer
 )
+from .catalog_cache import get_catalog
+from .inventory import OutOfStock, cancel_pending_order, cart_quantities, reserve_stock
+from .rollups import record_checkout, sales_summary
+from .webhooks import apply_inline, record_event
 from .stripe_service import (
-    create_or_get_stripe_customer, create_payment_intent,
-    verify_webhook_signature
+    StaleStripeCustomerError, get_stripe_customer_id, forget_stripe_customer,
+    create_payment_intent, cancel_payment_intent, verify_webhook_signature
 )
 from newsletter.models import NewsletterSubscriber
+from newsletter.outbox import enqueue_welcome_email
+from earthcare.outbound import run_in_vendor_thread
+from earthcare.ratelimit import TokenBucketThrottle
+
+
+class CheckoutError(Exception):
+    """Raised when a checkout request cannot be turned into an order"""
 
 
 class ProductViewSet(viewsets.ReadOnlyModelViewSet):
@@ -27,6 +51,56 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductSerializer
 
+    # list/retrieve are served from the per-worker catalog snapshot, so the
+    # hot path runs no queries and no serializer work once it is warm.
+    # Conditional requests are answered from the catalog state alone.
+    def list(self, request, *args, **kwargs):
+        catalog, hit = get_catalog()
+        etag = self._etag(catalog, 'list', request.META.get('QUERY_STRING', ''))
+        not_modified = self._not_modified(request, catalog, etag)
+        if not_modified is not None:
+            return self._finalize(not_modified, catalog, etag, hit)
+
+        page = self.paginate_queryset(catalog.products)
+        if page is not None:
+            response = self.get_paginated_response(page)
+        else:
+            response = Response(catalog.products)
+        return self._finalize(response, catalog, etag, hit)
+
+    def retrieve(self, request, *args, **kwargs):
+        catalog, hit = get_catalog()
+        product_id = str(kwargs[self.lookup_field])
+        etag = self._etag(catalog, 'detail', product_id)
+        not_modified = self._not_modified(request, catalog, etag)
+        if not_modified is not None:
+            return self._finalize(not_modified, catalog, etag, hit)
+
+        product = catalog.by_id.get(product_id)
+        if product is None:
+            raise Http404
+        return self._finalize(Response(product), catalog, etag, hit)
+
+    def _etag(self, catalog, *parts):
+        digest = hashlib.sha1(':'.join((catalog.etag,) + parts).encode()).hexdigest()
+        return f'"{digest}"'
+
+    def _not_modified(self, request, catalog, etag):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        return get_conditional_response(
+            request, etag=etag,
+            last_modified=int(catalog.last_modified.timestamp()) if catalog.last_modified else None,
+        )
+
+    def _finalize(self, response, catalog, etag, hit):
+        response['ETag'] = etag
+        if catalog.last_modified:
+            response['Last-Modified'] = http_date(catalog.last_modified.timestamp())
+        patch_cache_control(response, public=True, max_age=settings.CATALOG_HTTP_MAX_AGE)
+        response['X-Catalog-Cache'] = 'HIT' if hit else 'MISS'
+        return response
+
 
 class WholesaleInquiryView(APIView):
     """
@@ -49,12 +123,29 @@ class WholesaleInquiryView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class CheckoutView(APIView):
+class CheckoutView(AsyncAPIView):
     """
     Handle checkout process with Stripe integration
+
+    Checkout runs in three phases so no DB transaction is held open while
+    waiting on Stripe:
+      1. a short transaction records the customer and the pending order
+         and reserves its stock (see store/inventory.py)
+      2. Stripe customer/payment intent calls run outside any transaction
+      3. a second short transaction attaches the Stripe IDs to the order
+    If phase 2 or 3 fails, the pending order is cancelled and its stock
+    released (and any payment intent already created is voided) so no
+    orphaned orders are left behind.
+
+    The view is async: the Stripe calls run on a worker thread, so under
+    ASGI the event loop keeps serving other requests meanwhile.
+    
+    Rate limited per client IP and email (RATE_LIMITS['checkout']).
     """
-    @transaction.atomic
-    def post(self, request):
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'checkout'
+    
+    async def post(self, request):
         serializer = CheckoutSerializer(data=request.data)
         
         if not serializer.is_valid():
@@ -62,6 +153,85 @@ class CheckoutView(APIView):
         
         data = serializer.validated_data
         
+        # Phase 1: record the pending order
+        try:
+            customer, order = await sync_to_async(self._create_pending_order)(data)
+        except CheckoutError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Phase 2: Stripe calls, outside any transaction
+        stripe_customer_id, payment_intent = await run_in_vendor_thread(
+            self._create_payment_intent, customer, order
+        )
+        
+        if not payment_intent:
+            await self._abandon_order(order, 'Failed to create payment intent')
+            return Response({
+                'error': 'Failed to create payment intent'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        # Phase 3: attach the Stripe IDs
+        try:
+            await sync_to_async(self._attach_payment_intent)(customer, order, stripe_customer_id, payment_intent)
+        except Exception as e:
+            print(f"Error attaching payment intent to order {order.order_number}: {e}")
+            await run_in_vendor_thread(cancel_payment_intent, payment_intent.id)
+            await self._abandon_order(order, 'Failed to attach payment intent')
+            return Response({
+                'error': 'Failed to create payment intent'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        return Response({
+            'client_secret': payment_intent.client_secret,
+            'order_number': order.order_number,
+            'order_id': order.id,
+            'total_amount': float(order.total_amount),
+            'discount_applied': float(order.discount_amount)
+        }, status=status.HTTP_201_CREATED)
+    
+    def _create_payment_intent(self, customer, order):
+        """Phase 2: resolve the Stripe customer and create the payment intent"""
+        stripe_customer_id = get_stripe_customer_id(
+            email=customer.email,
+            first_name=customer.first_name,
+            last_name=customer.last_name,
+            known_id=customer.stripe_customer_id
+        )
+        metadata = {
+            'order_number': order.order_number,
+            'order_id': str(order.id),
+            'customer_email': customer.email
+        }
+        
+        try:
+            payment_intent = create_payment_intent(
+                amount=order.total_amount,
+                customer_id=stripe_customer_id,
+                metadata=metadata
+            )
+        except StaleStripeCustomerError:
+            # The stored ID was deleted on Stripe's side; look the email up again
+            forget_stripe_customer(customer.email)
+            stripe_customer_id = get_stripe_customer_id(
+                email=customer.email,
+                first_name=customer.first_name,
+                last_name=customer.last_name
+            )
+            try:
+                payment_intent = create_payment_intent(
+                    amount=order.total_amount,
+                    customer_id=stripe_customer_id,
+                    metadata=metadata
+                )
+            except StaleStripeCustomerError as e:
+                print(f"Error creating payment intent: {e}")
+                payment_intent = None
+        
+        return stripe_customer_id, payment_intent
+    
+    @transaction.atomic
+    def _create_pending_order(self, data):
+        """Phase 1: upsert the customer and create the pending order with its items"""
         # Get or create customer
         customer, created = Customer.objects.get_or_create(
             email=data['email'],
@@ -81,40 +251,50 @@ class CheckoutView(APIView):
         
         # Handle newsletter subscription
         if data.get('subscribe_newsletter', False):
-            NewsletterSubscriber.objects.get_or_create(
+            subscriber, subscribed = NewsletterSubscriber.objects.get_or_create(
                 email=data['email'],
                 defaults={
                     'first_name': data['first_name'],
                     'source': 'checkout'
                 }
             )
+            if subscribed:
+                enqueue_welcome_email(subscriber)
             # Mark customer as subscribed for 10% discount
             customer.is_subscribed = True
             customer.save()
         
         # Calculate cart totals
         cart_items = data['cart_items']
+        products = Product.objects.in_bulk({str(item['id']) for item in cart_items})
         subtotal = Decimal('0.00')
         order_items_data = []
         
         for item in cart_items:
-            try:
-                product = Product.objects.get(id=item['id'])
-                quantity = int(item['quantity'])
-                item_total = product.price * quantity
-                subtotal += item_total
-                
-                order_items_data.append({
-                    'product': product,
-                    'product_name': product.name,
-                    'quantity': quantity,
-                    'unit_price': product.price,
-                    'total_price': item_total
-                })
-            except Product.DoesNotExist:
-                return Response({
-                    'error': f'Product {item["id"]} not found'
-                }, status=status.HTTP_400_BAD_REQUEST)
+            product = products.get(str(item['id']))
+            if product is None:
+                raise CheckoutError(f'Product {item["id"]} not found')
+            
+            quantity = int(item['quantity'])
+            if quantity < 1:
+                raise CheckoutError(f'Invalid quantity for product {item["id"]}')
+            item_total = product.price * quantity
+            subtotal += item_total
+            
+            order_items_data.append({
+                'product': product,
+                'product_name': product.name,
+                'quantity': quantity,
+                'unit_price': product.price,
+            })
+        
+        # Reserve stock; a shortfall rolls back the whole checkout
+        try:
+            reserve_stock(cart_quantities(
+                (item['product'].id, item['quantity']) for item in order_items_data
+            ))
+        except OutOfStock as e:
+            raise CheckoutError(f'{products[e.product_id].name} is out of stock')
         
         # Calculate discount for subscribers
         discount_amount = Decimal('0.00')
@@ -146,51 +326,41 @@ class CheckoutView(APIView):
         )
         
         # Create order items
-        for item_data in order_items_data:
-            OrderItem.objects.create(order=order, **item_data)
-        
-        # Create Stripe customer
-        stripe_customer = create_or_get_stripe_customer(
-            email=customer.email,
-            first_name=customer.first_name,
-            last_name=customer.last_name
-        )
-        
-        if stripe_customer:
-            customer.stripe_customer_id = stripe_customer.id
-            customer.save()
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, **item_data) for item_data in order_items_data
+        ])
+        record_checkout(order)
         
-        # Create Stripe Payment Intent
-        payment_intent = create_payment_intent(
-            amount=total_amount,
-            customer_id=stripe_customer.id if stripe_customer else None,
-            metadata={
-                'order_number': order_number,
-                'order_id': str(order.id),
-                'customer_email': customer.email
-            }
+        return customer, order
+    
+    @transaction.atomic
+    def _attach_payment_intent(self, customer, order, stripe_customer_id, payment_intent):
+        """Phase 3: store the Stripe customer and payment intent IDs"""
+        if stripe_customer_id and stripe_customer_id != customer.stripe_customer_id:
+            Customer.objects.filter(pk=customer.pk).update(
+                stripe_customer_id=stripe_customer_id,
+                updated_at=timezone.now()
+            )
+        Order.objects.filter(pk=order.pk).update(
+            stripe_payment_intent_id=payment_intent.id,
+            updated_at=timezone.now()
         )
-        
-        if not payment_intent:
-            return Response({
-                'error': 'Failed to create payment intent'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        order.stripe_payment_intent_id = payment_intent.id
-        order.save()
-        
-        return Response({
-            'client_secret': payment_intent.client_secret,
-            'order_number': order_number,
-            'order_id': order.id,
-            'total_amount': float(total_amount),
-            'discount_applied': float(discount_amount)
-        }, status=status.HTTP_201_CREATED)
+    
+    async def _abandon_order(self, order, reason):
+        """Compensate for a checkout that failed after the order was recorded"""
+        try:
+            await sync_to_async(cancel_pending_order)(order.pk, f"Checkout failed: {reason}")
+        except Exception as e:
+            # Left pending; the expire_pending_orders job will cancel it
+            print(f"Error cancelling abandoned order {order.order_number}: {e}")
 
 
 class StripeWebhookView(APIView):
     """
     Handle Stripe webhook events
+
+    Verified events are stored, applied and acknowledged; anything left
+    pending is retried by the process_stripe_events job (see store/webhooks.py).
     """
     def post(self, request):
         payload = request.body
@@ -201,47 +371,65 @@ class StripeWebhookView(APIView):
         if not event:
             return Response({'error': 'Invalid signature'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Handle different event types
-        if event['type'] == 'payment_intent.succeeded':
-            payment_intent = event['data']['object']
-            self._handle_successful_payment(payment_intent)
-        
-        elif event['type'] == 'payment_intent.payment_failed':
-            payment_intent = event['data']['object']
-            self._handle_failed_payment(payment_intent)
+        # Redeliveries of an event already stored are acknowledged as well
+        event = json.loads(payload)
+        record_event(event)
+        if settings.STRIPE_APPLY_EVENTS_INLINE:
+            try:
+                apply_inline(event)
+            except Exception as e:
+                # Stored already; the scheduled job applies it later
+                print(f"Error applying Stripe event {event['id']} inline: {e}")
         
         return Response({'status': 'success'}, status=status.HTTP_200_OK)
-    
-    def _handle_successful_payment(self, payment_intent):
-        """Handle successful payment"""
-        try:
-            order = Order.objects.get(stripe_payment_intent_id=payment_intent['id'])
-            order.status = 'paid'
-            order.paid_at = timezone.now()
-            order.save()
-            
-            # TODO: Send order confirmation email
-            # from .email_service import send_order_confirmation
-            # send_order_confirmation(order)
-            
-        except Order.DoesNotExist:
-            print(f"Order not found for payment intent: {payment_intent['id']}")
-    
-    def _handle_failed_payment(self, payment_intent):
-        """Handle failed payment"""
-        try:
-            order = Order.objects.get(stripe_payment_intent_id=payment_intent['id'])
-            order.status = 'cancelled'
-            order.notes += f"\n\nPayment failed: {payment_intent.get('last_payment_error', {}).get('message', 'Unknown error')}"
-            order.save()
-        except Order.DoesNotExist:
-            print(f"Order not found for payment intent: {payment_intent['id']}")
 
 
+def _stripe_config_etag(request):
+    return hashlib.sha1(settings.STRIPE_PUBLISHABLE_KEY.encode()).hexdigest()
+
+
+@cache_control(public=True, max_age=3600)
+@condition(etag_func=_stripe_config_etag)
 @api_view(['GET'])
 def get_stripe_config(request):
     """Return Stripe publishable key"""
-    from django.conf import settings
     return Response({
         'publishableKey': settings.STRIPE_PUBLISHABLE_KEY
     })
+
+
+# Longest range the sales dashboard serves in one response
+MAX_DASHBOARD_DAYS = 366
+
+
+def _query_date(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    return day
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_dashboard(request):
+    """
+    Staff sales dashboard: totals, a per-day series and top products.
+    Query params: `start` and `end` (YYYY-MM-DD, inclusive; default the
+    last 30 days). Reads the daily rollup tables, never the orders.
+    """
+    try:
+        end = _query_date(request, 'end') or timezone.localdate()
+        start = _query_date(request, 'start') or end - timedelta(days=29)
+    except ValueError:
+        return Response({'error': 'start and end must be YYYY-MM-DD dates'}, status=status.HTTP_400_BAD_REQUEST)
+    if start > end:
+        return Response({'error': 'start is after end'}, status=status.HTTP_400_BAD_REQUEST)
+    if (end - start).days >= MAX_DASHBOARD_DAYS:
+        return Response(
+            {'error': f'At most {MAX_DASHBOARD_DAYS} days per request'}, status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response(sales_summary(start, end))
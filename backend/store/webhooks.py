@@ -0,0 +1,194 @@
+"""
+Queue-backed Stripe webhook ingestion.
+
+The webhook view verifies the signature and stores the event with
+record_event(): a single INSERT that ignores event IDs already stored, so
+Stripe's retries and duplicate deliveries are acknowledged straight away
+without ever being applied twice. With STRIPE_APPLY_EVENTS_INLINE (the
+default) the view then applies it with apply_inline(); whatever that
+leaves pending (failures, events waiting on an earlier one) is applied by
+the process_stripe_events scheduler job or worker:
+
+- Events for the same payment intent are applied one at a time, in the
+  order Stripe created them: only the oldest pending event of an intent
+  can be claimed, so later ones wait while it is leased or retrying.
+- Claims go through scheduler.dispatch.claim_rows and are leased for
+  STRIPE_EVENT_LEASE_SECONDS; a worker that dies mid-batch lets its events
+  become due again (at-least-once delivery).
+- An event is applied and marked processed in one transaction, and the
+  handlers are conditional updates, so applying one twice changes nothing.
+- Failures are retried with exponential backoff and dead-lettered after
+  STRIPE_EVENT_MAX_ATTEMPTS; replay_stripe_events puts events back in the
+  queue, and can fetch ones Stripe never delivered.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from newsletter.outbox import enqueue_order_confirmation
+from scheduler.dispatch import claim_rows
+
+from .inventory import OutOfStock, cancel_pending_order, order_quantities, reserve_stock
+from .models import Order, StripeEvent
+from .rollups import record_payment
+
+
+def payment_intent_of(event):
+    """The payment intent ID an event is about, or ''"""
+    obj = event['data']['object']
+    if obj.get('object') == 'payment_intent':
+        return obj['id']
+    return obj.get('payment_intent') or ''
+
+
+def record_event(event):
+    """Store a verified webhook event (a dict) unless it was stored before"""
+    StripeEvent.objects.bulk_create([
+        StripeEvent(
+            event_id=event['id'],
+            type=event['type'],
+            payment_intent_id=payment_intent_of(event),
+            stripe_created=datetime.fromtimestamp(event['created'], tz=dt_timezone.utc),
+            payload=event,
+        )
+    ], ignore_conflicts=True)
+
+
+class OrderNotFound(Exception):
+    """The event arrived before checkout attached its payment intent; retried later"""
+
+
+def _handle_successful_payment(payment_intent):
+    """Handle successful payment"""
+    orders = Order.objects.filter(stripe_payment_intent_id=payment_intent['id'])
+    if not orders.exists():
+        raise OrderNotFound(f"Order not found for payment intent: {payment_intent['id']}")
+
+    for order_id in orders.filter(status='cancelled').values_list('pk', flat=True):
+        # Paid after it expired or failed: its stock was released, take it again
+        if not Order.objects.filter(pk=order_id, status='cancelled').update(status='pending'):
+            continue
+        try:
+            with transaction.atomic():
+                reserve_stock(order_quantities([order_id]))
+        except OutOfStock as e:
+            Order.objects.filter(pk=order_id).update(
+                notes=Concat(F('notes'), Value(f"\n\nPaid after cancellation; {e}"))
+            )
+
+    for order_id in orders.exclude(status__in=Order.PAID_STATUSES).values_list('pk', flat=True):
+        now = timezone.now()
+        if Order.objects.filter(pk=order_id).exclude(status__in=Order.PAID_STATUSES).update(
+            status='paid', paid_at=now, updated_at=now
+        ):
+            order = Order.objects.select_related('customer').get(pk=order_id)
+            record_payment(order)
+            # Queued in the event's transaction, so it goes out exactly once
+            enqueue_order_confirmation(order)
+
+
+def _handle_failed_payment(payment_intent):
+    """Handle failed payment"""
+    message = (payment_intent.get('last_payment_error') or {}).get('message', 'Unknown error')
+    orders = Order.objects.filter(stripe_payment_intent_id=payment_intent['id'])
+    if not orders.exists():
+        raise OrderNotFound(f"Order not found for payment intent: {payment_intent['id']}")
+    # A late failure never overrides a payment that went through
+    for order_id in orders.filter(status='pending').values_list('pk', flat=True):
+        cancel_pending_order(order_id, f"Payment failed: {message}")
+
+
+HANDLERS = {
+    'payment_intent.succeeded': _handle_successful_payment,
+    'payment_intent.payment_failed': _handle_failed_payment,
+}
+
+
+def apply_event(event):
+    """Run the handler for a stored event; unhandled types are a no-op"""
+    handler = HANDLERS.get(event.type)
+    if handler:
+        handler(event.payload['data']['object'])
+
+
+def due_events(now):
+    """Pending events due at `now` with no earlier pending event for their payment intent"""
+    earlier = StripeEvent.objects.filter(
+        status='pending', payment_intent_id=OuterRef('payment_intent_id')
+    ).filter(
+        Q(stripe_created__lt=OuterRef('stripe_created'))
+        | Q(stripe_created=OuterRef('stripe_created'), pk__lt=OuterRef('pk'))
+    )
+    return StripeEvent.objects.filter(
+        Q(payment_intent_id='') | ~Exists(earlier),
+        status='pending',
+        next_attempt_at__lte=now,
+    ).order_by('stripe_created', 'pk')
+
+
+def claim_batch(batch_size, **filters):
+    """Claim up to batch_size due events (matching `filters`), at most one per payment intent"""
+    now = timezone.now()
+    return claim_rows(
+        due_events(now).filter(**filters), batch_size,
+        next_attempt_at=now + timedelta(seconds=settings.STRIPE_EVENT_LEASE_SECONDS),
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff between attempts, capped at one hour"""
+    return timedelta(seconds=min(30 * (2 ** (attempts - 1)), 3600))
+
+
+def process_batch(batch_size=50, **filters):
+    """Claim and apply one batch; returns (processed, retried, dead) counts"""
+    processed = retried = dead = 0
+    for event in claim_batch(batch_size, **filters):
+        attempts = event.attempts + 1
+        try:
+            with transaction.atomic():
+                apply_event(event)
+                StripeEvent.objects.filter(pk=event.pk).update(
+                    status='processed', attempts=attempts, last_error='', processed_at=timezone.now()
+                )
+        except Exception as e:
+            print(f"Error applying Stripe event {event.event_id} ({event.type}): {e}")
+            if attempts >= settings.STRIPE_EVENT_MAX_ATTEMPTS:
+                StripeEvent.objects.filter(pk=event.pk).update(
+                    status='dead', attempts=attempts, last_error=str(e)
+                )
+                dead += 1
+            else:
+                StripeEvent.objects.filter(pk=event.pk).update(
+                    attempts=attempts,
+                    last_error=str(e),
+                    next_attempt_at=timezone.now() + retry_delay(attempts),
+                )
+                retried += 1
+        else:
+            processed += 1
+    return processed, retried, dead
+
+
+def apply_inline(event):
+    """
+    Apply a just-recorded event (a dict) from the webhook request, after any
+    earlier pending events of its payment intent. Returns how many were
+    applied; one that fails is left to the scheduled retries.
+    """
+    intent = payment_intent_of(event)
+    filters = {'payment_intent_id': intent} if intent else {'event_id': event['id']}
+    applied = 0
+    # Each claim takes the oldest pending event of the intent, so this walks them in order
+    while process_batch(1, **filters)[0]:
+        applied += 1
+    return applied
+
+
+def requeue(events):
+    """Put `events` (a StripeEvent queryset) back in the queue; returns how many"""
+    return events.update(status='pending', attempts=0, last_error='', next_attempt_at=timezone.now())
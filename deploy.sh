@@ -44,8 +44,9 @@ gcloud run deploy $SERVICE_NAME \
   --region $REGION \
   --platform managed \
   --allow-unauthenticated \
-  --set-env-vars "DEBUG=False,ALLOWED_HOSTS=.run.app,.earthcare.food,earthcare.food" \
+  --set-env-vars "DEBUG=False,TRUSTED_PROXY_COUNT=1,ALLOWED_HOSTS=.run.app,.earthcare.food,earthcare.food" \
   --set-secrets "SECRET_KEY=DJANGO_SECRET_KEY:latest,STRIPE_SECRET_KEY=STRIPE_SECRET:latest,STRIPE_PUBLISHABLE_KEY=STRIPE_PUB:latest,SENDGRID_API_KEY=SENDGRID_KEY:latest,GEMINI_API_KEY=GEMINI_KEY:latest" \
+  --no-cpu-throttling \
   --min-instances 0 \
   --max-instances 10 \
   --memory 512Mi \
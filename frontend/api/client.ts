@@ -55,8 +55,48 @@ export const sendChatMessage = async (sessionId: string, message: string, email?
   return response.data;
 };
 
-export const getConversationHistory = async (sessionId: string) => {
-  const response = await api.get(`/coaching/conversation/${sessionId}/`);
+// Streams the reply as Server-Sent Events; onToken gets each chunk as it
+// arrives and the promise resolves with the full saved message
+export const streamChatMessage = async (
+  sessionId: string,
+  message: string,
+  onToken: (text: string) => void,
+  email?: string
+) => {
+  const response = await fetch(`${API_BASE_URL}/coaching/chat/stream/`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({ session_id: sessionId, message, email: email || '' }),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Chat stream failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop() || '';
+    for (const block of events) {
+      const event = block.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(block.match(/^data: (.*)$/m)?.[1] || '{}');
+      if (event === 'token') onToken(data.text);
+      if (event === 'done') return data;
+    }
+  }
+  throw new Error('Chat stream ended early');
+};
+
+// Newest page first; pass the returned `before` cursor to load older messages
+export const getConversationHistory = async (
+  sessionId: string,
+  params: { before?: string; after?: string; page_size?: number } = {}
+) => {
+  const response = await api.get(`/coaching/conversation/${sessionId}/`, { params });
   return response.data;
 };
 
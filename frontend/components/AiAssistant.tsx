@@ -1,6 +1,6 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { Send, Loader2, Bot, X, MessageCircle } from 'lucide-react';
-import { sendChatMessage } from '../api/client';
+import { streamChatMessage } from '../api/client';
 
 export const AiAssistant: React.FC = () => {
   const [isOpen, setIsOpen] = useState(false);
@@ -9,6 +9,7 @@ export const AiAssistant: React.FC = () => {
   ]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [isStreaming, setIsStreaming] = useState(false);
   const [sessionId] = useState(() => `session-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
@@ -44,8 +45,19 @@ export const AiAssistant: React.FC = () => {
     setIsLoading(true);
 
     try {
-      const response = await sendChatMessage(sessionId, userMessage);
-      setMessages(prev => [...prev, { role: 'ai', text: response.message }]);
+      let started = false;
+      await streamChatMessage(sessionId, userMessage, (text) => {
+        if (!started) {
+          started = true;
+          setIsStreaming(true);
+          setMessages(prev => [...prev, { role: 'ai', text }]);
+        } else {
+          setMessages(prev => [
+            ...prev.slice(0, -1),
+            { role: 'ai', text: prev[prev.length - 1].text + text }
+          ]);
+        }
+      });
     } catch (error) {
       console.error('Chat error:', error);
       setMessages(prev => [...prev, { 
@@ -54,6 +66,7 @@ export const AiAssistant: React.FC = () => {
       }]);
     } finally {
       setIsLoading(false);
+      setIsStreaming(false);
     }
   };
 
@@ -106,7 +119,7 @@ export const AiAssistant: React.FC = () => {
                 </div>
               </div>
             ))}
-            {isLoading && (
+            {isLoading && !isStreaming && (
               <div className="flex justify-start">
                 <div className="bg-white border border-earth-100 rounded-2xl rounded-bl-none p-3 shadow-sm flex items-center gap-2 text-earth-500">
                   <Loader2 size={14} className="animate-spin" />